@@ -0,0 +1,264 @@
+"""
+Columnar analytics over all sets (dashboards across users).
+
+`sets` joined with `workouts.workout_date` is loaded in chunks into one NumPy
+array per column, and every aggregate is vectorized: grouping is
+np.unique(..., return_inverse=True) + np.bincount / sorting + ufunc.reduceat,
+never a Python loop over rows.
+
+Each process keeps one snapshot (ColumnsSnapshot). A daemon thread started with
+the app loads it and reloads it every ANALYTICS_SNAPSHOT_TTL seconds, off the
+request path, so dashboards may lag writes by that much. The snapshot holds at
+most ANALYTICS_MAX_SETS newest sets (20 bytes each), which bounds its memory in
+every worker. With ANALYTICS_SNAPSHOT_TTL=0 there is no thread: the first
+dashboard request loads the snapshot and it is only reloaded by refresh().
+"""
+
+import os
+import threading
+from collections.abc import Callable
+from dataclasses import dataclass
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+from sqlalchemy import Float, String, select, type_coerce
+from sqlalchemy.orm import Session
+
+from app import db_models
+from app.logging_config import get_logger
+
+logger = get_logger("analytics")
+
+LOAD_CHUNK_SIZE = 100_000
+SNAPSHOT_TTL = float(os.getenv("ANALYTICS_SNAPSHOT_TTL", "60"))
+MAX_SETS = int(os.getenv("ANALYTICS_MAX_SETS", "1000000"))
+PERCENTILES = (50, 90)
+WEIGHT_KEY_BASE = 10**6
+DENSE_GROUPS_LIMIT = 1 << 20
+
+
+@dataclass(frozen=True)
+class SetColumns:
+    exercise_id: "np.ndarray"  # int32
+    day: "np.ndarray"  # int32, дни от 1970-01-01
+    reps: "np.ndarray"  # int32
+    weight: "np.ndarray"  # float64
+
+    def __len__(self) -> int:
+        return len(self.reps)
+
+    @property
+    def volume(self) -> "np.ndarray":
+        return self.reps * self.weight
+
+    def only(self, exercise_id: int) -> "SetColumns":
+        mask = self.exercise_id == exercise_id
+        return SetColumns(
+            self.exercise_id[mask], self.day[mask], self.reps[mask], self.weight[mask]
+        )
+
+
+def load_columns(
+    db: Session, chunk_size: int = LOAD_CHUNK_SIZE, max_rows: int = MAX_SETS
+) -> SetColumns:
+    """Stream (exercise_id, workout_date, reps, weight) of the newest max_rows sets into arrays"""
+    s, w = db_models.Set, db_models.Workout
+    # type_coerce: без построчного разбора в date/Decimal, колонками это делает NumPy
+    result = db.execute(
+        select(
+            s.exercise_id,
+            type_coerce(w.workout_date, String),
+            s.reps,
+            type_coerce(s.weight, Float),
+        )
+        .join(w, w.id == s.workout_id)
+        .order_by(s.id.desc())
+        .limit(max_rows)
+        .execution_options(yield_per=chunk_size)
+    )
+    parts: tuple[list, list, list, list] = ([], [], [], [])
+    for chunk in result.partitions():
+        exercise_id, day, reps, weight = zip(*chunk, strict=True)
+        parts[0].append(np.array(exercise_id, dtype=np.int32))
+        parts[1].append(np.array(day, dtype="datetime64[D]").astype(np.int32))
+        parts[2].append(np.array(reps, dtype=np.int32))
+        parts[3].append(np.array(weight, dtype=np.float64))
+    dtypes = (np.int32, np.int32, np.int32, np.float64)
+    cols = SetColumns(
+        *(
+            np.concatenate(p) if p else np.empty(0, dtype=t)
+            for p, t in zip(parts, dtypes, strict=True)
+        )
+    )
+    if len(cols) >= max_rows:
+        logger.warning(f"Analytics snapshot is capped at the newest {max_rows} sets")
+    return cols
+
+
+class ColumnsSnapshot:
+    """The process-wide SetColumns, reloaded by a daemon thread every `interval` seconds"""
+
+    def __init__(self, load: Callable[[], SetColumns], interval: float = SNAPSHOT_TTL):
+        self._load = load
+        self.interval = interval
+        self._columns: SetColumns | None = None
+        self._loading = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+
+    def get(self) -> SetColumns:
+        """Current snapshot; before the first load completes, waits for it (or runs it)"""
+        cols = self._columns
+        if cols is None:
+            with self._loading:
+                if self._columns is None:
+                    self._columns = self._load()
+                cols = self._columns
+        return cols
+
+    def clear(self) -> None:
+        """Drop the snapshot: the next get() loads it again"""
+        with self._loading:
+            self._columns = None
+
+    def refresh(self) -> SetColumns:
+        with self._loading:
+            self._columns = self._load()
+            return self._columns
+
+    def start(self) -> None:
+        if self.interval <= 0 or (self._thread is not None and self._thread.is_alive()):
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="analytics-snapshot", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 5.0) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def _run(self) -> None:
+        while True:
+            try:
+                self.refresh()
+            except Exception:
+                logger.exception("Analytics snapshot reload failed")
+            if self._stop.wait(self.interval):
+                return
+
+
+def iso_week_start(day: "np.ndarray") -> "np.ndarray":
+    """Monday of the ISO week, in days since the epoch (1970-01-01 was a Thursday)"""
+    return day - (day + 3) % 7
+
+
+def e1rm(weight: "np.ndarray", reps: "np.ndarray") -> "np.ndarray":
+    """Epley estimate, same as rollups.epley_e1rm"""
+    return np.where(reps == 1, weight, weight * (1 + reps / 30))
+
+
+def to_date(days: "np.ndarray") -> list:
+    return days.astype("datetime64[D]").astype(object).tolist()
+
+
+@dataclass(frozen=True)
+class ExerciseAggregates:
+    exercise_id: "np.ndarray"
+    set_count: "np.ndarray"
+    total_reps: "np.ndarray"
+    total_volume: "np.ndarray"
+    max_weight: "np.ndarray"
+    best_e1rm: "np.ndarray"
+    weight_percentiles: dict[int, "np.ndarray"]
+
+
+def _group_by_id(ids: "np.ndarray") -> tuple["np.ndarray", "np.ndarray"]:
+    """np.unique(ids, return_inverse=True) for small non-negative ids, without sorting"""
+    present = np.bincount(ids) > 0
+    lookup = np.cumsum(present) - 1
+    return np.flatnonzero(present), lookup[ids]
+
+
+def by_exercise(cols: SetColumns) -> ExerciseAggregates:
+    """Totals, heaviest weight, best e1RM and weight percentiles for every exercise"""
+    ids, group = _group_by_id(cols.exercise_id)
+    counts = np.bincount(group, minlength=len(ids))
+    starts = (np.cumsum(counts) - counts).astype(np.intp)
+
+    # Веса упорядочиваются одной сортировкой int64-ключа (группа, вес в центах):
+    # в 15-20 раз быстрее np.lexsort по двум колонкам. Numeric(6, 2) < 10**6 центов
+    cents = np.rint(cols.weight * 100).astype(np.int64)
+    weight = (np.sort(group.astype(np.int64) * WEIGHT_KEY_BASE + cents) % WEIGHT_KEY_BASE) / 100
+    percentiles = {}
+    for q in PERCENTILES:
+        position = starts + q / 100 * (counts - 1)
+        lo = np.floor(position).astype(np.intp)
+        hi = np.ceil(position).astype(np.intp)
+        percentiles[q] = weight[lo] + (weight[hi] - weight[lo]) * (position - lo)
+
+    return ExerciseAggregates(
+        exercise_id=ids,
+        set_count=counts,
+        total_reps=np.bincount(group, weights=cols.reps, minlength=len(ids)).astype(np.int64),
+        total_volume=np.bincount(group, weights=cols.volume, minlength=len(ids)),
+        max_weight=weight[starts + counts - 1],
+        best_e1rm=_group_max(group, len(ids), e1rm(cols.weight, cols.reps)),
+        weight_percentiles=percentiles,
+    )
+
+
+def _group_max(group: "np.ndarray", size: int, values: "np.ndarray") -> "np.ndarray":
+    best = np.full(size, -np.inf)
+    np.maximum.at(best, group, values)
+    return best
+
+
+def weekly_volume(cols: SetColumns) -> tuple["np.ndarray", ...]:
+    """(exercise_id, week_start, set_count, volume) per exercise and ISO week, sorted"""
+    if not len(cols):
+        empty = np.empty(0, dtype=np.int32)
+        return empty, empty, np.empty(0, dtype=np.int64), np.empty(0)
+    ids, group = _group_by_id(cols.exercise_id)
+    week = iso_week_start(cols.day)
+    first = week.min()
+    slot = (week - first) // 7
+    n_weeks = int(slot.max()) + 1
+    # Ключ группы (упражнение, неделя) - индекс в плотной таблице len(ids) x n_weeks:
+    # np.bincount по нему вместо сортировки. Если таблица слишком большая - np.unique
+    key = group.astype(np.int64) * n_weeks + slot
+    if len(ids) * n_weeks <= DENSE_GROUPS_LIMIT:
+        counts = np.bincount(key, minlength=len(ids) * n_weeks)
+        keys = np.flatnonzero(counts)
+        counts = counts[keys]
+        volume = np.bincount(key, weights=cols.volume, minlength=len(ids) * n_weeks)[keys]
+    else:
+        keys, inverse = np.unique(key, return_inverse=True)
+        counts = np.bincount(inverse, minlength=len(keys))
+        volume = np.bincount(inverse, weights=cols.volume, minlength=len(keys))
+    return (
+        ids[keys // n_weeks].astype(np.int32),
+        (first + keys % n_weeks * 7).astype(np.int32),
+        counts,
+        volume,
+    )
+
+
+def progression(cols: SetColumns, window_weeks: int = 4) -> tuple["np.ndarray", ...]:
+    """
+    Weekly best e1RM of one exercise's sets and its rolling maximum over the last
+    `window_weeks` calendar weeks: (week_start, best_e1rm, rolling_best_e1rm)
+    """
+    week = iso_week_start(cols.day)
+    weeks, group = np.unique(week, return_inverse=True)
+    best = _group_max(group, len(weeks), e1rm(cols.weight, cols.reps))
+    if not len(weeks):
+        return weeks, best, best
+    # Недели без подходов тоже входят в окно: раскладываем по сплошной шкале недель
+    slot = (weeks - weeks[0]) // 7
+    dense = np.full(slot[-1] + 1, -np.inf)
+    dense[slot] = best
+    padded = np.concatenate((np.full(window_weeks - 1, -np.inf), dense))
+    rolling = sliding_window_view(padded, window_weeks).max(axis=1)
+    return weeks, best, rolling[slot]
@@ -0,0 +1,105 @@
+"""
+In-process caches. Each worker has its own copy: writes invalidate the local
+cache immediately, other workers see them after at most `ttl_seconds`.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from collections.abc import Callable, Hashable
+from typing import Any
+
+
+class LRUCache:
+    """
+    Thread-safe LRU cache bounded by entry count and, optionally, by the total
+    `sizeof(value)` of its entries (`max_bytes`), with per-entry TTL and counters.
+    A value bigger than the whole budget is not stored; with ttl_seconds <= 0
+    nothing is.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = 1024,
+        ttl_seconds: float = 300.0,
+        clock: Callable[[], float] = time.monotonic,
+        max_bytes: int | None = None,
+        sizeof: Callable[[Any], int] = len,
+    ):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.max_bytes = max_bytes
+        self._sizeof = sizeof
+        self._clock = clock
+        # key -> (срок жизни, значение, размер)
+        self._data: OrderedDict[Hashable, tuple[float, Any, int]] = OrderedDict()
+        self._lock = threading.Lock()
+        self.size_bytes = 0
+        # Растет при каждой инвалидации: см. set(..., generation=)
+        self.generation = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def _drop(self, key: Hashable) -> None:
+        entry = self._data.pop(key, None)
+        if entry is not None:
+            self.size_bytes -= entry[2]
+
+    def get(self, key: Hashable) -> Any | None:
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None or entry[0] < self._clock():
+                if entry is not None:
+                    self._drop(key)
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def set(self, key: Hashable, value: Any, generation: int | None = None) -> None:
+        """
+        `generation`: the value of self.generation read before the value was loaded;
+        if anything was invalidated since, the value may be stale and is not stored
+        """
+        size = self._sizeof(value) if self.max_bytes is not None else 0
+        with self._lock:
+            if generation is not None and generation != self.generation:
+                return
+            self._drop(key)
+            if self.ttl_seconds <= 0 or (self.max_bytes is not None and size > self.max_bytes):
+                return
+            self._data[key] = (self._clock() + self.ttl_seconds, value, size)
+            self.size_bytes += size
+            while len(self._data) > self.max_entries or (
+                self.max_bytes is not None and self.size_bytes > self.max_bytes
+            ):
+                _, (_, _, evicted) = self._data.popitem(last=False)
+                self.size_bytes -= evicted
+                self.evictions += 1
+
+    def invalidate(self, key: Hashable) -> None:
+        with self._lock:
+            self._drop(key)
+            self.generation += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+            self.size_bytes = 0
+            self.generation += 1
+
+    def stats(self) -> dict[str, float]:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+            "entries": len(self._data),
+            "size_bytes": self.size_bytes,
+        }
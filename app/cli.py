@@ -0,0 +1,69 @@
+"""
+Command line entry point: python -m app.cli <command> [options]
+"""
+
+import argparse
+import json
+import sys
+from pathlib import Path
+
+from app import importer, migrations
+from app.db import init_db, unit_of_work
+from app.repositories import ExerciseStatsRepository, WorkoutRepository
+
+
+def _import_workouts(args: argparse.Namespace) -> int:
+    init_db()
+    fmt = args.format or ("csv" if args.path.suffix.lower() == ".csv" else "ndjson")
+    with args.path.open("rb") as f:
+        report = importer.import_file(f, fmt)
+    print(report.model_dump_json(indent=2))
+    return 1 if report.error_count else 0
+
+
+def _migrate(args: argparse.Namespace) -> int:
+    if not args.status:
+        for step in migrations.migrate():
+            print(f"applied {step.version}: {step.description}")
+    print(json.dumps(migrations.status()))
+    return 0
+
+
+def _rebuild_rollups(args: argparse.Namespace) -> int:
+    init_db()
+    with unit_of_work() as uow:
+        rows = ExerciseStatsRepository(uow.session).rebuild()
+        WorkoutRepository(uow.session).rebuild_totals()
+    print(json.dumps({"rollup_rows": rows}))
+    return 0
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog="python -m app.cli", description="Workout Log API tools")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    imp = commands.add_parser("import-workouts", help="Bulk import workouts from NDJSON or CSV")
+    imp.add_argument("path", type=Path)
+    imp.add_argument("--format", choices=importer.FORMATS, help="default: by file extension")
+    imp.set_defaults(func=_import_workouts)
+
+    mig = commands.add_parser("migrate", help="Apply pending schema migrations")
+    mig.add_argument("--status", action="store_true", help="only print current/latest version")
+    mig.set_defaults(func=_migrate)
+
+    rollups = commands.add_parser(
+        "rebuild-rollups",
+        help="Recompute weekly per-exercise rollups and per-workout totals from raw sets",
+    )
+    rollups.set_defaults(func=_rebuild_rollups)
+
+    return parser
+
+
+def main(argv: list[str] | None = None) -> int:
+    args = build_parser().parse_args(argv)
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
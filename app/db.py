@@ -1,17 +1,365 @@
 import os
+import time
+from collections.abc import AsyncIterator, Callable, Iterator
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Protocol, TypeVar
 
-from sqlalchemy import create_engine
-from sqlalchemy.orm import declarative_base, sessionmaker
+from sqlalchemy import Engine, create_engine, event
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+from sqlalchemy.orm import Session, declarative_base, sessionmaker
+from sqlalchemy.pool import QueuePool
+from starlette.concurrency import run_in_threadpool
+
+from app import metrics, profiling
+from app.logging_config import get_logger
 
 DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./wagonee.db")
 
-engine = create_engine(
-    DATABASE_URL,
-    connect_args=({"check_same_thread": False} if DATABASE_URL.startswith("sqlite") else {}),
+logger = get_logger("db")
+
+# Запросы дольше порога пишутся в лог (без значений параметров)
+SLOW_QUERY_SECONDS = float(os.getenv("SLOW_QUERY_MS", "200")) / 1000
+
+# default: настройки драйвера как есть; production: WAL, PRAGMA и раздельные пулы чтения/записи
+DB_ENGINE_PROFILE = os.getenv("DB_ENGINE_PROFILE", "default")
+ENGINE_PROFILES = ("default", "production")
+if DB_ENGINE_PROFILE not in ENGINE_PROFILES:
+    raise RuntimeError(f"DB_ENGINE_PROFILE must be one of {ENGINE_PROFILES}")
+
+
+def sqlite_pragmas() -> list[tuple[str, str]]:
+    """PRAGMAs of the production profile, applied to every new SQLite connection"""
+    return [
+        ("journal_mode", "WAL"),
+        ("synchronous", "NORMAL"),
+        ("busy_timeout", os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000")),
+        ("mmap_size", os.getenv("SQLITE_MMAP_SIZE", str(256 * 1024 * 1024))),
+        ("cache_size", os.getenv("SQLITE_CACHE_SIZE", "-65536")),  # < 0: KiB, т.е. 64 МБ
+        ("temp_store", "MEMORY"),
+    ]
+
+
+def splits_reads(url: str, profile: str) -> bool:
+    parsed = make_url(url)
+    return (
+        profile == "production"
+        and parsed.get_backend_name() == "sqlite"
+        and parsed.database not in (None, "", ":memory:")
+    )
+
+
+def install_sqlite_profile(
+    sync_engine: Engine, readonly: bool, pragmas: list[tuple[str, str]] | None = None
+) -> None:
+    pragmas = sqlite_pragmas() if pragmas is None else pragmas
+
+    @event.listens_for(sync_engine, "connect")
+    def apply_pragmas(dbapi_connection, connection_record):
+        # Транзакциями управляем сами (см. begin ниже), а не модуль sqlite3
+        dbapi_connection.isolation_level = None
+        cursor = dbapi_connection.cursor()
+        for name, value in pragmas:
+            cursor.execute(f"PRAGMA {name}={value}")
+        if readonly:
+            cursor.execute("PRAGMA query_only=ON")
+        cursor.close()
+
+    @event.listens_for(sync_engine, "begin")
+    def begin(conn):
+        # Писатель сразу берет RESERVED-блокировку: конкурирующие записи ждут busy_timeout,
+        # а не падают с "database is locked" при апгрейде читающей транзакции
+        conn.exec_driver_sql("BEGIN" if readonly else "BEGIN IMMEDIATE")
+
+
+def engine_options(url: str, profile: str, readonly: bool = False) -> dict:
+    options: dict = {}
+    if make_url(url).get_backend_name() == "sqlite":
+        options["connect_args"] = {"check_same_thread": False}
+        if splits_reads(url, profile):
+            # SQLite допускает одного писателя: писатели процесса ждут в пуле, а не в файле
+            pool_env = "SQLITE_READ_POOL_SIZE" if readonly else "SQLITE_WRITE_POOL_SIZE"
+            options["pool_size"] = int(os.getenv(pool_env, "8" if readonly else "1"))
+            options["max_overflow"] = 0
+            options["pool_timeout"] = 30
+    return options
+
+
+@dataclass
+class QueryStats:
+    """SQL statements run on behalf of one request"""
+
+    correlation_id: str
+    count: int = 0
+    seconds: float = 0.0
+
+
+# Ставится middleware на каждый запрос. Контекст копируется в threadpool и в
+# run_sync, так что хуки ниже видят тот же объект и дописывают в него
+query_stats_ctx: ContextVar[QueryStats | None] = ContextVar("query_stats", default=None)
+
+
+# BEGIN [IMMEDIATE] из install_sqlite_profile, SAVEPOINT и т.п. идут через курсор,
+# но это управление транзакцией, а не запросы: в счетчики и slow log не попадают
+TRANSACTION_CONTROL = ("BEGIN", "COMMIT", "END", "ROLLBACK", "SAVEPOINT", "RELEASE")
+
+
+def is_transaction_control(statement: str) -> bool:
+    return statement.lstrip()[:9].upper().startswith(TRANSACTION_CONTROL)
+
+
+def masked_parameters(parameters, executemany: bool) -> str:
+    """Parameter types only: values are user data and never reach the log"""
+    if executemany:
+        return f"<{len(parameters)} parameter sets>"
+    if isinstance(parameters, dict):
+        return "{" + ", ".join(f"{k}: {type(v).__name__}" for k, v in parameters.items()) + "}"
+    return "(" + ", ".join(type(v).__name__ for v in parameters) + ")"
+
+
+# Имя -> engine, чьи пулы видны на /metrics (engine.pool заменяется после dispose())
+_instrumented: dict[str, Engine] = {}
+
+
+def instrument_engine(sync_engine: Engine, name: str) -> None:
+    """
+    Statement latency histogram and pool gauges on /metrics (engine=`name`),
+    per-request query count and DB time (query_stats_ctx), slow-query log
+    """
+    labels = (name,)
+    _instrumented[name] = sync_engine
+
+    @event.listens_for(sync_engine, "before_cursor_execute")
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info["query_start"] = time.perf_counter()
+
+    @event.listens_for(sync_engine, "after_cursor_execute")
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        if is_transaction_control(statement):
+            return
+        elapsed = time.perf_counter() - conn.info["query_start"]
+        metrics.DB_QUERY_DURATION.observe(elapsed, labels)
+        stats = query_stats_ctx.get()
+        if stats is not None:
+            stats.count += 1
+            stats.seconds += elapsed
+        if elapsed >= SLOW_QUERY_SECONDS:
+            sql = " ".join(statement.split())[:1000]  # одной строкой лога
+            logger.warning(
+                f"Slow query ({elapsed * 1000:.1f} ms, {name}): {sql} "
+                f"params={masked_parameters(parameters, executemany)}"
+            )
+
+
+def _pool_stat(stat: Callable[[QueuePool], int]) -> Callable[[], dict[tuple[str, ...], float]]:
+    def collect() -> dict[tuple[str, ...], float]:
+        return {
+            (name,): stat(eng.pool)
+            for name, eng in list(_instrumented.items())
+            if isinstance(eng.pool, QueuePool)
+        }
+
+    return collect
+
+
+metrics.REGISTRY.callback(
+    "db_pool_size",
+    "Pool capacity without overflow",
+    "gauge",
+    ("engine",),
+    _pool_stat(QueuePool.size),
 )
+metrics.REGISTRY.callback(
+    "db_pool_checked_out",
+    "Connections in use by requests",
+    "gauge",
+    ("engine",),
+    _pool_stat(QueuePool.checkedout),
+)
+metrics.REGISTRY.callback(
+    "db_pool_idle",
+    "Open connections idle in the pool",
+    "gauge",
+    ("engine",),
+    _pool_stat(QueuePool.checkedin),
+)
+
+
+def make_engine(url: str = DATABASE_URL, profile: str = DB_ENGINE_PROFILE, readonly=False):
+    eng = create_engine(url, **engine_options(url, profile, readonly))
+    if splits_reads(url, profile):
+        install_sqlite_profile(eng, readonly)
+    return eng
+
+
+engine = make_engine()
+# Чтения идут через отдельный пул query_only-соединений и не стоят в очереди за записью
+read_engine = (
+    make_engine(readonly=True) if splits_reads(DATABASE_URL, DB_ENGINE_PROFILE) else engine
+)
+instrument_engine(engine, "write")
+if read_engine is not engine:
+    instrument_engine(read_engine, "read")
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+ReadSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=read_engine)
 Base = declarative_base()
 
+T = TypeVar("T")
+
+# Драйверы для async-режима; для других СУБД задайте ASYNC_DATABASE_URL явно
+ASYNC_DRIVERS = {"sqlite": "sqlite+aiosqlite"}
+
 
 def init_db():
-    Base.metadata.create_all(bind=engine)
+    """Bring the schema up to date unless migrations are run separately (DB_AUTO_MIGRATE=0)"""
+    if os.getenv("DB_AUTO_MIGRATE", "1") == "0":
+        return
+    from app import migrations  # migrations импортирует модели, а модели - этот модуль
+
+    migrations.migrate()
+
+
+class UnitOfWork:
+    """
+    One session and one transaction per request.
+    Repositories only flush; the owner of the unit of work commits once at the end.
+    """
+
+    def __init__(self, session: Session, reader: Session | None = None):
+        self.session = session
+        # Сессия для чистых чтений; без разделения пулов это та же сессия записи
+        self.reader = reader if reader is not None else session
+        self._after_commit: list[Callable[[], None]] = []
+
+    def after_commit(self, callback: Callable[[], None]) -> None:
+        """Run `callback` once the transaction is committed (cache invalidation etc.)"""
+        self._after_commit.append(callback)
+
+    def commit(self) -> None:
+        self.session.commit()
+        self.committed()
+
+    def committed(self) -> None:
+        callbacks, self._after_commit = self._after_commit, []
+        for callback in callbacks:
+            callback()
+
+    def rollback(self) -> None:
+        self.session.rollback()
+        self.rolled_back()
+
+    def rolled_back(self) -> None:
+        self._after_commit.clear()
+
+
+@contextmanager
+def unit_of_work() -> Iterator[UnitOfWork]:
+    db = SessionLocal()
+    reader = ReadSessionLocal() if read_engine is not engine else None
+    uow = UnitOfWork(db, reader)
+    try:
+        yield uow
+        uow.commit()
+    except Exception:
+        uow.rollback()
+        raise
+    finally:
+        db.close()
+        if reader is not None:
+            reader.close()
+
+
+def get_uow() -> Iterator[UnitOfWork]:
+    """FastAPI dependency: commits after the endpoint returns, rolls back if it raises"""
+    with unit_of_work() as uow:
+        yield uow
+
+
+class UnitOfWorkRunner(Protocol):
+    async def run(self, fn: Callable[[UnitOfWork], T]) -> T: ...
+
+
+class ThreadedUnitOfWork:
+    """Sync mode: service code runs in the threadpool against a blocking session"""
+
+    def __init__(self, uow: UnitOfWork):
+        self.uow = uow
+
+    async def run(self, fn: Callable[[UnitOfWork], T]) -> T:
+        return await run_in_threadpool(profiling.profiled(fn), self.uow)
+
+
+class AsyncUnitOfWork:
+    """
+    Async mode: the same repository/service code runs inside AsyncSession.run_sync,
+    i.e. in a greenlet on the event loop whose I/O is awaited, not blocked on.
+    """
+
+    def __init__(self, session: AsyncSession, reader: AsyncSession | None = None):
+        self.session = session
+        self.uow = UnitOfWork(session.sync_session, reader.sync_session if reader else None)
+
+    async def run(self, fn: Callable[[UnitOfWork], T]) -> T:
+        return await self.session.run_sync(lambda _: fn(self.uow))
+
+    async def commit(self) -> None:
+        await self.session.commit()
+        self.uow.committed()
+
+    async def rollback(self) -> None:
+        await self.session.rollback()
+        self.uow.rolled_back()
+
+
+def async_database_url(url: str = DATABASE_URL) -> str:
+    explicit = os.getenv("ASYNC_DATABASE_URL")
+    if explicit:
+        return explicit
+    parsed = make_url(url)
+    driver = ASYNC_DRIVERS.get(parsed.get_backend_name())
+    if driver is None:
+        raise RuntimeError(f"No async driver configured for {parsed.drivername}")
+    return parsed.set(drivername=driver).render_as_string(hide_password=False)
+
+
+def _async_session_factory(readonly: bool) -> async_sessionmaker[AsyncSession]:
+    async_engine = create_async_engine(
+        async_database_url(), **engine_options(DATABASE_URL, DB_ENGINE_PROFILE, readonly)
+    )
+    if splits_reads(DATABASE_URL, DB_ENGINE_PROFILE):
+        install_sqlite_profile(async_engine.sync_engine, readonly)
+    instrument_engine(async_engine.sync_engine, "async_read" if readonly else "async_write")
+    return async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+
+
+@lru_cache(maxsize=1)
+def async_session_factory() -> async_sessionmaker[AsyncSession]:
+    """Created on first use, so sync deployments never need aiosqlite"""
+    return _async_session_factory(readonly=False)
+
+
+@lru_cache(maxsize=1)
+def async_read_session_factory() -> async_sessionmaker[AsyncSession]:
+    if not splits_reads(DATABASE_URL, DB_ENGINE_PROFILE):
+        return async_session_factory()
+    return _async_session_factory(readonly=True)
+
+
+async def get_async_uow() -> AsyncIterator[AsyncUnitOfWork]:
+    """FastAPI dependency for DB_MODE=async, same commit/rollback contract as get_uow"""
+    split = async_read_session_factory() is not async_session_factory()
+    async with async_session_factory()() as session:
+        reader = async_read_session_factory()() if split else None
+        uow = AsyncUnitOfWork(session, reader)
+        try:
+            yield uow
+            await uow.commit()
+        except Exception:
+            await uow.rollback()
+            raise
+        finally:
+            if reader is not None:
+                await reader.close()
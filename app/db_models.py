@@ -1,38 +1,104 @@
-from uuid import uuid4
+import os
+import time
+import uuid
 
-from sqlalchemy import Column, Date, ForeignKey, Integer, Numeric, String
+from sqlalchemy import Column, Date, ForeignKey, Index, Integer, LargeBinary, Numeric, String
 from sqlalchemy.orm import relationship
+from sqlalchemy.types import TypeDecorator
 
 from app.db import Base
 
 
-def gen_uuid():
-    return str(uuid4())
+def uuid7() -> uuid.UUID:
+    """
+    Time-ordered UUID (RFC 9562, version 7): 48-bit Unix time in ms + random bits,
+    so new public ids are appended to the right edge of the unique index.
+    """
+    value = (time.time_ns() // 1_000_000) << 80 | int.from_bytes(os.urandom(10), "big")
+    value = value & ~(0xF << 76) | 0x7 << 76  # version
+    value = value & ~(0x3 << 62) | 0x2 << 62  # variant
+    return uuid.UUID(int=value)
+
+
+class PublicId(TypeDecorator):
+    """UUID stored as 16 raw bytes instead of 36 characters; binds str or UUID"""
+
+    impl = LargeBinary(16)
+    cache_ok = True
+
+    def process_bind_param(self, value, dialect):
+        if value is None:
+            return None
+        return (value if isinstance(value, uuid.UUID) else uuid.UUID(value)).bytes
+
+    def process_result_value(self, value, dialect):
+        return None if value is None else uuid.UUID(bytes=value)
+
+
+# Первичные ключи - внутренние целые (rowid в SQLite): компактные индексы и FK,
+# вставка в конец B-дерева. Наружу API отдает только public_id.
 
 
 class Exercise(Base):
     __tablename__ = "exercises"
 
-    id = Column(String, primary_key=True, default=gen_uuid)
-    name = Column(String(100), nullable=False)
+    id = Column(Integer, primary_key=True)
+    public_id = Column(PublicId, nullable=False, unique=True, index=True, default=uuid7)
+    name = Column(String(100), nullable=False, index=True)
     description = Column(String(500), nullable=True)
 
 
 class Workout(Base):
     __tablename__ = "workouts"
 
-    id = Column(String, primary_key=True, default=gen_uuid)
+    id = Column(Integer, primary_key=True)
+    public_id = Column(PublicId, nullable=False, unique=True, index=True, default=uuid7)
     workout_date = Column(Date, nullable=False)
     note = Column(String, nullable=True)
+    # Растет при каждом изменении тренировки (новые подходы): из него строится ETag
+    version = Column(Integer, nullable=False, default=1, server_default="1")
+    # Денормализованные итоги подходов (календарь, ?view=summary): обновляются в той же
+    # транзакции, что и вставка подходов
+    set_count = Column(Integer, nullable=False, default=0, server_default="0")
+    total_volume = Column(Numeric(14, 2), nullable=False, default=0, server_default="0")
     sets = relationship("Set", back_populates="workout", cascade="all, delete-orphan")
 
+    # Ключ keyset-пагинации GET /workouts/
+    __table_args__ = (Index("ix_workouts_date_id", "workout_date", "id"),)
+
 
 class Set(Base):
     __tablename__ = "sets"
 
-    id = Column(String, primary_key=True, default=gen_uuid)
+    id = Column(Integer, primary_key=True)
+    public_id = Column(PublicId, nullable=False, unique=True, index=True, default=uuid7)
     reps = Column(Integer, nullable=False)
     weight = Column(Numeric(6, 2), nullable=False)
-    exercise_name = Column(String, nullable=False)
-    workout_id = Column(String, ForeignKey("workouts.id"), nullable=False)
+    exercise_id = Column(Integer, ForeignKey("exercises.id"), nullable=False, index=True)
+    workout_id = Column(Integer, ForeignKey("workouts.id"), nullable=False, index=True)
     workout = relationship("Workout", back_populates="sets")
+    exercise = relationship("Exercise")
+
+
+class ExerciseWeekStats(Base):
+    """Rollup of the sets of one exercise in one ISO week, see app/rollups.py"""
+
+    __tablename__ = "exercise_week_stats"
+
+    exercise_id = Column(Integer, ForeignKey("exercises.id"), primary_key=True)
+    week_start = Column(Date, primary_key=True)
+    set_count = Column(Integer, nullable=False)
+    total_reps = Column(Integer, nullable=False)
+    total_volume = Column(Numeric(14, 2), nullable=False)
+    best_weight = Column(Numeric(6, 2), nullable=False)
+    best_reps = Column(Integer, nullable=False)
+    best_e1rm = Column(Numeric(8, 2), nullable=False)
+
+
+class ResourceVersion(Base):
+    """Change counter of a collection (workout list, exercise catalogue), for ETags"""
+
+    __tablename__ = "resource_versions"
+
+    name = Column(String(50), primary_key=True)
+    version = Column(Integer, nullable=False)
@@ -0,0 +1,254 @@
+"""
+Bulk import of historical workouts (onboarding from other trackers).
+
+Input is streamed line by line and validated with the same rules as the API
+(WorkoutCreate/SetBase); valid rows are written with chunked executemany
+inserts, one transaction per chunk. Invalid rows are skipped and reported.
+
+Formats:
+  ndjson - one workout per line, same shape as GET /workouts/export:
+           {"workout_date": "...", "note": "...", "sets": [{"exercise_name", "reps", "weight"}]}
+  csv    - one set per row with header workout_date,exercise_name,reps,weight
+           (optional: note, workout_key); consecutive rows with the same
+           workout_key (or workout_date + note) form one workout.
+"""
+
+import csv
+from collections.abc import Iterable, Iterator
+from decimal import Decimal
+from typing import BinaryIO
+
+from pydantic import ValidationError
+from sqlalchemy import insert, select
+
+from app import db_models, schemas
+from app.db import UnitOfWork, unit_of_work
+from app.repositories import (
+    EXERCISE_CATALOGUE,
+    WORKOUT_LIST,
+    ExerciseStatsRepository,
+    VersionRepository,
+)
+from app.services import invalidate_exercise_catalogue
+
+FORMATS = ("ndjson", "csv")
+IMPORT_CHUNK_SETS = 5000
+MAX_IMPORT_BYTES = 50_000_000
+MAX_REPORTED_ERRORS = 100
+CSV_REQUIRED_COLUMNS = {"workout_date", "exercise_name", "reps", "weight"}
+
+ParsedRow = tuple[int, schemas.WorkoutImport | str]
+
+
+class ImportFormatError(ValueError):
+    """The file as a whole cannot be parsed (unknown format, bad CSV header)"""
+
+
+def _describe(exc: ValidationError) -> str:
+    return "; ".join(
+        f"{'.'.join(str(p) for p in err['loc']) or 'row'}: {err['msg']}" for err in exc.errors()
+    )
+
+
+def _decoded(lines: Iterable[bytes]) -> Iterator[tuple[int, str | None]]:
+    for line_no, raw in enumerate(lines, start=1):
+        try:
+            yield line_no, raw.decode("utf-8")
+        except UnicodeDecodeError:
+            yield line_no, None
+
+
+def parse_ndjson(lines: Iterable[bytes]) -> Iterator[ParsedRow]:
+    for line_no, text in _decoded(lines):
+        if text is None:
+            yield line_no, "invalid UTF-8"
+            continue
+        if not text.strip():
+            continue
+        try:
+            yield line_no, schemas.WorkoutImport.model_validate_json(text)
+        except ValidationError as e:
+            yield line_no, _describe(e)
+
+
+class _StrictLines:
+    """Strictly decoded lines for csv; the numbers of undecodable lines are kept"""
+
+    def __init__(self, lines: Iterable[bytes]):
+        self.lines = lines
+        self.invalid: list[int] = []
+
+    def __iter__(self) -> Iterator[str]:
+        for line_no, text in _decoded(self.lines):
+            if text is None:
+                # Пустая строка вместо битой: DictReader ее пропустит, а номера строк
+                # (reader.line_num) не собьются; сама строка уходит в отчет об ошибках
+                self.invalid.append(line_no)
+                text = "\n"
+            yield text
+
+    def errors(self) -> Iterator[ParsedRow]:
+        while self.invalid:
+            yield self.invalid.pop(0), "invalid UTF-8"
+
+
+def parse_csv(lines: Iterable[bytes]) -> Iterator[ParsedRow]:
+    text = _StrictLines(lines)
+    reader = csv.DictReader(iter(text))
+    columns = set(reader.fieldnames or ())  # читает заголовок
+    if text.invalid[:1] == [1]:
+        raise ImportFormatError("CSV header is not valid UTF-8")
+    if not CSV_REQUIRED_COLUMNS <= columns:
+        missing = ", ".join(sorted(CSV_REQUIRED_COLUMNS - columns))
+        raise ImportFormatError(f"CSV header is missing columns: {missing}")
+
+    current_key: object = None
+    current: dict | None = None
+    start_line = 0
+
+    def flush() -> Iterator[ParsedRow]:
+        if current is None:
+            return
+        try:
+            yield start_line, schemas.WorkoutImport.model_validate(current)
+        except ValidationError as e:
+            yield start_line, _describe(e)
+
+    for row in reader:
+        yield from text.errors()
+        line_no = reader.line_num
+        key = row.get("workout_key") or (row["workout_date"], row.get("note"))
+        if current is None or key != current_key:
+            yield from flush()
+            current_key = key
+            current = {
+                "workout_date": row["workout_date"],
+                "note": row.get("note") or None,
+                "sets": [],
+            }
+            start_line = line_no
+        if not row["exercise_name"]:
+            continue  # строка только с тренировкой, без подходов
+        try:
+            current["sets"].append(
+                schemas.SetImport(
+                    exercise_name=row["exercise_name"], reps=row["reps"], weight=row["weight"]
+                )
+            )
+        except ValidationError as e:
+            yield line_no, _describe(e)
+    yield from text.errors()
+    yield from flush()
+
+
+def _chunks(rows: Iterable[ParsedRow], report: schemas.ImportReport, max_sets: int):
+    chunk: list[schemas.WorkoutImport] = []
+    n_sets = 0
+    for line_no, item in rows:
+        if isinstance(item, str):
+            report.error_count += 1
+            if len(report.errors) < MAX_REPORTED_ERRORS:
+                report.errors.append(schemas.ImportRowError(line=line_no, error=item))
+            continue
+        chunk.append(item)
+        n_sets += len(item.sets)
+        if n_sets >= max_sets:
+            yield chunk
+            chunk, n_sets = [], 0
+    if chunk:
+        yield chunk
+
+
+class WorkoutImporter:
+    def __init__(self, uow: UnitOfWork, chunk_sets: int = IMPORT_CHUNK_SETS):
+        self.uow = uow
+        self.db = uow.session
+        self.chunk_sets = chunk_sets
+        self._exercise_ids: dict[str, int] = {}  # название -> id
+
+    def _ensure_exercises(self, names: set[str], report: schemas.ImportReport) -> None:
+        """Resolve exercise names to ids; unknown names are added to the catalogue"""
+        names -= self._exercise_ids.keys()
+        if not names:
+            return
+        found = self.db.execute(
+            select(db_models.Exercise.name, db_models.Exercise.id)
+            .where(db_models.Exercise.name.in_(names))
+            .order_by(db_models.Exercise.id)
+        )
+        for name, ex_id in found:
+            self._exercise_ids.setdefault(name, ex_id)  # одинаковые названия: меньший id
+        missing = names - self._exercise_ids.keys()
+        if missing:
+            table = db_models.Exercise.__table__
+            created = self.db.execute(
+                insert(table).returning(table.c.name, table.c.id),
+                [{"name": name} for name in sorted(missing)],
+            )
+            self._exercise_ids.update((name, ex_id) for name, ex_id in created)
+            report.exercises_created += len(missing)
+            VersionRepository(self.db).bump(EXERCISE_CATALOGUE)
+            self.uow.after_commit(invalidate_exercise_catalogue)
+
+    def _write_chunk(
+        self, chunk: list[schemas.WorkoutImport], report: schemas.ImportReport
+    ) -> None:
+        self._ensure_exercises({s.exercise_name for w in chunk for s in w.sets}, report)
+        workouts = db_models.Workout.__table__
+        # Целочисленные id знает только база: забираем их через RETURNING в порядке строк
+        workout_ids = self.db.scalars(
+            insert(workouts).returning(workouts.c.id, sort_by_parameter_order=True),
+            [
+                {
+                    "workout_date": w.workout_date,
+                    "note": w.note,
+                    "set_count": len(w.sets),
+                    "total_volume": sum((s.reps * s.weight for s in w.sets), Decimal(0)),
+                }
+                for w in chunk
+            ],
+        ).all()
+        set_rows = [
+            {
+                "workout_id": workout_id,
+                "exercise_id": self._exercise_ids[s.exercise_name],
+                "reps": s.reps,
+                "weight": s.weight,
+            }
+            for workout_id, w in zip(workout_ids, chunk, strict=True)
+            for s in w.sets
+        ]
+        if set_rows:
+            self.db.execute(insert(db_models.Set.__table__), set_rows)
+            ExerciseStatsRepository(self.db).record(
+                (self._exercise_ids[s.exercise_name], w.workout_date, s.reps, s.weight)
+                for w in chunk
+                for s in w.sets
+            )
+        VersionRepository(self.db).bump(WORKOUT_LIST)
+        self.uow.commit()
+        report.workouts_imported += len(workout_ids)
+        report.sets_imported += len(set_rows)
+
+    def run(self, rows: Iterable[ParsedRow]) -> schemas.ImportReport:
+        report = schemas.ImportReport()
+        for chunk in _chunks(rows, report, self.chunk_sets):
+            self._write_chunk(chunk, report)
+        return report
+
+
+def import_file(fileobj: BinaryIO, fmt: str) -> schemas.ImportReport:
+    if fmt not in FORMATS:
+        raise ImportFormatError(f"Unsupported import format: {fmt}")
+    parse = parse_ndjson if fmt == "ndjson" else parse_csv
+    with unit_of_work() as uow:
+        return WorkoutImporter(uow).run(parse(fileobj))
+
+
+def format_from_content_type(content_type: str) -> str | None:
+    media_type = content_type.split(";", 1)[0].strip().lower()
+    return {
+        "application/x-ndjson": "ndjson",
+        "application/jsonl": "ndjson",
+        "text/csv": "csv",
+    }.get(media_type)
@@ -1,63 +1,136 @@
 """
 Logging configuration with sensitive data masking.
 All logs include correlation_id for request tracing.
+
+Records go through a QueueHandler: the calling thread (often the event loop) only
+stamps the correlation_id and enqueues the record; masking, formatting and the
+write to stdout happen on the QueueListener thread. The queue is bounded
+(LOG_QUEUE_SIZE): under a burst that outpaces stdout, records are dropped and
+counted instead of blocking requests.
+
+LOG_FORMAT=json switches to one JSON object per line.
 """
 
+import atexit
+import json
 import logging
+import os
+import queue
 import re
 from contextvars import ContextVar
+from logging.handlers import QueueHandler, QueueListener
 
 correlation_id_ctx: ContextVar[str] = ContextVar("correlation_id", default="")
 
+TEXT_FORMAT = "%(asctime)s - %(name)s - %(levelname)s - [%(correlation_id)s] - %(message)s"
+
 
 class SensitiveDataFilter(logging.Filter):
-    """Filter to mask sensitive data in logs"""
-
-    PATTERNS = [
-        (re.compile(r'"password"\s*:\s*"[^"]*"'), '"password":"***"'),
-        (re.compile(r'"token"\s*:\s*"[^"]*"'), '"token":"***"'),
-        (re.compile(r'"api_key"\s*:\s*"[^"]*"'), '"api_key":"***"'),
-        (re.compile(r'"secret"\s*:\s*"[^"]*"'), '"secret":"***"'),
-        (
-            re.compile(r"\b[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Z|a-z]{2,}\b"),
-            "***@***.***",
-        ),
-    ]
+    """Filter to mask sensitive data in logs: one combined pattern, one pass per message"""
+
+    SECRET_KEYS = ("password", "token", "api_key", "secret")
+    PATTERN = re.compile(
+        r'"(?P<key>' + "|".join(SECRET_KEYS) + r')"\s*:\s*"[^"]*"'
+        r"|\b[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Z|a-z]{2,}\b"
+    )
+
+    @staticmethod
+    def _replace(match: re.Match) -> str:
+        key = match.group("key")
+        return f'"{key}":"***"' if key else "***@***.***"
+
+    def mask(self, message: str) -> str:
+        return self.PATTERN.sub(self._replace, message)
 
     def filter(self, record: logging.LogRecord) -> bool:
-        message = record.getMessage()
-        for pattern, replacement in self.PATTERNS:
-            message = pattern.sub(replacement, message)
-        record.msg = message
+        record.msg = self.mask(record.getMessage())
         record.args = ()
         return True
 
 
-class CorrelationIdFilter(logging.Filter):
-    """Adds correlation_id to each log record"""
+class JsonFormatter(logging.Formatter):
+    """One JSON object per record (for log shippers)"""
 
-    def filter(self, record: logging.LogRecord) -> bool:
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "time": self.formatTime(record),
+            "level": record.levelname,
+            "logger": record.name,
+            "correlation_id": getattr(record, "correlation_id", "N/A"),
+            "message": record.getMessage(),
+        }
+        if record.exc_info:
+            entry["exc_info"] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False)
+
+
+class NonBlockingQueueHandler(QueueHandler):
+    """
+    Request-path half of the pipeline. prepare() does only what has to happen on
+    the calling thread: read the correlation_id contextvar and freeze the message
+    arguments. A full queue drops the record (counted in `dropped`).
+    """
+
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Как и QueueHandler.prepare, запись меняется на месте, без копирования
         record.correlation_id = correlation_id_ctx.get() or "N/A"
-        return True
+        if record.args:
+            # Аргументы могут измениться после возврата из вызова логгера
+            record.msg = record.getMessage()
+            record.args = ()
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+_listener: QueueListener | None = None
+_queue_handler: NonBlockingQueueHandler | None = None
+
+
+def build_output_handler(fmt: str = "text", stream=None) -> logging.Handler:
+    """Listener-side handler: masking + formatting + I/O"""
+    handler = logging.StreamHandler(stream)
+    handler.setFormatter(JsonFormatter() if fmt == "json" else logging.Formatter(TEXT_FORMAT))
+    handler.addFilter(SensitiveDataFilter())
+    return handler
 
 
 def setup_logging() -> None:
-    """Setup application logging"""
+    """Setup application logging; repeated calls (re-imported app.main) are no-ops"""
+    global _listener, _queue_handler
+    if _listener is not None:
+        return
     logger = logging.getLogger("app")
-    logger.setLevel(logging.INFO)
+    logger.setLevel(os.getenv("LOG_LEVEL", "info").upper())
 
-    console_handler = logging.StreamHandler()
-    console_handler.setLevel(logging.INFO)
+    log_queue: queue.Queue = queue.Queue(maxsize=int(os.getenv("LOG_QUEUE_SIZE", "10000")))
+    _queue_handler = NonBlockingQueueHandler(log_queue)
+    _listener = QueueListener(log_queue, build_output_handler(os.getenv("LOG_FORMAT", "text")))
+    _listener.start()
+    logger.addHandler(_queue_handler)
+    atexit.register(shutdown_logging)
 
-    formatter = logging.Formatter(
-        "%(asctime)s - %(name)s - %(levelname)s - [%(correlation_id)s] - %(message)s"
-    )
-    console_handler.setFormatter(formatter)
 
-    console_handler.addFilter(SensitiveDataFilter())
-    console_handler.addFilter(CorrelationIdFilter())
+def shutdown_logging() -> None:
+    """Flush the queue and stop the listener thread"""
+    global _listener, _queue_handler
+    if _listener is None:
+        return
+    logging.getLogger("app").removeHandler(_queue_handler)
+    _listener.stop()
+    _listener = _queue_handler = None
+
 
-    logger.addHandler(console_handler)
+def dropped_records() -> int:
+    return _queue_handler.dropped if _queue_handler is not None else 0
 
 
 def get_logger(name: str) -> logging.Logger:
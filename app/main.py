@@ -1,14 +1,29 @@
+import os
+import tempfile
+from collections.abc import AsyncIterator
 from contextlib import asynccontextmanager
+from typing import Annotated, Literal
 from uuid import UUID, uuid4
 
-from fastapi import FastAPI, HTTPException, Request, status
+from fastapi import Depends, FastAPI, HTTPException, Query, Request, Response, status
+from fastapi.concurrency import contextmanager_in_threadpool, run_in_threadpool
 from fastapi.exceptions import RequestValidationError
-from fastapi.responses import JSONResponse
-
-from app import schemas, services
-from app.db import init_db
-from app.logging_config import correlation_id_ctx, get_logger, setup_logging
-from app.middleware import RateLimiter
+from fastapi.responses import FileResponse, JSONResponse, StreamingResponse
+from pydantic import TypeAdapter
+
+from app import importer, metrics, profiling, ratelimit, schemas, services
+from app.db import (
+    ThreadedUnitOfWork,
+    UnitOfWork,
+    UnitOfWorkRunner,
+    get_async_uow,
+    get_uow,
+    init_db,
+    unit_of_work,
+)
+from app.logging_config import correlation_id_ctx, dropped_records, get_logger, setup_logging
+from app.middleware import QueryBudgets, RateLimiter, RequestMiddleware
+from app.pagination import DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE, InvalidCursorError
 
 setup_logging()
 logger = get_logger("main")
@@ -20,7 +35,63 @@ app = FastAPI(
 )
 
 
-app.middleware("http")(RateLimiter())
+RATE_LIMIT_PER_MINUTE = 1000
+
+# SQL-запросов на один вызов маршрута. Не зависят от размера данных: рост числа
+# означает N+1 или лишний круг к БД. Бюджет - худший случай: пустые кэши (упражнений,
+# JSON тренировок, снимок аналитики) после рестарта или сброса. QUERY_BUDGET_MODE=raise
+# включен в тестах
+QUERY_BUDGETS = {
+    ("POST", "/workouts/"): 2,
+    # версия списка + страница + подходы; версия читается дважды при устаревшем If-None-Match
+    ("GET", "/workouts/"): 4,
+    ("GET", "/workouts/{workout_id}"): 3,  # версия для If-None-Match + тренировка + подходы
+    ("POST", "/workouts/{workout_id}/sets"): 7,
+    ("POST", "/workouts/{workout_id}/sets:batch"): 9,
+    ("POST", "/exercises/"): 2,
+    ("GET", "/exercises/"): 3,
+    ("GET", "/analytics/exercises/{exercise_id}"): 2,  # упражнение + его статистика
+    # снимок колонок (если еще не загружен) + версия и список справочника
+    ("GET", "/analytics/exercises"): 3,
+    ("GET", "/analytics/weekly"): 4,  # то же + упражнение из ?exercise_id=
+    ("GET", "/analytics/exercises/{exercise_id}/progression"): 2,
+}
+
+# Профилирование по заголовку X-Profile; None, пока не задан PROFILING_SECRET
+PROFILER = profiling.profiler_from_env()
+
+app.middleware("http")(
+    RequestMiddleware(
+        RateLimiter(
+            RATE_LIMIT_PER_MINUTE, backend=ratelimit.backend_from_env(RATE_LIMIT_PER_MINUTE)
+        ),
+        query_budgets=QueryBudgets(QUERY_BUDGETS, os.getenv("QUERY_BUDGET_MODE", "off")),
+        server_timing_header=os.getenv("SERVER_TIMING", "1") == "1",
+        profiler=PROFILER,
+    )
+)
+
+
+def cache_stat(key: str):
+    return lambda: {(name,): stats[key] for name, stats in services.cache_stats().items()}
+
+
+# Уже посчитанное в других местах читается только при запросе /metrics
+for _name, _type, _key, _doc in (
+    ("cache_hits_total", "counter", "hits", "In-process cache hits"),
+    ("cache_misses_total", "counter", "misses", "In-process cache misses"),
+    ("cache_evictions_total", "counter", "evictions", "Entries evicted by the LRU bounds"),
+    ("cache_entries", "gauge", "entries", "Entries held by the cache"),
+    ("cache_size_bytes", "gauge", "size_bytes", "Bytes held by byte-budgeted caches"),
+):
+    metrics.REGISTRY.callback(_name, _doc, _type, ("cache",), cache_stat(_key))
+metrics.REGISTRY.callback(
+    "log_records_dropped_total",
+    "Log records dropped because the log queue was full",
+    "counter",
+    (),
+    lambda: {(): dropped_records()},
+)
 
 
 def problem(
@@ -82,46 +153,251 @@ async def general_exception_handler(request: Request, exc: Exception):
 
 try:
     init_db()
+    db_initialized = True
 except Exception as e:
     logger.warning(f"Database initialization failed at startup: {e}")
+    db_initialized = False
+
 
-    @asynccontextmanager
-    async def lifespan(app: FastAPI):
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    if not db_initialized:
         try:
             init_db()
         except Exception as e:
             logger.warning(f"Database initialization failed in lifespan: {e}")
-        yield
+    # Снимок для дашбордов грузится в фоновом потоке воркера, а не в первом запросе
+    services.columns_snapshot.start()
+    metrics.start_publisher()  # только при заданном METRICS_DIR
+    yield
+    await run_in_threadpool(metrics.stop_publisher)
+    await run_in_threadpool(services.columns_snapshot.stop)
+
+
+app.router.lifespan_context = lifespan
+
+
+# sync: сервисы в threadpool поверх блокирующей сессии; async: AsyncEngine (aiosqlite)
+DB_MODE = os.getenv("DB_MODE", "sync")
+if DB_MODE not in ("sync", "async"):
+    raise RuntimeError(f"DB_MODE must be 'sync' or 'async', got {DB_MODE!r}")
+
+
+# Фабрики ниже - async def: обычную def FastAPI отправил бы в threadpool ради одного конструктора
+async def get_threaded_uow(uow: UnitOfWork = Depends(get_uow)) -> ThreadedUnitOfWork:
+    return ThreadedUnitOfWork(uow)
+
+
+get_runner = get_async_uow if DB_MODE == "async" else get_threaded_uow
+
+
+@asynccontextmanager
+async def runner_scope() -> AsyncIterator[UnitOfWorkRunner]:
+    """
+    get_runner opened by hand, with the same commit/rollback contract, for routes
+    that answer from a cache and should not open a session on a hit
+    """
+    if DB_MODE == "async":
+        async with asynccontextmanager(get_async_uow)() as uow:
+            yield uow
+    else:
+        async with contextmanager_in_threadpool(unit_of_work()) as uow:
+            yield ThreadedUnitOfWork(uow)
+
+
+async def get_exercise_service(
+    runner: UnitOfWorkRunner = Depends(get_runner),
+) -> services.AsyncExerciseService:
+    return services.AsyncExerciseService(runner)
 
-    app.router.lifespan_context = lifespan
 
+async def get_workout_service(
+    runner: UnitOfWorkRunner = Depends(get_runner),
+) -> services.AsyncWorkoutService:
+    return services.AsyncWorkoutService(runner)
 
-exercise_service = services.ExerciseService()
-workout_service = services.WorkoutService()
+
+async def get_analytics_service(
+    runner: UnitOfWorkRunner = Depends(get_runner),
+) -> services.AsyncAnalyticsService:
+    return services.AsyncAnalyticsService(runner)
+
+
+async def get_dashboard_service(
+    runner: UnitOfWorkRunner = Depends(get_runner),
+) -> services.AsyncDashboardService:
+    return services.AsyncDashboardService(runner)
+
+
+ExerciseServiceDep = Annotated[services.AsyncExerciseService, Depends(get_exercise_service)]
+WorkoutServiceDep = Annotated[services.AsyncWorkoutService, Depends(get_workout_service)]
+AnalyticsServiceDep = Annotated[services.AsyncAnalyticsService, Depends(get_analytics_service)]
+DashboardServiceDep = Annotated[services.AsyncDashboardService, Depends(get_dashboard_service)]
+
+
+def etag(kind: str, version: int) -> str:
+    return f'"{kind}-{version}"'
+
+
+def etag_matches(request: Request, tag: str) -> bool:
+    """If-None-Match check (weak comparison, RFC 9110 13.1.2)"""
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    return tag in (t.strip().removeprefix("W/") for t in header.split(","))
+
+
+def not_modified(tag: str) -> Response:
+    return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers={"ETag": tag})
+
+
+# Списки отдаются готовыми байтами: модели, вернувшиеся из маршрута, FastAPI
+# заново валидирует по response_model и кодирует через jsonable_encoder + json.dumps.
+# response_model у маршрутов остается - он описывает схему в OpenAPI
+EXERCISE_LIST_JSON = TypeAdapter(list[schemas.ExerciseRead])
+
+
+def json_response(adapter: TypeAdapter, content, headers: dict[str, str] | None = None):
+    return Response(adapter.dump_json(content), media_type="application/json", headers=headers)
 
 
 @app.get("/health", summary="Корневой эндпоинт")
-def read_root():
+async def read_root():
     return {"message": "Welcome to Workout Log API!"}
 
 
+@app.get("/metrics", include_in_schema=False)
+async def get_metrics():
+    """Prometheus text format; with METRICS_DIR set it reads the snapshot files, off the loop"""
+    body = await run_in_threadpool(metrics.exposition)
+    return Response(body, media_type=metrics.CONTENT_TYPE)
+
+
+@app.get("/debug/profiles/{profile_id}", include_in_schema=False)
+async def download_profile(
+    profile_id: str, request: Request, kind: Literal["cpu", "memory"] = "cpu"
+):
+    """Stored request profile; needs the same X-Profile secret that requested it"""
+    if PROFILER is None or not PROFILER.authorized(request.headers.get(profiling.PROFILE_HEADER)):
+        # Без секрета эндпойнт неотличим от несуществующего
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Not Found")
+    path = PROFILER.path(profile_id, kind)
+    if path is None or not path.is_file():
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Profile not found")
+    media_type = "application/octet-stream" if kind == "cpu" else "text/plain"
+    return FileResponse(path, media_type=media_type, filename=path.name)
+
+
 @app.post(
     "/workouts/",
     response_model=schemas.WorkoutRead,
     status_code=status.HTTP_201_CREATED,
     summary="Create new workout",
 )
-def create_workout(workout_in: schemas.WorkoutCreate):
-    return workout_service.create_workout(workout_in)
+async def create_workout(workout_in: schemas.WorkoutCreate, workout_service: WorkoutServiceDep):
+    return await workout_service.create_workout(workout_in)
 
 
 @app.get(
     "/workouts/",
-    response_model=list[schemas.WorkoutRead],
-    summary="Get all workouts",
+    response_model=schemas.WorkoutPage,
+    summary="Get workouts page (newest first)",
 )
-def get_all_workouts():
-    return workout_service.list_workouts()
+async def get_all_workouts(
+    request: Request,
+    workout_service: WorkoutServiceDep,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    cursor: str | None = Query(None, max_length=200),
+    view: Literal["full", "summary"] = Query(
+        "full", description="summary: id, workout_date, set_count, total_volume; no sets"
+    ),
+    fields: str | None = Query(
+        None,
+        max_length=200,
+        description="Comma-separated WorkoutRead fields to return (id is always included); "
+        "overrides `view`",
+    ),
+):
+    selected = schemas.WORKOUT_VIEWS[view]
+    if fields is not None:
+        selected = frozenset(f.strip() for f in fields.split(",") if f.strip())
+        unknown = selected - set(schemas.WORKOUT_FIELDS)
+        if unknown:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"Unknown fields: {', '.join(sorted(unknown))}",
+            )
+    # Версия списка одна на все страницы: любая запись меняет ETag каждой из них
+    if request.headers.get("if-none-match"):
+        tag = etag("workouts", await workout_service.list_version())
+        if etag_matches(request, tag):
+            return not_modified(tag)
+    try:
+        version, body = await workout_service.list_workouts_json(
+            limit=limit, cursor=cursor, fields=selected
+        )
+    except InvalidCursorError:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid cursor"
+        ) from None
+    return Response(
+        body, media_type="application/json", headers={"ETag": etag("workouts", version)}
+    )
+
+
+@app.post(
+    "/workouts/import",
+    response_model=schemas.ImportReport,
+    summary="Bulk import workouts from NDJSON or CSV",
+    openapi_extra={
+        "requestBody": {
+            "required": True,
+            "content": {
+                "application/x-ndjson": {"schema": {"type": "string"}},
+                "text/csv": {"schema": {"type": "string"}},
+            },
+        }
+    },
+)
+async def import_workouts(request: Request):
+    fmt = importer.format_from_content_type(request.headers.get("content-type", ""))
+    if fmt is None:
+        raise HTTPException(
+            status_code=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE,
+            detail="Unsupported import format",
+        )
+    # Тело читается потоком: в памяти не больше 1 МБ, остальное уходит во временный файл
+    with tempfile.SpooledTemporaryFile(max_size=1_000_000) as buf:
+        size = 0
+        async for chunk in request.stream():
+            size += len(chunk)
+            if size > importer.MAX_IMPORT_BYTES:
+                raise HTTPException(
+                    status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                    detail="Import file too large",
+                )
+            buf.write(chunk)
+        buf.seek(0)
+        try:
+            return await run_in_threadpool(importer.import_file, buf, fmt)
+        except importer.ImportFormatError as e:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e)) from None
+
+
+@app.get(
+    "/workouts/export",
+    response_class=StreamingResponse,
+    summary="Export all workouts as NDJSON",
+)
+async def export_workouts():
+    stream = services.export_workouts_async() if DB_MODE == "async" else services.export_workouts()
+    return StreamingResponse(
+        stream,
+        media_type="application/x-ndjson",
+        headers={"Content-Disposition": 'attachment; filename="workouts.ndjson"'},
+    )
 
 
 @app.get(
@@ -129,11 +405,26 @@ def get_all_workouts():
     response_model=schemas.WorkoutRead,
     summary="Get workout by ID",
 )
-def get_workout_by_id(workout_id: UUID):
-    w = workout_service.get_workout(str(workout_id))
-    if not w:
+async def get_workout_by_id(workout_id: UUID, request: Request):
+    # Готовые байты из кэша отдаются как есть: без сессии, threadpool и Pydantic.
+    # Поэтому сервис не зависимость маршрута - сессия открывается только при промахе
+    key = str(workout_id)
+    cached = services.AsyncWorkoutService.cached_workout_json(key)
+    if cached is None:
+        async with runner_scope() as runner:
+            workout_service = services.AsyncWorkoutService(runner)
+            if request.headers.get("if-none-match"):
+                version = await workout_service.workout_version(key)
+                if version is not None and etag_matches(request, tag := etag("workout", version)):
+                    return not_modified(tag)
+            cached = await workout_service.load_workout_json(key)
+    if cached is None:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Workout not found")
-    return w
+    version, body = cached
+    tag = etag("workout", version)
+    if etag_matches(request, tag):
+        return not_modified(tag)
+    return Response(body, media_type="application/json", headers={"ETag": tag})
 
 
 @app.post(
@@ -141,15 +432,45 @@ def get_workout_by_id(workout_id: UUID):
     response_model=schemas.WorkoutRead,
     summary="Add set to workout",
 )
-def add_set_to_workout(workout_id: UUID, set_in: schemas.SetBase, exercise_id: UUID):
-    exercise_obj = exercise_service.get_exercise(str(exercise_id))
+async def add_set_to_workout(
+    workout_id: UUID,
+    set_in: schemas.SetBase,
+    exercise_id: UUID,
+    exercise_service: ExerciseServiceDep,
+    workout_service: WorkoutServiceDep,
+):
+    exercise_obj = await exercise_service.get_exercise(str(exercise_id))
     if not exercise_obj:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Exercise not found to add set",
         )
 
-    updated = workout_service.add_set(str(workout_id), set_in, exercise_obj.name)
+    updated = await workout_service.add_set(str(workout_id), set_in, exercise_obj)
+    if not updated:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Workout not found")
+    return updated
+
+
+@app.post(
+    "/workouts/{workout_id}/sets:batch",
+    response_model=schemas.WorkoutRead,
+    summary="Add several sets to workout in one transaction",
+)
+async def add_sets_batch(
+    workout_id: UUID,
+    sets_in: schemas.SetBatch,
+    exercise_service: ExerciseServiceDep,
+    workout_service: WorkoutServiceDep,
+):
+    exercises = await exercise_service.get_exercises({str(s.exercise_id) for s in sets_in})
+    try:
+        updated = await workout_service.add_sets(str(workout_id), sets_in, exercises)
+    except services.ExerciseNotFoundError:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Exercise not found to add set",
+        ) from None
     if not updated:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Workout not found")
     return updated
@@ -161,8 +482,10 @@ def add_set_to_workout(workout_id: UUID, set_in: schemas.SetBase, exercise_id: U
     status_code=status.HTTP_201_CREATED,
     summary="Create new exercise",
 )
-def create_exercise(exercise_in: schemas.ExerciseCreate):
-    return exercise_service.create_exercise(exercise_in)
+async def create_exercise(
+    exercise_in: schemas.ExerciseCreate, exercise_service: ExerciseServiceDep
+):
+    return await exercise_service.create_exercise(exercise_in)
 
 
 @app.get(
@@ -170,5 +493,61 @@ def create_exercise(exercise_in: schemas.ExerciseCreate):
     response_model=list[schemas.ExerciseRead],
     summary="Get all exercises",
 )
-def get_all_exercises():
-    return exercise_service.list_exercises()
+async def get_all_exercises(request: Request, exercise_service: ExerciseServiceDep):
+    if request.headers.get("if-none-match"):
+        tag = etag("exercises", await exercise_service.catalogue_version())
+        if etag_matches(request, tag):
+            return not_modified(tag)
+    version, exercises = await exercise_service.catalogue()
+    return json_response(EXERCISE_LIST_JSON, exercises, {"ETag": etag("exercises", version)})
+
+
+@app.get(
+    "/analytics/exercises/{exercise_id}",
+    response_model=schemas.ExerciseAnalytics,
+    summary="Training volume, best set, e1RM and weekly series for an exercise",
+)
+async def get_exercise_analytics(exercise_id: UUID, analytics_service: AnalyticsServiceDep):
+    result = await analytics_service.exercise_analytics(str(exercise_id))
+    if result is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Exercise not found")
+    return result
+
+
+@app.get(
+    "/analytics/exercises",
+    response_model=list[schemas.ExerciseSummary],
+    summary="Per-exercise totals and weight percentiles across all users",
+)
+async def get_exercise_summaries(dashboard_service: DashboardServiceDep):
+    return await dashboard_service.exercise_summaries()
+
+
+@app.get(
+    "/analytics/weekly",
+    response_model=list[schemas.ExerciseWeekVolume],
+    summary="Weekly volume per exercise across all users",
+)
+async def get_weekly_volume(
+    dashboard_service: DashboardServiceDep, exercise_id: UUID | None = None
+):
+    result = await dashboard_service.weekly_volume(str(exercise_id) if exercise_id else None)
+    if result is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Exercise not found")
+    return result
+
+
+@app.get(
+    "/analytics/exercises/{exercise_id}/progression",
+    response_model=list[schemas.ProgressionPoint],
+    summary="Weekly best e1RM and its rolling maximum across all users",
+)
+async def get_exercise_progression(
+    exercise_id: UUID,
+    dashboard_service: DashboardServiceDep,
+    window_weeks: int = Query(4, ge=1, le=52),
+):
+    result = await dashboard_service.progression(str(exercise_id), window_weeks)
+    if result is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Exercise not found")
+    return result
@@ -0,0 +1,402 @@
+"""
+In-process metrics: counters and fixed-bucket histograms, exported as Prometheus
+text on /metrics. No external service is involved.
+
+An observation costs one bisect over the bucket bounds and two increments into
+a per-thread shard, with no lock on the hot path. Values that are already
+tracked somewhere else are read by callbacks at scrape time, so the request
+path does not pay for them. This covers pool usage, cache counters and dropped
+log records.
+
+Workers: every process has its own registry. With several workers, point
+METRICS_DIR at a directory they share; like prometheus_client's multiprocess
+directory, it should be emptied on deploy. Each worker writes a snapshot there
+from a background thread every METRICS_PUBLISH_SECONDS (never from the request
+path), on scrape and on exit. /metrics on any
+worker then sums the counters and histograms of all snapshots, and reports
+gauges per live worker with a `pid` label.
+"""
+
+import atexit
+import json
+import math
+import os
+import threading
+from bisect import bisect_left
+from collections.abc import Callable
+from dataclasses import dataclass
+from pathlib import Path
+from threading import get_ident
+
+from app.logging_config import get_logger
+
+logger = get_logger("metrics")
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+METRICS_DIR = os.getenv("METRICS_DIR", "")
+PUBLISH_SECONDS = float(os.getenv("METRICS_PUBLISH_SECONDS", "5"))
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1.0)
+
+Labels = tuple[str, ...]
+
+
+@dataclass(frozen=True)
+class Family:
+    """One metric with all its label sets, as rendered on /metrics"""
+
+    name: str
+    type: str
+    documentation: str
+    labelnames: Labels
+    # histogram: счетчики по корзинам (последняя - +Inf) и сумма в конце списка
+    samples: dict[Labels, float | list[float]]
+    buckets: tuple[float, ...] = ()
+
+
+class _ThreadSharded:
+    """
+    Every thread increments only its own shard, so the hot path takes no lock: a
+    lock round trip alone costs more than the rest of an observation. Shards are
+    summed at scrape time. A shard outlives its thread, so counts are never lost.
+    """
+
+    def __init__(self, name: str, documentation: str, labelnames: Labels):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        # id потока -> метки -> значения
+        self._shards: dict[int, dict[Labels, list[float]]] = {}
+        self._lock = threading.Lock()
+
+    def _new_shard(self) -> dict[Labels, list[float]]:
+        with self._lock:
+            return self._shards.setdefault(get_ident(), {})
+
+    def _merged(self) -> dict[Labels, list[float]]:
+        with self._lock:
+            shards = list(self._shards.values())
+        merged: dict[Labels, list[float]] = {}
+        for shard in shards:
+            # list(...) копирует за один вызов под GIL, пока поток-владелец добавляет метки
+            for labels, series in list(shard.items()):
+                current = merged.get(labels)
+                merged[labels] = (
+                    list(series)
+                    if current is None
+                    else [a + b for a, b in zip(current, series, strict=True)]
+                )
+        return merged
+
+    def reset(self) -> None:
+        with self._lock:
+            self._shards = {}
+
+
+class Counter(_ThreadSharded):
+    type = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Labels = ()):
+        super().__init__(name, documentation, labelnames)
+
+    def inc(self, labels: Labels = (), amount: float = 1) -> None:
+        shard = self._shards.get(get_ident())
+        if shard is None:
+            shard = self._new_shard()
+        series = shard.get(labels)
+        if series is None:
+            shard[labels] = [amount]
+        else:
+            series[0] += amount
+
+    def collect(self) -> Family:
+        samples = {labels: series[0] for labels, series in self._merged().items()}
+        return Family(self.name, self.type, self.documentation, self.labelnames, samples)
+
+
+class Histogram(_ThreadSharded):
+    """Fixed buckets: observe() is a bisect plus two increments, nothing is stored per value"""
+
+    type = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Labels = (),
+        buckets: tuple[float, ...] = LATENCY_BUCKETS,
+    ):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, labels: Labels = ()) -> None:
+        shard = self._shards.get(get_ident())
+        if shard is None:
+            shard = self._new_shard()
+        series = shard.get(labels)
+        if series is None:
+            series = shard[labels] = [0] * (len(self.buckets) + 2)
+        series[bisect_left(self.buckets, value)] += 1  # первая корзина с границей >= value
+        series[-1] += value
+
+    def collect(self) -> Family:
+        return Family(
+            self.name, self.type, self.documentation, self.labelnames, self._merged(), self.buckets
+        )
+
+
+class CallbackMetric:
+    """Counter or gauge whose samples are read from `fn` at scrape time"""
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        type_: str,
+        labelnames: Labels,
+        fn: Callable[[], dict[Labels, float]],
+    ):
+        self.name = name
+        self.documentation = documentation
+        self.type = type_
+        self.labelnames = labelnames
+        self.fn = fn
+
+    def collect(self) -> Family:
+        return Family(self.name, self.type, self.documentation, self.labelnames, self.fn())
+
+    def reset(self) -> None:
+        pass
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics: dict[str, Counter | Histogram | CallbackMetric] = {}
+
+    def _register(self, metric):
+        if metric.name in self._metrics:
+            raise ValueError(f"Metric {metric.name!r} is already registered")
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Labels = ()) -> Counter:
+        return self._register(Counter(name, documentation, labelnames))
+
+    def histogram(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Labels = (),
+        buckets: tuple[float, ...] = LATENCY_BUCKETS,
+    ) -> Histogram:
+        return self._register(Histogram(name, documentation, labelnames, buckets))
+
+    def callback(
+        self,
+        name: str,
+        documentation: str,
+        type_: str,
+        labelnames: Labels,
+        fn: Callable[[], dict[Labels, float]],
+    ) -> None:
+        """Register or replace (re-imported app.main) a callback metric"""
+        self._metrics[name] = CallbackMetric(name, documentation, type_, labelnames, fn)
+
+    def collect(self) -> list[Family]:
+        return [metric.collect() for metric in self._metrics.values()]
+
+    def reset(self) -> None:
+        for metric in self._metrics.values():
+            metric.reset()
+
+
+def _format_value(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", r"\\").replace("\n", r"\n").replace('"', r"\"")
+
+
+def _sample(name: str, pairs: list[tuple[str, str]], value: float) -> str:
+    if not pairs:
+        return f"{name} {_format_value(value)}"
+    labels = ",".join(f'{key}="{_escape(val)}"' for key, val in pairs)
+    return f"{name}{{{labels}}} {_format_value(value)}"
+
+
+def render(families: list[Family]) -> str:
+    """Prometheus text exposition format 0.0.4"""
+    lines: list[str] = []
+    for family in families:
+        lines.append(f"# HELP {family.name} {family.documentation}")
+        lines.append(f"# TYPE {family.name} {family.type}")
+        for labels, value in sorted(family.samples.items()):
+            pairs = list(zip(family.labelnames, labels, strict=True))
+            if family.type != "histogram":
+                lines.append(_sample(family.name, pairs, value))
+                continue
+            cumulative = 0
+            for bound, count in zip((*family.buckets, math.inf), value, strict=False):
+                cumulative += count
+                le = [*pairs, ("le", _format_value(bound))]
+                lines.append(_sample(f"{family.name}_bucket", le, cumulative))
+            lines.append(_sample(f"{family.name}_sum", pairs, value[-1]))
+            lines.append(_sample(f"{family.name}_count", pairs, cumulative))
+    return "\n".join(lines) + "\n"
+
+
+# --- несколько воркеров: снимки в общем каталоге ---
+
+
+def snapshot(registry: MetricsRegistry) -> dict:
+    return {
+        "pid": os.getpid(),
+        "families": [
+            {
+                "name": f.name,
+                "type": f.type,
+                "documentation": f.documentation,
+                "labelnames": list(f.labelnames),
+                "buckets": list(f.buckets),
+                "samples": [[list(labels), value] for labels, value in f.samples.items()],
+            }
+            for f in registry.collect()
+        ],
+    }
+
+
+def write_snapshot(registry: MetricsRegistry, directory: str) -> None:
+    path = Path(directory) / f"{os.getpid()}.json"
+    tmp = path.with_suffix(".tmp")
+    tmp.write_text(json.dumps(snapshot(registry)))
+    os.replace(tmp, path)  # читатель видит либо старый, либо новый файл целиком
+
+
+def _alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def merge(snapshots: list[dict]) -> list[Family]:
+    """
+    Counters and histograms are summed over all snapshots, including those of
+    exited workers, so totals never go down. Gauges only come from live workers
+    and get a `pid` label.
+    """
+    merged: dict[str, Family] = {}
+    for snap in snapshots:
+        pid = str(snap["pid"])
+        is_alive = _alive(snap["pid"])
+        for f in snap["families"]:
+            gauge = f["type"] == "gauge"
+            if gauge and not is_alive:
+                continue
+            labelnames = ("pid", *f["labelnames"]) if gauge else tuple(f["labelnames"])
+            family = merged.get(f["name"])
+            if family is None:
+                family = merged[f["name"]] = Family(
+                    f["name"], f["type"], f["documentation"], labelnames, {}, tuple(f["buckets"])
+                )
+            for labels, value in f["samples"]:
+                key = (pid, *labels) if gauge else tuple(labels)
+                current = family.samples.get(key)
+                if current is None:
+                    family.samples[key] = value
+                elif isinstance(value, list):
+                    family.samples[key] = [a + b for a, b in zip(current, value, strict=True)]
+                else:
+                    family.samples[key] = current + value
+    return list(merged.values())
+
+
+def read_snapshots(directory: str) -> list[dict]:
+    snapshots = []
+    for path in sorted(Path(directory).glob("*.json")):
+        try:
+            snapshots.append(json.loads(path.read_text()))
+        except (OSError, ValueError):
+            continue  # файл удалили между glob и чтением
+    return snapshots
+
+
+REGISTRY = MetricsRegistry()
+
+HTTP_REQUESTS = REGISTRY.counter(
+    "http_requests_total",
+    "HTTP requests by route template and status",
+    ("method", "route", "status"),
+)
+HTTP_DURATION = REGISTRY.histogram(
+    "http_request_duration_seconds", "Request latency inside the app", ("method", "route")
+)
+HTTP_RATE_LIMITED = REGISTRY.counter(
+    "http_rate_limited_total", "Requests rejected with 429 by the rate limiter"
+)
+DB_QUERY_DURATION = REGISTRY.histogram(
+    "db_query_duration_seconds", "SQL statement latency by engine", ("engine",), QUERY_BUCKETS
+)
+
+_publisher: threading.Thread | None = None
+_stop_publisher = threading.Event()
+
+
+def publish(directory: str = METRICS_DIR) -> None:
+    if directory:
+        write_snapshot(REGISTRY, directory)
+
+
+def _publish_every(directory: str, interval: float) -> None:
+    while not _stop_publisher.wait(interval):
+        try:
+            publish(directory)
+        except OSError as e:
+            logger.warning(f"Metrics snapshot was not written: {e}")
+
+
+def start_publisher(directory: str = METRICS_DIR, interval: float = PUBLISH_SECONDS) -> None:
+    """Publish this worker's snapshot every `interval` seconds from a daemon thread"""
+    global _publisher
+    if not directory or (_publisher is not None and _publisher.is_alive()):
+        return
+    _stop_publisher.clear()
+    _publisher = threading.Thread(
+        target=_publish_every, args=(directory, interval), name="metrics-publisher", daemon=True
+    )
+    _publisher.start()
+
+
+def stop_publisher(timeout: float = 5.0) -> None:
+    global _publisher
+    _stop_publisher.set()
+    if _publisher is not None:
+        _publisher.join(timeout)
+        _publisher = None
+
+
+def observe_request(method: str, route: str, status: int, seconds: float) -> None:
+    HTTP_REQUESTS.inc((method, route, str(status)))
+    HTTP_DURATION.observe(seconds, (method, route))
+
+
+def exposition(directory: str = METRICS_DIR) -> str:
+    """Body of /metrics: this process, or all workers when METRICS_DIR is set"""
+    if not directory:
+        return render(REGISTRY.collect())
+    publish(directory)
+    return render(merge(read_snapshots(directory)))
+
+
+if METRICS_DIR:
+    atexit.register(publish)
+# После fork (gunicorn --preload) потомок не должен повторно отчитаться за счетчики родителя
+os.register_at_fork(after_in_child=REGISTRY.reset)
@@ -1,52 +1,168 @@
-import threading
 import time
-from collections import defaultdict
 from uuid import uuid4
 
 from fastapi import Request
 from fastapi.responses import JSONResponse
 
+from app import metrics
+from app.db import QueryStats, query_stats_ctx
 from app.logging_config import correlation_id_ctx, get_logger
+from app.profiling import Profiler
+from app.ratelimit import RateLimitBackend, SlidingWindowCounter
 
 logger = get_logger("middleware")
 
+# Метка route для запросов, не дошедших до маршрута (404, 429): путь запроса как
+# метка дал бы неограниченное число рядов
+UNMATCHED_ROUTE = "unmatched"
+
+
+# off: бюджеты не проверяются; warn: лог; raise: ответ заменяется на 500 (problem+json
+# обработчика ошибок приложения), в тестах - падение теста
+QUERY_BUDGET_MODES = ("off", "warn", "raise")
+
+
+class QueryBudgetExceededError(RuntimeError):
+    """A route ran more SQL statements than its budget (see QUERY_BUDGETS in app.main)"""
+
+
+def route_label(request: Request) -> str:
+    """Path template of the matched route (/workouts/{workout_id}), not the raw path"""
+    route = request.scope.get("route")
+    return route.path_format if route is not None else UNMATCHED_ROUTE
+
+
+def server_timing(stats: QueryStats, total_seconds: float) -> str:
+    return (
+        f'db;dur={stats.seconds * 1000:.2f};desc="{stats.count} queries", '
+        f"total;dur={total_seconds * 1000:.2f}"
+    )
+
 
 class RateLimiter:
-    def __init__(self, requests_per_minute: int = 1000):
+    """Per-client request limit; `check` returns the 429 response or None"""
+
+    def __init__(self, requests_per_minute: int = 1000, backend: RateLimitBackend | None = None):
         self.requests_per_minute = requests_per_minute
-        self.requests = defaultdict(list)
-        self.lock = threading.Lock()
+        self.backend = backend or SlidingWindowCounter(requests_per_minute, window_seconds=60.0)
+
+    def check(self, request: Request, cid: str) -> JSONResponse | None:
+        client_ip = request.headers.get("x-forwarded-for") or request.client.host
+        if self.backend.hit(client_ip, time.time()):
+            return None
+        logger.warning(f"Rate limit exceeded for {client_ip}")
+        metrics.HTTP_RATE_LIMITED.inc()
+        return JSONResponse(
+            status_code=429,
+            content={
+                "type": "about:blank",
+                "title": "Too Many Requests",
+                "status": 429,
+                "detail": "Rate limit exceeded. Please try again later.",
+                "correlation_id": cid,
+            },
+            headers={"X-Correlation-ID": cid},
+        )
+
+
+class QueryBudgets:
+    """(method, route template) -> most SQL statements one call may run"""
+
+    def __init__(self, budgets: dict[tuple[str, str], int] | None = None, mode: str = "off"):
+        if mode not in QUERY_BUDGET_MODES:
+            raise ValueError(f"query_budget_mode must be one of {QUERY_BUDGET_MODES}")
+        self.budgets = budgets or {}
+        self.mode = mode
+
+    def check(self, method: str, route: str, stats: QueryStats) -> None:
+        budget = self.budgets.get((method, route))
+        if self.mode == "off" or budget is None or stats.count <= budget:
+            return
+        message = f"{method} {route} ran {stats.count} SQL queries, budget is {budget}"
+        if self.mode == "raise":
+            raise QueryBudgetExceededError(message)
+        logger.warning(message)
+
+
+class RequestMiddleware:
+    """
+    The one HTTP middleware of the app: correlation id, rate limit, per-request
+    SQL stats, metrics, query budgets, Server-Timing and on-demand profiling.
+    Each concern is its own object or helper; they share one middleware layer
+    because every BaseHTTPMiddleware layer costs a task and a stream per request.
+    """
+
+    def __init__(
+        self,
+        rate_limiter: RateLimiter | None = None,
+        query_budgets: QueryBudgets | None = None,
+        server_timing_header: bool = True,
+        profiler: Profiler | None = None,
+    ):
+        self.rate_limiter = rate_limiter
+        self.query_budgets = query_budgets or QueryBudgets()
+        self.server_timing_header = server_timing_header
+        # None - профилирование выключено, запросы не платят ничего
+        self.profiler = profiler
+
+    @staticmethod
+    async def error_response(request: Request, exc: Exception):
+        """The app's own handler for unexpected errors, or a bare problem+json 500"""
+        handler = request.app.exception_handlers.get(Exception)
+        if handler is not None:
+            return await handler(request, exc)
+        logger.error(f"Unexpected error: {type(exc).__name__}: {exc}")
+        return JSONResponse(
+            status_code=500,
+            content={
+                "type": "about:blank",
+                "title": "Internal Server Error",
+                "status": 500,
+                "detail": "An unexpected error occurred. Please contact support.",
+                "correlation_id": correlation_id_ctx.get(),
+            },
+        )
 
     async def __call__(self, request: Request, call_next):
+        start = time.perf_counter()
         # Генерируем или берем correlation_id из заголовка запроса
         cid = request.headers.get("X-Correlation-ID", str(uuid4()))
         correlation_id_ctx.set(cid)
+        stats = QueryStats(cid)
+        query_stats_ctx.set(stats)
 
-        client_ip = request.headers.get("x-forwarded-for") or request.client.host
-        now = time.time()
-
-        with self.lock:
-            self.requests[client_ip] = [
-                req_time for req_time in self.requests[client_ip] if now - req_time < 60
-            ]
-
-            if len(self.requests[client_ip]) >= self.requests_per_minute:
-                logger.warning(f"Rate limit exceeded for {client_ip}")
-                return JSONResponse(
-                    status_code=429,
-                    content={
-                        "type": "about:blank",
-                        "title": "Too Many Requests",
-                        "status": 429,
-                        "detail": "Rate limit exceeded. Please try again later.",
-                        "correlation_id": cid,
-                    },
-                    headers={"X-Correlation-ID": cid},
+        if self.rate_limiter is not None:
+            rejected = self.rate_limiter.check(request, cid)
+            if rejected is not None:
+                metrics.observe_request(
+                    request.method, UNMATCHED_ROUTE, 429, time.perf_counter() - start
                 )
+                return rejected
 
-            self.requests[client_ip].append(now)
-
-        response = await call_next(request)
+        profile = self.profiler.start(request.headers, cid) if self.profiler is not None else None
+        try:
+            response = await call_next(request)
+        except Exception:
+            # Необработанное исключение превратится в 500 уже снаружи middleware
+            metrics.observe_request(
+                request.method, route_label(request), 500, time.perf_counter() - start
+            )
+            raise
+        finally:
+            if profile is not None:
+                self.profiler.finish(profile)
+        route = route_label(request)
+        try:
+            self.query_budgets.check(request.method, route, stats)
+        except QueryBudgetExceededError as exc:
+            # Ответ маршрута еще не отправлен: клиент получает обычный 500 приложения
+            response = await self.error_response(request, exc)
+        elapsed = time.perf_counter() - start
+        metrics.observe_request(request.method, route, response.status_code, elapsed)
         # Добавляем correlation_id в заголовки ответа
         response.headers["X-Correlation-ID"] = cid
+        if self.server_timing_header:
+            response.headers["Server-Timing"] = server_timing(stats, elapsed)
+        if profile is not None:
+            response.headers["X-Profile-Id"] = profile.id
         return response
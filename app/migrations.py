@@ -0,0 +1,304 @@
+"""
+Versioned schema migrations.
+
+The schema version lives in the single-row `schema_version` table. Pending steps
+from MIGRATIONS are applied in order, each in its own transaction together with
+the version bump, at startup (init_db) or with `python -m app.cli migrate`.
+
+An empty database is created from the models and stamped with the latest
+version, so the models always describe the newest schema and every migration
+must bring an older database to exactly that shape. A database created before
+versioning (tables present, no schema_version) is version 0.
+
+The steps are written in SQLite SQL. An older database on any other backend is
+refused before the first step, rather than failing halfway through the upgrade.
+"""
+
+import os
+import uuid
+from collections.abc import Callable
+from dataclasses import dataclass
+
+from sqlalchemy import (
+    Column,
+    Connection,
+    Engine,
+    Integer,
+    MetaData,
+    Table,
+    create_engine,
+    insert,
+    inspect,
+    select,
+    text,
+    update,
+)
+from sqlalchemy.engine import make_url
+from sqlalchemy.pool import NullPool
+
+from app import db, db_models  # noqa: F401 - db_models регистрирует таблицы в Base.metadata
+from app.logging_config import get_logger
+
+logger = get_logger("migrations")
+
+# Шаги написаны на SQL диалекта SQLite; пустая база другой СУБД создается из моделей
+SUPPORTED_DIALECTS = ("sqlite",)
+
+metadata = MetaData()
+schema_version = Table("schema_version", metadata, Column("version", Integer, nullable=False))
+
+
+@dataclass(frozen=True)
+class Migration:
+    version: int
+    description: str
+    upgrade: Callable[[Connection], None]
+
+
+# Шаги - историческая запись: пишем их сырым SQL, а не через текущие модели,
+# которые со временем меняются
+
+
+def _add_lookup_indexes(conn: Connection) -> None:
+    for statement in (
+        "CREATE INDEX IF NOT EXISTS ix_sets_workout_id ON sets (workout_id)",
+        "CREATE INDEX IF NOT EXISTS ix_sets_exercise_name ON sets (exercise_name)",
+        "CREATE INDEX IF NOT EXISTS ix_workouts_date_id ON workouts (workout_date, id)",
+        "CREATE INDEX IF NOT EXISTS ix_exercises_name ON exercises (name)",
+    ):
+        conn.exec_driver_sql(statement)
+
+
+def _sets_reference_exercises(conn: Connection) -> None:
+    # Имена подходов без упражнения в справочнике (импорт, удаленные записи) заводим
+    # как новые упражнения, чтобы ни один подход не потерял ссылку
+    orphans = conn.exec_driver_sql(
+        "SELECT DISTINCT exercise_name FROM sets "
+        "WHERE exercise_name NOT IN (SELECT name FROM exercises)"
+    ).scalars()
+    rows = [{"id": str(uuid.uuid4()), "name": name} for name in orphans]
+    if rows:
+        conn.execute(text("INSERT INTO exercises (id, name) VALUES (:id, :name)"), rows)
+    # SQLite не умеет добавлять NOT NULL FK-колонку, поэтому таблица пересобирается
+    for statement in (
+        "CREATE TABLE sets_new (id VARCHAR NOT NULL, reps INTEGER NOT NULL, "
+        "weight NUMERIC(6, 2) NOT NULL, exercise_id VARCHAR NOT NULL, "
+        "workout_id VARCHAR NOT NULL, PRIMARY KEY (id), "
+        "FOREIGN KEY(exercise_id) REFERENCES exercises (id), "
+        "FOREIGN KEY(workout_id) REFERENCES workouts (id))",
+        # При одинаковых названиях подход привязывается к упражнению с меньшим id
+        "INSERT INTO sets_new (id, reps, weight, exercise_id, workout_id) "
+        "SELECT s.id, s.reps, s.weight, "
+        "(SELECT min(e.id) FROM exercises e WHERE e.name = s.exercise_name), s.workout_id "
+        "FROM sets s",
+        "DROP TABLE sets",
+        "ALTER TABLE sets_new RENAME TO sets",
+        "CREATE INDEX ix_sets_workout_id ON sets (workout_id)",
+        "CREATE INDEX ix_sets_exercise_id ON sets (exercise_id)",
+    ):
+        conn.exec_driver_sql(statement)
+
+
+def _legacy_uuid_bytes(value: str) -> bytes:
+    try:
+        return uuid.UUID(value).bytes
+    except ValueError:
+        # Не-UUID ключ (записи в обход API) получает стабильный производный UUID
+        return uuid.uuid5(uuid.NAMESPACE_OID, value).bytes
+
+
+def _integer_keys(conn: Connection) -> None:
+    # Текстовый UUID -> 16 байт; unhex() есть только начиная с SQLite 3.41
+    conn.connection.driver_connection.create_function(
+        "uuid_blob", 1, _legacy_uuid_bytes, deterministic=True
+    )
+    # Новые целые id раздаются в порядке вставки старых строк (rowid).
+    # Подходы со ссылкой на несуществующую тренировку или упражнение не переносятся
+    # (через API их и так не было видно), их число пишется в лог
+    for statement in (
+        "CREATE TABLE exercises_new (id INTEGER NOT NULL, public_id BLOB NOT NULL, "
+        "name VARCHAR(100) NOT NULL, description VARCHAR(500), PRIMARY KEY (id))",
+        "CREATE UNIQUE INDEX ix_exercises_public_id ON exercises_new (public_id)",
+        "INSERT INTO exercises_new (public_id, name, description) "
+        "SELECT uuid_blob(id), name, description FROM exercises ORDER BY rowid",
+        "CREATE TABLE workouts_new (id INTEGER NOT NULL, public_id BLOB NOT NULL, "
+        "workout_date DATE NOT NULL, note VARCHAR, PRIMARY KEY (id))",
+        "CREATE UNIQUE INDEX ix_workouts_public_id ON workouts_new (public_id)",
+        "INSERT INTO workouts_new (public_id, workout_date, note) "
+        "SELECT uuid_blob(id), workout_date, note FROM workouts ORDER BY rowid",
+        "CREATE TABLE sets_new (id INTEGER NOT NULL, public_id BLOB NOT NULL, "
+        "reps INTEGER NOT NULL, weight NUMERIC(6, 2) NOT NULL, exercise_id INTEGER NOT NULL, "
+        "workout_id INTEGER NOT NULL, PRIMARY KEY (id), "
+        "FOREIGN KEY(exercise_id) REFERENCES exercises (id), "
+        "FOREIGN KEY(workout_id) REFERENCES workouts (id))",
+        "CREATE UNIQUE INDEX ix_sets_public_id ON sets_new (public_id)",
+        "INSERT INTO sets_new (public_id, reps, weight, exercise_id, workout_id) "
+        "SELECT uuid_blob(s.id), s.reps, s.weight, e.id, w.id FROM sets s "
+        "JOIN exercises_new e ON e.public_id = uuid_blob(s.exercise_id) "
+        "JOIN workouts_new w ON w.public_id = uuid_blob(s.workout_id) "
+        "ORDER BY s.rowid",
+    ):
+        conn.exec_driver_sql(statement)
+    dropped = conn.exec_driver_sql(
+        "SELECT (SELECT count(*) FROM sets) - (SELECT count(*) FROM sets_new)"
+    ).scalar()
+    if dropped:
+        logger.warning(f"Migration 3 dropped {dropped} sets with a missing workout or exercise")
+    for statement in (
+        "DROP TABLE sets",
+        "DROP TABLE workouts",
+        "DROP TABLE exercises",
+        "ALTER TABLE exercises_new RENAME TO exercises",
+        "ALTER TABLE workouts_new RENAME TO workouts",
+        "ALTER TABLE sets_new RENAME TO sets",
+        "CREATE INDEX ix_exercises_name ON exercises (name)",
+        "CREATE INDEX ix_workouts_date_id ON workouts (workout_date, id)",
+        "CREATE INDEX ix_sets_workout_id ON sets (workout_id)",
+        "CREATE INDEX ix_sets_exercise_id ON sets (exercise_id)",
+    ):
+        conn.exec_driver_sql(statement)
+
+
+def _exercise_week_stats(conn: Connection) -> None:
+    conn.exec_driver_sql(
+        "CREATE TABLE exercise_week_stats (exercise_id INTEGER NOT NULL, "
+        "week_start DATE NOT NULL, set_count INTEGER NOT NULL, total_reps INTEGER NOT NULL, "
+        "total_volume NUMERIC(14, 2) NOT NULL, best_weight NUMERIC(6, 2) NOT NULL, "
+        "best_reps INTEGER NOT NULL, best_e1rm NUMERIC(8, 2) NOT NULL, "
+        "PRIMARY KEY (exercise_id, week_start), "
+        "FOREIGN KEY(exercise_id) REFERENCES exercises (id))"
+    )
+    # Формулы rollups.WeekStats на момент миграции: неделя с понедельника, лучший подход -
+    # максимальный вес, при равенстве - повторы; e1RM по Эпли, одиночный подход - сам себе
+    conn.exec_driver_sql(
+        "INSERT INTO exercise_week_stats (exercise_id, week_start, set_count, total_reps, "
+        "total_volume, best_weight, best_reps, best_e1rm) "
+        "SELECT exercise_id, week_start, count(*), sum(reps), round(sum(reps * weight), 2), "
+        "max(CASE WHEN rank = 1 THEN weight END), max(CASE WHEN rank = 1 THEN reps END), "
+        "max(round(CASE WHEN reps = 1 THEN weight ELSE weight * (1 + reps / 30.0) END, 2)) "
+        "FROM (SELECT s.exercise_id, date(w.workout_date, 'weekday 0', '-6 days') AS week_start, "
+        "s.reps, s.weight, row_number() OVER (PARTITION BY s.exercise_id, "
+        "date(w.workout_date, 'weekday 0', '-6 days') ORDER BY s.weight DESC, s.reps DESC) AS rank "
+        "FROM sets s JOIN workouts w ON w.id = s.workout_id) "
+        "GROUP BY exercise_id, week_start"
+    )
+
+
+def _resource_versions(conn: Connection) -> None:
+    for statement in (
+        "ALTER TABLE workouts ADD COLUMN version INTEGER DEFAULT '1' NOT NULL",
+        "CREATE TABLE resource_versions (name VARCHAR(50) NOT NULL, "
+        "version INTEGER NOT NULL, PRIMARY KEY (name))",
+    ):
+        conn.exec_driver_sql(statement)
+
+
+def _workout_totals(conn: Connection) -> None:
+    for statement in (
+        "ALTER TABLE workouts ADD COLUMN set_count INTEGER DEFAULT '0' NOT NULL",
+        "ALTER TABLE workouts ADD COLUMN total_volume NUMERIC(14, 2) DEFAULT '0' NOT NULL",
+        "UPDATE workouts SET "
+        "set_count = (SELECT count(*) FROM sets WHERE sets.workout_id = workouts.id), "
+        "total_volume = (SELECT coalesce(sum(sets.reps * sets.weight), 0) FROM sets "
+        "WHERE sets.workout_id = workouts.id)",
+    ):
+        conn.exec_driver_sql(statement)
+
+
+MIGRATIONS: list[Migration] = [
+    Migration(1, "index sets by workout and exercise, workouts by date", _add_lookup_indexes),
+    Migration(2, "sets reference exercises by id instead of by name", _sets_reference_exercises),
+    Migration(3, "integer primary keys, UUIDs kept as 16-byte public_id", _integer_keys),
+    Migration(4, "weekly per-exercise rollups", _exercise_week_stats),
+    Migration(5, "workout and collection version counters for ETags", _resource_versions),
+    Migration(6, "denormalized set_count and total_volume on workouts", _workout_totals),
+]
+LATEST_VERSION = MIGRATIONS[-1].version
+
+
+def current_version(conn: Connection) -> int | None:
+    """Schema version of the database; None if it is empty"""
+    tables = set(inspect(conn).get_table_names())
+    if "schema_version" in tables:
+        version = conn.scalar(select(schema_version.c.version))
+        if version is not None:
+            return version
+    return 0 if "workouts" in tables else None
+
+
+def _set_version(conn: Connection, version: int) -> None:
+    if conn.execute(update(schema_version).values(version=version)).rowcount == 0:
+        conn.execute(insert(schema_version).values(version=version))
+
+
+def migration_engine(url: str = db.DATABASE_URL) -> Engine:
+    """
+    Dedicated engine for DDL. With SQLite every step runs under BEGIN IMMEDIATE,
+    so workers starting at once take turns and re-read the version instead of
+    applying the same step twice.
+    """
+    parsed = make_url(url)
+    if parsed.get_backend_name() != "sqlite":
+        return create_engine(url, poolclass=NullPool)
+    eng = create_engine(url, poolclass=NullPool, connect_args={"check_same_thread": False})
+    busy_timeout = os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000")
+    db.install_sqlite_profile(eng, readonly=False, pragmas=[("busy_timeout", busy_timeout)])
+    return eng
+
+
+def _default_bind() -> Engine | None:
+    parsed = make_url(db.DATABASE_URL)
+    if parsed.get_backend_name() == "sqlite" and parsed.database in (None, "", ":memory:"):
+        return db.engine  # отдельное соединение увидело бы другую, пустую базу
+    return None
+
+
+def migrate(bind: Engine | None = None) -> list[Migration]:
+    """Apply pending migrations; returns the steps applied by this call"""
+    bind = bind if bind is not None else _default_bind()
+    eng = bind if bind is not None else migration_engine()
+    applied: list[Migration] = []
+    try:
+        while True:
+            with eng.begin() as conn:
+                version = current_version(conn)
+                schema_version.create(conn, checkfirst=True)
+                if version is None:
+                    db.Base.metadata.create_all(conn)
+                    _set_version(conn, LATEST_VERSION)
+                    logger.info(f"Created schema at version {LATEST_VERSION}")
+                    break
+                step = next((m for m in MIGRATIONS if m.version > version), None)
+                if step is None:
+                    if version > LATEST_VERSION:
+                        logger.warning(
+                            f"Database schema version {version} is newer than "
+                            f"this build ({LATEST_VERSION})"
+                        )
+                    break
+                if conn.dialect.name not in SUPPORTED_DIALECTS:
+                    raise RuntimeError(
+                        f"Database is at schema version {version}, but migrations are "
+                        f"implemented for {', '.join(SUPPORTED_DIALECTS)} only, "
+                        f"not {conn.dialect.name}: upgrade it manually"
+                    )
+                step.upgrade(conn)
+                _set_version(conn, step.version)
+            logger.info(f"Applied migration {step.version}: {step.description}")
+            applied.append(step)
+    finally:
+        if bind is None:
+            eng.dispose()
+    return applied
+
+
+def status(bind: Engine | None = None) -> dict[str, int | None]:
+    bind = bind if bind is not None else _default_bind()
+    eng = bind if bind is not None else migration_engine()
+    try:
+        with eng.connect() as conn:
+            version = current_version(conn)
+    finally:
+        if bind is None:
+            eng.dispose()
+    return {"current": version, "latest": LATEST_VERSION}
@@ -0,0 +1,35 @@
+import base64
+import binascii
+import json
+from datetime import date
+from uuid import UUID
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+
+class InvalidCursorError(ValueError):
+    pass
+
+
+def encode_cursor(workout_date: date, public_id: str) -> str:
+    """
+    Opaque cursor pointing at the last workout of a page (keyset on date, id).
+    Carries the public UUID: the integer key is resolved from it inside the page query
+    """
+    raw = json.dumps([workout_date.isoformat(), public_id], separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> tuple[date, UUID]:
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        raw = base64.urlsafe_b64decode(padded.encode("ascii"))
+        day, public_id = json.loads(raw)
+        # Курсор приходит от клиента: только строки, без int/float/bool, которые
+        # UUID() и драйвер БД принимают по-своему
+        if not isinstance(day, str) or not isinstance(public_id, str):
+            raise TypeError("cursor fields must be strings")
+        return date.fromisoformat(day), UUID(public_id)
+    except (ValueError, TypeError, OverflowError, binascii.Error) as e:
+        raise InvalidCursorError("Invalid cursor") from e
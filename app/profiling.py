@@ -0,0 +1,148 @@
+"""
+On-demand profiling of a single request. This is off unless PROFILING_SECRET is set.
+
+A request sent with `X-Profile: <secret>` runs under cProfile. Adding
+`X-Profile-Memory: 1` also runs it under tracemalloc. The results are stored in
+PROFILE_DIR, keyed by the request's X-Correlation-ID. The id is returned in
+`X-Profile-Id`, and the file is downloaded with the same header from
+GET /debug/profiles/{profile_id}. `?kind=memory` gives the tracemalloc diff.
+
+cProfile only sees the thread it is enabled in. The event loop thread gets one
+profiler. Service code sent to the threadpool (ThreadedUnitOfWork) gets its own
+profiler per call, and all of them are merged into one .pstats file. The loop
+profiler also records whatever other requests run on the loop meanwhile, so
+profile on a quiet worker. Profiling runs one request per worker at a time; a
+second profiled request in parallel runs unprofiled.
+
+When the mode is off, requests are unaffected. When it is on, unprofiled
+requests pay one header lookup in the middleware and one ContextVar read per
+threadpool call.
+"""
+
+import cProfile
+import hmac
+import os
+import pstats
+import re
+import tempfile
+import threading
+import tracemalloc
+from collections.abc import Callable
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import TypeVar
+from uuid import uuid4
+
+from app.logging_config import get_logger
+
+logger = get_logger("profiling")
+
+PROFILE_HEADER = "X-Profile"
+MEMORY_HEADER = "X-Profile-Memory"
+PROFILE_ID = re.compile(r"[A-Za-z0-9_-]{1,64}")
+MIN_SECRET_LENGTH = 16
+MEMORY_TOP_LINES = 50
+DEFAULT_PROFILE_DIR = os.path.join(tempfile.gettempdir(), "workout-log-profiles")
+
+SUFFIXES = {"cpu": ".pstats", "memory": ".memory.txt"}
+
+T = TypeVar("T")
+
+
+@dataclass
+class RequestProfile:
+    id: str
+    loop: cProfile.Profile
+    threads: list[cProfile.Profile] = field(default_factory=list)
+    memory_before: tracemalloc.Snapshot | None = None
+
+
+profile_ctx: ContextVar[RequestProfile | None] = ContextVar("request_profile", default=None)
+
+
+def profiled(fn: Callable[..., T]) -> Callable[..., T]:
+    """`fn` for run_in_threadpool: under the current request's profile, in its own profiler"""
+    profile = profile_ctx.get()
+    if profile is None:
+        return fn
+
+    def run(*args):
+        profiler = cProfile.Profile()
+        profile.threads.append(profiler)
+        return profiler.runcall(fn, *args)
+
+    return run
+
+
+class Profiler:
+    def __init__(self, secret: str, directory: str = DEFAULT_PROFILE_DIR, max_files: int = 50):
+        if len(secret) < MIN_SECRET_LENGTH:
+            raise ValueError(f"PROFILING_SECRET must be at least {MIN_SECRET_LENGTH} characters")
+        self._secret = secret.encode()
+        self.directory = Path(directory)
+        # Профили раскрывают устройство кода: каталог доступен только владельцу процесса
+        self.directory.mkdir(mode=0o700, parents=True, exist_ok=True)
+        self.max_files = max_files
+        self._busy = threading.Lock()
+
+    def authorized(self, header: str | None) -> bool:
+        return header is not None and hmac.compare_digest(header.encode(), self._secret)
+
+    def path(self, profile_id: str, kind: str = "cpu") -> Path | None:
+        if not PROFILE_ID.fullmatch(profile_id) or kind not in SUFFIXES:
+            return None
+        return self.directory / f"{profile_id}{SUFFIXES[kind]}"
+
+    def start(self, headers, correlation_id: str) -> RequestProfile | None:
+        """Begin profiling if the request carries the secret and no other profile is running"""
+        if not self.authorized(headers.get(PROFILE_HEADER)):
+            return None
+        if not self._busy.acquire(blocking=False):
+            logger.warning("Profile requested while another one is running, skipped")
+            return None
+        # correlation_id приходит от клиента: в имя файла попадает только безопасный id
+        profile_id = correlation_id if PROFILE_ID.fullmatch(correlation_id) else uuid4().hex
+        profile = RequestProfile(profile_id, cProfile.Profile())
+        if headers.get(MEMORY_HEADER) == "1" and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            profile.memory_before = tracemalloc.take_snapshot()
+        profile_ctx.set(profile)
+        profile.loop.enable()
+        return profile
+
+    def finish(self, profile: RequestProfile) -> None:
+        profile.loop.disable()
+        try:
+            if profile.memory_before is not None:
+                after = tracemalloc.take_snapshot()
+                tracemalloc.stop()
+                diff = after.compare_to(profile.memory_before, "lineno")[:MEMORY_TOP_LINES]
+                self.path(profile.id, "memory").write_text("\n".join(map(str, diff)) + "\n")
+            stats = pstats.Stats(profile.loop)
+            for profiler in profile.threads:
+                stats.add(profiler)
+            stats.dump_stats(self.path(profile.id, "cpu"))
+            self._prune()
+            logger.info(f"Request profile stored as {profile.id}")
+        finally:
+            self._busy.release()
+
+    def _prune(self) -> None:
+        """Keep only the newest max_files profiles"""
+        files = sorted(self.directory.glob("*.pstats"), key=lambda p: p.stat().st_mtime)
+        for old in files[: max(0, len(files) - self.max_files)]:
+            stem = old.name.removesuffix(SUFFIXES["cpu"])
+            old.unlink(missing_ok=True)
+            (self.directory / f"{stem}{SUFFIXES['memory']}").unlink(missing_ok=True)
+
+
+def profiler_from_env() -> Profiler | None:
+    secret = os.getenv("PROFILING_SECRET", "")
+    if not secret:
+        return None
+    return Profiler(
+        secret,
+        directory=os.getenv("PROFILE_DIR", DEFAULT_PROFILE_DIR),
+        max_files=int(os.getenv("PROFILE_MAX_FILES", "50")),
+    )
@@ -0,0 +1,199 @@
+"""
+Rate limiter storage backends.
+
+Sliding window counter: for each client only the counts of the current and the
+previous fixed window are kept, and the request rate is estimated as
+    previous * (1 - elapsed_fraction_of_current_window) + current
+so every hit costs O(1) time and memory, unlike keeping every timestamp.
+
+Backends:
+  memory - per-process dict (default); with N workers the effective limit is N x limit
+  shm    - mmap'd hashed counter table shared by all workers on the node
+"""
+
+import fcntl
+import hashlib
+import mmap
+import os
+import struct
+import tempfile
+import threading
+from collections import OrderedDict
+from typing import Protocol
+
+BACKENDS = ("memory", "shm")
+DEFAULT_SHM_PATH = os.path.join(
+    "/dev/shm" if os.path.isdir("/dev/shm") else tempfile.gettempdir(),  # noqa: S108
+    "workout-log-ratelimit",
+)
+
+
+class RateLimitBackend(Protocol):
+    def hit(self, key: str, now: float) -> bool: ...
+
+
+def _estimate(prev: int, curr: int, position: float, window: int) -> float:
+    return prev * (1 - (position - window)) + curr
+
+
+class SlidingWindowCounter:
+    """In-process backend: sharded locks and a hard cap on tracked clients (LRU eviction)"""
+
+    def __init__(
+        self,
+        limit: int,
+        window_seconds: float = 60.0,
+        max_clients: int = 100_000,
+        shards: int = 16,
+    ):
+        self.limit = limit
+        self.window_seconds = window_seconds
+        self.shard_capacity = max(1, max_clients // shards)
+        # client -> [window index, current window count, previous window count]
+        self._shards: list[OrderedDict[str, list[int]]] = [OrderedDict() for _ in range(shards)]
+        self._locks = [threading.Lock() for _ in range(shards)]
+
+    def __len__(self) -> int:
+        return sum(len(s) for s in self._shards)
+
+    def hit(self, key: str, now: float) -> bool:
+        """Register a request from `key`; False means the limit is exceeded"""
+        position = now / self.window_seconds
+        window = int(position)
+        n = hash(key) % len(self._shards)
+        shard = self._shards[n]
+
+        with self._locks[n]:
+            state = shard.get(key)
+            if state is None:
+                state = [window, 0, 0]
+                shard[key] = state
+                if len(shard) > self.shard_capacity:
+                    shard.popitem(last=False)  # вытесняем самого давнего клиента
+            else:
+                shard.move_to_end(key)
+                if state[0] != window:
+                    state[2] = state[1] if state[0] == window - 1 else 0
+                    state[1] = 0
+                    state[0] = window
+
+            if _estimate(state[2], state[1], position, window) >= self.limit:
+                return False
+            state[1] += 1
+            return True
+
+
+class SharedMemoryCounter:
+    """
+    Node-wide backend: a fixed-size hash table in a shared mmap'd file.
+
+    The table is split into buckets of BUCKET_SLOTS slots; a client always maps
+    to the same bucket (by a process-independent key hash) and the whole bucket
+    is updated under an fcntl byte-range lock, so workers never lose updates.
+    When a bucket is full the slot with the oldest window is reused.
+    """
+
+    SLOT = struct.Struct("<QqII")  # key fingerprint (0 = empty), window, current, previous
+    BUCKET_SLOTS = 8
+
+    def __init__(
+        self,
+        limit: int,
+        window_seconds: float = 60.0,
+        path: str = DEFAULT_SHM_PATH,
+        slots: int = 65_536,
+    ):
+        self.limit = limit
+        self.window_seconds = window_seconds
+        self.buckets = max(1, slots // self.BUCKET_SLOTS)
+        self.bucket_bytes = self.BUCKET_SLOTS * self.SLOT.size
+        size = self.buckets * self.bucket_bytes
+
+        # O_NOFOLLOW: файл лежит в общем каталоге, не идем по подложенному симлинку
+        self._fd = os.open(path, os.O_RDWR | os.O_CREAT | os.O_NOFOLLOW, 0o600)
+        try:
+            fcntl.flock(self._fd, fcntl.LOCK_EX)
+            try:
+                current = os.fstat(self._fd).st_size
+                if current == 0:
+                    os.ftruncate(self._fd, size)
+                elif current != size:
+                    raise ValueError(
+                        f"Rate limit table {path} has {current} bytes, expected {size}; "
+                        "all workers must use the same slot count"
+                    )
+            finally:
+                fcntl.flock(self._fd, fcntl.LOCK_UN)
+            self._map = mmap.mmap(self._fd, size)
+        except Exception:
+            os.close(self._fd)
+            raise
+        # fcntl-блокировки принадлежат процессу, потоки внутри него разводим отдельно
+        self._thread_locks = [threading.Lock() for _ in range(64)]
+
+    def close(self) -> None:
+        self._map.close()
+        os.close(self._fd)
+
+    @staticmethod
+    def fingerprint(key: str) -> int:
+        fp = int.from_bytes(hashlib.blake2b(key.encode(), digest_size=8).digest(), "little")
+        return fp or 1
+
+    def _find_slot(self, base: int, fp: int) -> tuple[int, tuple[int, int, int, int]]:
+        victim, victim_state = base, None
+        for i in range(self.BUCKET_SLOTS):
+            offset = base + i * self.SLOT.size
+            state = self.SLOT.unpack_from(self._map, offset)
+            if state[0] == fp:
+                return offset, state
+            if state[0] == 0:
+                return offset, (fp, 0, 0, 0)
+            if victim_state is None or state[1] < victim_state[1]:
+                victim, victim_state = offset, state
+        return victim, (fp, 0, 0, 0)
+
+    def hit(self, key: str, now: float) -> bool:
+        position = now / self.window_seconds
+        window = int(position)
+        fp = self.fingerprint(key)
+        bucket = fp % self.buckets
+        base = bucket * self.bucket_bytes
+
+        with self._thread_locks[bucket % len(self._thread_locks)]:
+            fcntl.lockf(self._fd, fcntl.LOCK_EX, self.bucket_bytes, base)
+            try:
+                offset, (_, slot_window, curr, prev) = self._find_slot(base, fp)
+                if slot_window != window:
+                    prev = curr if slot_window == window - 1 else 0
+                    curr = 0
+                allowed = _estimate(prev, curr, position, window) < self.limit
+                if allowed:
+                    curr += 1
+                self.SLOT.pack_into(self._map, offset, fp, window, curr, prev)
+                return allowed
+            finally:
+                fcntl.lockf(self._fd, fcntl.LOCK_UN, self.bucket_bytes, base)
+
+
+def create_backend(
+    kind: str, limit: int, window_seconds: float = 60.0, **options
+) -> RateLimitBackend:
+    if kind == "memory":
+        return SlidingWindowCounter(limit, window_seconds, **options)
+    if kind == "shm":
+        return SharedMemoryCounter(limit, window_seconds, **options)
+    raise ValueError(f"Unknown rate limit backend: {kind!r} (expected one of {BACKENDS})")
+
+
+def backend_from_env(limit: int, window_seconds: float = 60.0) -> RateLimitBackend:
+    kind = os.getenv("RATE_LIMIT_BACKEND", "memory")
+    if kind == "shm":
+        return create_backend(
+            kind,
+            limit,
+            window_seconds,
+            path=os.getenv("RATE_LIMIT_SHM_PATH", DEFAULT_SHM_PATH),
+            slots=int(os.getenv("RATE_LIMIT_SHM_SLOTS", "65536")),
+        )
+    return create_backend(kind, limit, window_seconds)
@@ -1,8 +1,70 @@
+from collections.abc import Iterable, Iterator
+from datetime import date
 from decimal import Decimal
+from uuid import UUID
 
-from sqlalchemy.orm import Session
+from sqlalchemy import (
+    Connection,
+    Float,
+    LargeBinary,
+    Numeric,
+    Row,
+    Select,
+    Table,
+    and_,
+    case,
+    delete,
+    func,
+    insert,
+    or_,
+    select,
+    tuple_,
+    type_coerce,
+    update,
+)
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session, aliased, selectinload
+from sqlalchemy.orm.attributes import set_committed_value
 
-from app import db_models
+from app import db_models, rollups
+
+# Подходы страницы догружаются одним SELECT ... WHERE workout_id IN (...),
+# название упражнения приходит в том же запросе через JOIN
+WITH_SETS = selectinload(db_models.Workout.sets).joinedload(db_models.Set.exercise)
+
+# Счетчики изменений коллекций в resource_versions
+WORKOUT_LIST = "workouts"
+EXERCISE_CATALOGUE = "exercises"
+
+
+def _upsert_insert(db: Session | Connection, table: Table):
+    """INSERT that supports ON CONFLICT DO UPDATE in both dialects (built by their own insert)"""
+    conn = db.connection() if isinstance(db, Session) else db
+    dialect = postgresql if conn.dialect.name == "postgresql" else sqlite
+    return dialect.insert(table)
+
+
+class VersionRepository:
+    """
+    Collection change counters. A bump is an upsert of one row: concurrent writers
+    of the same collection queue on that row until commit, which is what makes
+    the counter (and the ETag built from it) strictly monotonic.
+    """
+
+    def __init__(self, db: Session | Connection):
+        self.db = db
+
+    def get(self, name: str) -> int:
+        rv = db_models.ResourceVersion
+        return self.db.scalar(select(rv.version).where(rv.name == name)) or 0
+
+    def bump(self, name: str) -> int:
+        table = db_models.ResourceVersion.__table__
+        stmt = _upsert_insert(self.db, table).values(name=name, version=1)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[table.c.name], set_={"version": table.c.version + 1}
+        )
+        return self.db.execute(stmt.returning(table.c.version)).scalar_one()
 
 
 class ExerciseRepository:
@@ -12,39 +74,234 @@ class ExerciseRepository:
     def create(self, name: str, description: str | None = None) -> db_models.Exercise:
         ex = db_models.Exercise(name=name, description=description)
         self.db.add(ex)
-        self.db.commit()
-        self.db.refresh(ex)
+        self.db.flush()
+        VersionRepository(self.db).bump(EXERCISE_CATALOGUE)
         return ex
 
     def list(self) -> list[db_models.Exercise]:
         return self.db.query(db_models.Exercise).all()
 
     def get(self, ex_id: str) -> db_models.Exercise | None:
-        return self.db.query(db_models.Exercise).filter(db_models.Exercise.id == ex_id).first()
+        """`ex_id` is the public UUID, as everywhere above the repositories"""
+        ex = db_models.Exercise
+        return self.db.query(ex).filter(ex.public_id == ex_id).first()
+
+    def get_many(self, ex_ids: set[str]) -> dict[str, db_models.Exercise]:
+        ex = db_models.Exercise
+        items = self.db.query(ex).filter(ex.public_id.in_(ex_ids)).all()
+        return {str(e.public_id): e for e in items}
 
 
 class WorkoutRepository:
-    def __init__(self, db: Session):
+    def __init__(self, db: Session | Connection):
         self.db = db
 
     def create(self, workout_date, note=None) -> db_models.Workout:
         w = db_models.Workout(workout_date=workout_date, note=note)
         self.db.add(w)
-        self.db.commit()
-        self.db.refresh(w)
+        self.db.flush()
+        VersionRepository(self.db).bump(WORKOUT_LIST)
         return w
 
-    def list(self) -> list[db_models.Workout]:
-        return self.db.query(db_models.Workout).all()
+    def page_rows(self, limit: int, after: tuple[date, UUID] | None = None) -> list[Row]:
+        """
+        One page of workouts as plain rows (id, public_id bytes, workout_date, note,
+        set_count, total_volume), newest first; `after` is the (workout_date, public_id)
+        of the previous page's last row
+        """
+        return self.db.execute(self.page_query(limit, after)).all()
 
-    def get(self, workout_id: str) -> db_models.Workout | None:
-        return self.db.query(db_models.Workout).filter(db_models.Workout.id == workout_id).first()
+    @staticmethod
+    def page_query(limit: int, after: tuple[date, UUID] | None = None) -> Select:
+        """The SELECT behind page_rows (bench/bench_query_plans.py explains the same one)"""
+        w = db_models.Workout
+        q = select(
+            w.id,
+            type_coerce(w.public_id, LargeBinary).label("public_id"),
+            w.workout_date,
+            w.note,
+            w.set_count,
+            type_coerce(w.total_volume, Float).label("total_volume"),
+        )
+        if after is not None:
+            after_date, after_public_id = after
+            # Порядок по (date, id): id последней строки ищется по уникальному индексу
+            # public_id в том же запросе; неизвестный public_id дает только более ранние даты.
+            # Сравнение row value SQLite превращает в SEARCH по ix_workouts_date_id
+            # (date, id) < (?, ?): с OR по отдельным колонкам план был SCAN всего индекса
+            last = aliased(w)
+            after_id = select(last.id).where(last.public_id == after_public_id).scalar_subquery()
+            q = q.where(tuple_(w.workout_date, w.id) < tuple_(after_date, after_id))
+        return q.order_by(w.workout_date.desc(), w.id.desc()).limit(limit)
+
+    def set_rows(self, workout_ids: list[int]) -> Iterator[Row]:
+        """
+        Sets of the given workouts as (workout_id, public_id, reps, weight,
+        exercise public_id, exercise name) rows: no ORM objects, UUIDs as raw bytes
+        """
+        s, e = db_models.Set, db_models.Exercise
+        yield from self.db.execute(
+            select(
+                s.workout_id,
+                type_coerce(s.public_id, LargeBinary).label("public_id"),
+                s.reps,
+                type_coerce(s.weight, Float).label("weight"),
+                type_coerce(e.public_id, LargeBinary).label("exercise_public_id"),
+                e.name,
+            )
+            .join(e, e.id == s.exercise_id)
+            .where(s.workout_id.in_(workout_ids))
+            .order_by(s.workout_id, s.id)
+        )
+
+    @staticmethod
+    def export_batch_statement(limit: int, after: tuple[date, int] | None = None) -> Select:
+        w = db_models.Workout
+        q = select(w).options(WITH_SETS).order_by(w.workout_date, w.id).limit(limit)
+        if after is not None:
+            q = q.where(tuple_(w.workout_date, w.id) > tuple_(*after))
+        return q
+
+    def export_batch(
+        self, limit: int, after: tuple[date, int] | None = None
+    ) -> list[db_models.Workout]:
+        """
+        Next `limit` workouts (with sets) in (workout_date, id) order after the
+        (workout_date, id) of the previous batch's last row
+        """
+        return list(self.db.scalars(self.export_batch_statement(limit, after)))
+
+    def version(self, workout_id: str) -> int | None:
+        """Version of one workout by public id: an index lookup, sets are not loaded"""
+        w = db_models.Workout
+        return self.db.scalar(select(w.version).where(w.public_id == workout_id))
+
+    def _touch(self, workout: db_models.Workout, sets: int, volume: Decimal) -> None:
+        """
+        Bump the workout's version and add the new sets to its totals, in SQL, so
+        concurrent writers never overwrite each other's increments
+        """
+        w = db_models.Workout
+        row = self.db.execute(
+            update(w)
+            .where(w.id == workout.id)
+            .values(
+                version=w.version + 1,
+                set_count=w.set_count + sets,
+                total_volume=w.total_volume + volume,
+            )
+            .returning(w.version, w.set_count, w.total_volume),
+            execution_options={"synchronize_session": False},
+        ).one()
+        for name, value in zip(("version", "set_count", "total_volume"), row, strict=True):
+            set_committed_value(workout, name, value)
+        VersionRepository(self.db).bump(WORKOUT_LIST)
 
-    def add_set(self, workout: db_models.Workout, reps: int, weight: Decimal, exercise_name: str):
-        new_set = db_models.Set(
-            reps=reps, weight=weight, exercise_name=exercise_name, workout=workout
+    def rebuild_totals(self) -> None:
+        """Recompute set_count and total_volume of every workout from its sets"""
+        w, s = db_models.Workout, db_models.Set
+        of_workout = s.workout_id == w.id
+        self.db.execute(
+            update(w).values(
+                set_count=select(func.count()).where(of_workout).scalar_subquery(),
+                total_volume=select(
+                    func.coalesce(func.sum(type_coerce(s.reps * s.weight, Numeric(14, 2))), 0)
+                )
+                .where(of_workout)
+                .scalar_subquery(),
+            ),
+            execution_options={"synchronize_session": False},
         )
+
+    def get(self, workout_id: str) -> db_models.Workout | None:
+        return (
+            self.db.query(db_models.Workout)
+            .options(WITH_SETS)
+            .filter(db_models.Workout.public_id == workout_id)
+            .first()
+        )
+
+    def add_set(self, workout: db_models.Workout, reps: int, weight: Decimal, exercise_id: int):
+        new_set = db_models.Set(reps=reps, weight=weight, exercise_id=exercise_id, workout=workout)
         self.db.add(new_set)
-        self.db.commit()
-        self.db.refresh(workout)
+        self.db.flush()
+        ExerciseStatsRepository(self.db).record([(exercise_id, workout.workout_date, reps, weight)])
+        self._touch(workout, sets=1, volume=reps * weight)
         return workout
+
+    def add_sets(self, workout: db_models.Workout, rows: list[dict]) -> db_models.Workout:
+        """Bulk insert (executemany) of set rows with reps/weight/exercise_id"""
+        self.db.execute(insert(db_models.Set), [{**row, "workout_id": workout.id} for row in rows])
+        ExerciseStatsRepository(self.db).record(
+            (row["exercise_id"], workout.workout_date, row["reps"], row["weight"]) for row in rows
+        )
+        self._touch(
+            workout, sets=len(rows), volume=sum(row["reps"] * row["weight"] for row in rows)
+        )
+        # INSERT мимо ORM: коллекцию подходов перечитываем одним запросом
+        self.db.refresh(workout, attribute_names=["sets"])
+        return workout
+
+
+class ExerciseStatsRepository:
+    """Weekly per-exercise rollups; `db` may also be a bare Connection (migrations)"""
+
+    def __init__(self, db: Session | Connection):
+        self.db = db
+
+    def _upsert(self):
+        table = db_models.ExerciseWeekStats.__table__
+        stmt = _upsert_insert(self.db, table)
+        new, old = stmt.excluded, table.c
+        better = or_(
+            new.best_weight > old.best_weight,
+            and_(new.best_weight == old.best_weight, new.best_reps > old.best_reps),
+        )
+        return stmt.on_conflict_do_update(
+            index_elements=[old.exercise_id, old.week_start],
+            set_={
+                "set_count": old.set_count + new.set_count,
+                "total_reps": old.total_reps + new.total_reps,
+                "total_volume": old.total_volume + new.total_volume,
+                "best_weight": case((better, new.best_weight), else_=old.best_weight),
+                "best_reps": case((better, new.best_reps), else_=old.best_reps),
+                "best_e1rm": case(
+                    (new.best_e1rm > old.best_e1rm, new.best_e1rm), else_=old.best_e1rm
+                ),
+            },
+        )
+
+    @staticmethod
+    def _rows(weeks: dict) -> list[dict]:
+        return [
+            {"exercise_id": exercise_id, "week_start": week, **vars(stats)}
+            for (exercise_id, week), stats in weeks.items()
+        ]
+
+    def record(self, sets: Iterable[rollups.SetRow]) -> None:
+        """Fold new sets into the rollups: one upsert per touched (exercise, week)"""
+        rows = self._rows(rollups.aggregate(sets))
+        if rows:
+            self.db.execute(self._upsert(), rows)
+
+    def weeks(self, exercise_id: int) -> list[db_models.ExerciseWeekStats]:
+        stats = db_models.ExerciseWeekStats
+        return list(
+            self.db.scalars(
+                select(stats).where(stats.exercise_id == exercise_id).order_by(stats.week_start)
+            )
+        )
+
+    def rebuild(self, chunk_size: int = 10_000) -> int:
+        """Recompute all rollups from the raw sets; returns the number of rollup rows"""
+        s, w = db_models.Set, db_models.Workout
+        self.db.execute(delete(db_models.ExerciseWeekStats.__table__))
+        sets = self.db.execute(
+            select(s.exercise_id, w.workout_date, s.reps, s.weight)
+            .join(w, w.id == s.workout_id)
+            .execution_options(yield_per=chunk_size)
+        )
+        rows = self._rows(rollups.aggregate(sets))
+        if rows:
+            self.db.execute(insert(db_models.ExerciseWeekStats.__table__), rows)
+        return len(rows)
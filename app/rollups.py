@@ -0,0 +1,58 @@
+"""
+Per-exercise weekly training rollups.
+
+Every write path that adds sets folds them into `exercise_week_stats` (one row per
+exercise and ISO week) in the same transaction, so analytics reads cost O(weeks)
+instead of O(sets). `python -m app.cli rebuild-rollups` recomputes the table from
+the raw sets.
+"""
+
+from collections.abc import Iterable
+from dataclasses import dataclass
+from datetime import date, timedelta
+from decimal import Decimal
+
+CENT = Decimal("0.01")
+
+# (exercise_id, workout_date, reps, weight)
+SetRow = tuple[int, date, int, Decimal]
+
+
+def week_start(day: date) -> date:
+    """Monday of the ISO week"""
+    return day - timedelta(days=day.weekday())
+
+
+def epley_e1rm(weight: Decimal, reps: int) -> Decimal:
+    """Estimated one-rep max by the Epley formula; a single is its own 1RM"""
+    e1rm = weight if reps == 1 else weight * (1 + Decimal(reps) / 30)
+    return e1rm.quantize(CENT)
+
+
+@dataclass
+class WeekStats:
+    set_count: int = 0
+    total_reps: int = 0
+    total_volume: Decimal = Decimal(0)
+    best_weight: Decimal = Decimal(0)  # лучший подход: максимальный вес, при равенстве - повторы
+    best_reps: int = 0
+    best_e1rm: Decimal = Decimal(0)
+
+    def add(self, reps: int, weight: Decimal) -> None:
+        self.set_count += 1
+        self.total_reps += reps
+        self.total_volume += reps * weight
+        if (weight, reps) > (self.best_weight, self.best_reps):
+            self.best_weight, self.best_reps = weight, reps
+        self.best_e1rm = max(self.best_e1rm, epley_e1rm(weight, reps))
+
+
+def aggregate(rows: Iterable[SetRow]) -> dict[tuple[int, date], WeekStats]:
+    weeks: dict[tuple[int, date], WeekStats] = {}
+    for exercise_id, day, reps, weight in rows:
+        key = (exercise_id, week_start(day))
+        stats = weeks.get(key)
+        if stats is None:
+            stats = weeks[key] = WeekStats()
+        stats.add(reps, Decimal(weight))
+    return weeks
@@ -1,7 +1,9 @@
 from datetime import date
 from decimal import Decimal
+from typing import Annotated
+from uuid import UUID
 
-from pydantic import BaseModel, Field, field_validator
+from pydantic import BaseModel, Field, PrivateAttr, field_validator
 
 
 class SetBase(BaseModel):
@@ -10,16 +12,28 @@ class SetBase(BaseModel):
 
 
 class SetCreate(SetBase):
-    exercise_id: str
+    exercise_id: UUID
+
+
+MAX_SET_BATCH = 500
+
+SetBatch = Annotated[list[SetCreate], Field(min_length=1, max_length=MAX_SET_BATCH)]
 
 
 class SetRead(BaseModel):
     id: str
     reps: int
     weight: float
+    exercise_id: str
     exercise_name: str
 
 
+def _clean_name(v: str) -> str:
+    if any(ord(c) < 32 for c in v):
+        raise ValueError("Name cannot contain control characters")
+    return v.strip()
+
+
 class ExerciseBase(BaseModel):
     name: str = Field(..., min_length=1, max_length=200)
     description: str | None = Field(None, max_length=2000)
@@ -27,9 +41,7 @@ class ExerciseBase(BaseModel):
     @field_validator("name")
     @classmethod
     def validate_name(cls, v: str) -> str:
-        if any(ord(c) < 32 for c in v):
-            raise ValueError("Name cannot contain control characters")
-        return v.strip()
+        return _clean_name(v)
 
 
 class ExerciseCreate(ExerciseBase):
@@ -38,6 +50,8 @@ class ExerciseCreate(ExerciseBase):
 
 class ExerciseRead(ExerciseBase):
     id: str
+    # Внутренний ключ для ссылок из sets; в ответы API не попадает
+    _pk: int | None = PrivateAttr(default=None)
 
 
 class WorkoutBase(BaseModel):
@@ -60,3 +74,96 @@ class WorkoutCreate(WorkoutBase):
 class WorkoutRead(WorkoutBase):
     id: str
     sets: list[SetRead] = []
+    set_count: int = 0
+    total_volume: float = 0.0
+    # Версия строки workouts, из нее строится ETag
+    _version: int | None = PrivateAttr(default=None)
+
+
+# Проекции GET /workouts/: ?fields= из полей WorkoutRead (id есть всегда), ?view=summary
+# для календаря - без подходов, итоги берутся из денормализованных колонок workouts
+WORKOUT_FIELDS = tuple(WorkoutRead.model_fields)
+WORKOUT_VIEWS = {
+    "full": frozenset(WORKOUT_FIELDS),
+    "summary": frozenset({"id", "workout_date", "set_count", "total_volume"}),
+}
+
+
+class WorkoutPage(BaseModel):
+    items: list[WorkoutRead]
+    next_cursor: str | None = None
+
+
+class SetImport(SetBase):
+    exercise_name: str = Field(..., min_length=1, max_length=200)
+
+    @field_validator("exercise_name")
+    @classmethod
+    def validate_exercise_name(cls, v: str) -> str:
+        return _clean_name(v)
+
+
+class WorkoutImport(WorkoutCreate):
+    sets: list[SetImport] = Field(default_factory=list, max_length=MAX_SET_BATCH)
+
+
+class ImportRowError(BaseModel):
+    line: int
+    error: str
+
+
+class ImportReport(BaseModel):
+    workouts_imported: int = 0
+    sets_imported: int = 0
+    exercises_created: int = 0
+    error_count: int = 0
+    errors: list[ImportRowError] = []
+
+
+class BestSet(BaseModel):
+    weight: float
+    reps: int
+
+
+class WeeklyVolume(BaseModel):
+    week_start: date
+    set_count: int
+    total_reps: int
+    volume: float
+    best_e1rm: float
+
+
+class ExerciseAnalytics(BaseModel):
+    exercise_id: str
+    exercise_name: str
+    set_count: int = 0
+    total_reps: int = 0
+    total_volume: float = 0.0
+    best_set: BestSet | None = None
+    estimated_1rm: float | None = None
+    weekly: list[WeeklyVolume] = []
+
+
+class ExerciseSummary(BaseModel):
+    exercise_id: str
+    exercise_name: str
+    set_count: int
+    total_reps: int
+    total_volume: float
+    max_weight: float
+    weight_p50: float
+    weight_p90: float
+    best_e1rm: float
+
+
+class ExerciseWeekVolume(BaseModel):
+    exercise_id: str
+    week_start: date
+    set_count: int
+    volume: float
+
+
+class ProgressionPoint(BaseModel):
+    week_start: date
+    best_e1rm: float
+    rolling_best_e1rm: float
@@ -1,116 +1,564 @@
-from app import schemas
-from app.db import SessionLocal
-from app.repositories import ExerciseRepository, WorkoutRepository
+import json
+import os
+from collections.abc import AsyncIterator, Iterator, Mapping
+
+from app import analytics, db_models, schemas
+from app.cache import LRUCache
+from app.db import ReadSessionLocal, UnitOfWork, UnitOfWorkRunner, async_read_session_factory
+from app.pagination import DEFAULT_PAGE_SIZE, decode_cursor, encode_cursor
+from app.repositories import (
+    EXERCISE_CATALOGUE,
+    WORKOUT_LIST,
+    ExerciseRepository,
+    ExerciseStatsRepository,
+    VersionRepository,
+    WorkoutRepository,
+)
+
+EXPORT_CHUNK_SIZE = 500
+
+# Справочник упражнений почти не меняется: ExerciseRead по id и снимок всего списка
+# (вместе с версией справочника: снимок другой версии не отдается)
+exercise_cache = LRUCache(max_entries=4096, ttl_seconds=300.0)
+ALL_EXERCISES = ("exercises", "all")
+
+
+# Готовый JSON горячих тренировок: (version, bytes) по public id, бюджет - в байтах.
+# Сбрасывается после коммита записи в тренировку, но только в воркере, который ее
+# записал. Попадание не ходит в БД, поэтому другие воркеры до WORKOUT_CACHE_TTL секунд
+# отдают прежнее тело и отвечают 304 на прежний ETag. Для нескольких воркеров, где это
+# недопустимо, задайте меньший TTL; 0 выключает кэш
+workout_json_cache = LRUCache(
+    max_entries=100_000,
+    ttl_seconds=float(os.getenv("WORKOUT_CACHE_TTL", "60")),
+    max_bytes=int(os.getenv("WORKOUT_CACHE_MAX_BYTES", str(32 * 1024 * 1024))),
+    sizeof=lambda entry: len(entry[1]),
+)
+
+
+def _load_set_columns() -> analytics.SetColumns:
+    with ReadSessionLocal() as session:
+        return analytics.load_columns(session)
+
+
+# Колонки подходов для дашбордов (app/analytics.py): один снимок на процесс,
+# обновляется фоновым потоком, запущенным вместе с приложением
+columns_snapshot = analytics.ColumnsSnapshot(_load_set_columns)
+
+
+class ExerciseNotFoundError(LookupError):
+    pass
+
+
+# Строки из БД уже прошли валидацию при записи: ответные модели собираются через
+# model_construct, без повторной проверки каждого поля каждого подхода
+
+
+def _to_set_read(s: db_models.Set, known: schemas.ExerciseRead | None = None) -> schemas.SetRead:
+    return schemas.SetRead.model_construct(
+        id=str(s.public_id),
+        reps=s.reps,
+        weight=float(s.weight),  # Конвертируем Decimal в float
+        exercise_id=known.id if known is not None else str(s.exercise.public_id),
+        exercise_name=known.name if known is not None else s.exercise.name,
+    )
+
+
+def _to_workout_read(
+    w: db_models.Workout, exercises: Mapping[int, schemas.ExerciseRead] | None = None
+) -> schemas.WorkoutRead:
+    """`exercises`: already known exercises by pk, so freshly added sets need no lookup"""
+    exercises = exercises or {}
+    sets = [_to_set_read(s, exercises.get(s.exercise_id)) for s in w.sets]
+    read = schemas.WorkoutRead.model_construct(
+        id=str(w.public_id),
+        workout_date=w.workout_date,
+        note=w.note,
+        sets=sets,
+        set_count=w.set_count,
+        total_volume=float(w.total_volume),
+    )
+    read._version = w.version
+    return read
+
+
+def _uuid_str(raw: bytes) -> str:
+    """str(UUID(bytes=raw)) without building a UUID object: 4x faster per id"""
+    h = raw.hex()
+    return f"{h[:8]}-{h[8:12]}-{h[12:16]}-{h[16:20]}-{h[20:]}"
+
+
+def _dump_json(content) -> bytes:
+    # Как JSONResponse в FastAPI: без экранирования не-ASCII и без пробелов
+    return json.dumps(content, ensure_ascii=False, separators=(",", ":")).encode()
+
+
+def _to_exercise_read(ex: db_models.Exercise) -> schemas.ExerciseRead:
+    read = schemas.ExerciseRead.model_construct(
+        id=str(ex.public_id), name=ex.name, description=ex.description
+    )
+    read._pk = ex.id
+    return read
+
+
+def invalidate_exercise_catalogue() -> None:
+    """Drop the cached exercise list; call after a commit that added exercises"""
+    exercise_cache.invalidate(ALL_EXERCISES)
 
 
 class ExerciseService:
+    def __init__(self, uow: UnitOfWork):
+        self.uow = uow
+        self.repo = ExerciseRepository(uow.session)
+        self.reads = ExerciseRepository(uow.reader)
+        self.versions = VersionRepository(uow.reader)
+
     def create_exercise(self, data: schemas.ExerciseCreate) -> schemas.ExerciseRead:
-        db = SessionLocal()
-        try:
-            repo = ExerciseRepository(db)
-            ex = repo.create(name=data.name, description=data.description)
-            return schemas.ExerciseRead(id=ex.id, name=ex.name, description=ex.description)
-        finally:
-            db.close()
+        ex = self.repo.create(name=data.name, description=data.description)
+        created = _to_exercise_read(ex)
+
+        def write_through() -> None:
+            invalidate_exercise_catalogue()
+            exercise_cache.set(created.id, created)
+
+        self.uow.after_commit(write_through)
+        return created
+
+    def catalogue_version(self) -> int:
+        return self.versions.get(EXERCISE_CATALOGUE)
+
+    def catalogue(self) -> tuple[int, list[schemas.ExerciseRead]]:
+        """
+        (version, exercises). The version is read first, so the list is never older
+        than it; the cached snapshot is reused only while the version is unchanged,
+        which also catches exercises created by other workers.
+        """
+        version = self.catalogue_version()
+        snapshot = exercise_cache.get(ALL_EXERCISES)
+        if snapshot is None or snapshot[0] != version:
+            snapshot = (version, [_to_exercise_read(i) for i in self.reads.list()])
+            exercise_cache.set(ALL_EXERCISES, snapshot)
+        return version, list(snapshot[1])
 
     def list_exercises(self) -> list[schemas.ExerciseRead]:
-        db = SessionLocal()
-        try:
-            items = ExerciseRepository(db).list()
-            return [
-                schemas.ExerciseRead(id=i.id, name=i.name, description=i.description) for i in items
-            ]
-        finally:
-            db.close()
+        return self.catalogue()[1]
 
     def get_exercise(self, ex_id: str):
-        db = SessionLocal()
-        try:
-            ex = ExerciseRepository(db).get(ex_id)
-            if not ex:
-                return None
-            return schemas.ExerciseRead(id=ex.id, name=ex.name, description=ex.description)
-        finally:
-            db.close()
+        cached = exercise_cache.get(ex_id)
+        if cached is not None:
+            return cached
+        ex = self.reads.get(ex_id)
+        if not ex:
+            return None
+        found = _to_exercise_read(ex)
+        exercise_cache.set(ex_id, found)
+        return found
+
+    def get_exercises(self, ex_ids: set[str]) -> dict[str, schemas.ExerciseRead]:
+        """Found exercises by id; only cache misses go to the database (one IN query)"""
+        found = {}
+        for ex_id in ex_ids:
+            cached = exercise_cache.get(ex_id)
+            if cached is not None:
+                found[ex_id] = cached
+        missing = ex_ids - found.keys()
+        if missing:
+            for ex_id, ex in self.reads.get_many(missing).items():
+                found[ex_id] = _to_exercise_read(ex)
+                exercise_cache.set(ex_id, found[ex_id])
+        return found
 
 
 class WorkoutService:
+    def __init__(self, uow: UnitOfWork):
+        self.uow = uow
+        self.repo = WorkoutRepository(uow.session)
+        self.reads = WorkoutRepository(uow.reader)
+        self.versions = VersionRepository(uow.reader)
+
     def create_workout(self, data: schemas.WorkoutCreate) -> schemas.WorkoutRead:
-        db = SessionLocal()
-        try:
-            repo = WorkoutRepository(db)
-            w = repo.create(workout_date=data.workout_date, note=data.note)
-            return schemas.WorkoutRead(id=w.id, workout_date=w.workout_date, note=w.note, sets=[])
-        finally:
-            db.close()
-
-    def list_workouts(self) -> list[schemas.WorkoutRead]:
-        db = SessionLocal()
-        try:
-            items = WorkoutRepository(db).list()
-            result = []
-            for w in items:
-                sets = [
-                    schemas.SetRead(
-                        id=s.id,
-                        reps=s.reps,
-                        weight=float(s.weight),  # Конвертируем Decimal в float
-                        exercise_name=s.exercise_name,
-                    )
-                    for s in w.sets
-                ]
-                result.append(
-                    schemas.WorkoutRead(
-                        id=w.id, workout_date=w.workout_date, note=w.note, sets=sets
-                    )
+        w = self.repo.create(workout_date=data.workout_date, note=data.note)
+        read = schemas.WorkoutRead(
+            id=str(w.public_id), workout_date=w.workout_date, note=w.note, sets=[]
+        )
+        read._version = w.version
+        return read
+
+    def list_version(self) -> int:
+        return self.versions.get(WORKOUT_LIST)
+
+    def workout_version(self, workout_id: str) -> int | None:
+        return self.reads.version(workout_id)
+
+    def list_workouts_json(
+        self,
+        limit: int = DEFAULT_PAGE_SIZE,
+        cursor: str | None = None,
+        fields: frozenset[str] = schemas.WORKOUT_VIEWS["full"],
+    ) -> tuple[int, bytes]:
+        """
+        (list version, JSON of a schemas.WorkoutPage). Hot path for big pages: built
+        from plain rows straight into dicts and one json.dumps, without ORM objects
+        or Pydantic models; the shape is pinned to WorkoutPage by the API tests.
+        Items carry only `fields` (plus id); sets are queried only if asked for.
+        """
+        after = decode_cursor(cursor) if cursor else None
+        version = self.list_version()
+        # Берем на одну строку больше, чтобы понять, есть ли следующая страница
+        rows = self.reads.page_rows(limit + 1, after=after)
+        has_more = len(rows) > limit
+        rows = rows[:limit]
+        next_cursor = None
+        if has_more:
+            last = rows[-1]
+            next_cursor = encode_cursor(last.workout_date, _uuid_str(last.public_id))
+
+        sets: dict[int, list[dict]] = {row.id: [] for row in rows}
+        if "sets" in fields:
+            for workout_id, set_id, reps, weight, ex_id, ex_name in self.reads.set_rows(list(sets)):
+                sets[workout_id].append(
+                    {
+                        "id": _uuid_str(set_id),
+                        "reps": reps,
+                        "weight": float(weight),
+                        "exercise_id": _uuid_str(ex_id),
+                        "exercise_name": ex_name,
+                    }
                 )
-            return result
-        finally:
-            db.close()
+        keys = [name for name in schemas.WORKOUT_FIELDS if name in fields or name == "id"]
+        items = []
+        for pk, public_id, workout_date, note, set_count, total_volume in rows:
+            item = {
+                "workout_date": workout_date.isoformat(),
+                "note": note,
+                "id": _uuid_str(public_id),
+                "sets": sets[pk],
+                "set_count": set_count,
+                "total_volume": float(total_volume),
+            }
+            items.append(item if len(keys) == len(item) else {k: item[k] for k in keys})
+        return version, _dump_json({"items": items, "next_cursor": next_cursor})
 
     def get_workout(self, workout_id: str):
-        db = SessionLocal()
-        try:
-            w = WorkoutRepository(db).get(workout_id)
-            if not w:
-                return None
-            sets = [
-                schemas.SetRead(
-                    id=s.id,
-                    reps=s.reps,
-                    weight=float(s.weight),  # Конвертируем Decimal в float
-                    exercise_name=s.exercise_name,
-                )
-                for s in w.sets
-            ]
-            return schemas.WorkoutRead(id=w.id, workout_date=w.workout_date, note=w.note, sets=sets)
-        finally:
-            db.close()
-
-    def add_set(self, workout_id: str, set_in: schemas.SetBase, exercise_name: str):
-        db = SessionLocal()
-        try:
-            repo = WorkoutRepository(db)
-            w = repo.get(workout_id)
-            if not w:
+        w = self.reads.get(workout_id)
+        if not w:
+            return None
+        return _to_workout_read(w)
+
+    def load_workout_json(self, workout_id: str) -> tuple[int, bytes] | None:
+        """Cache miss path of GET /workouts/{id}: (version, JSON body), stored in the cache"""
+        generation = workout_json_cache.generation
+        w = self.reads.get(workout_id)
+        if not w:
+            return None
+        entry = (w.version, _to_workout_read(w).model_dump_json().encode())
+        workout_json_cache.set(workout_id, entry, generation=generation)
+        return entry
+
+    def _invalidate_after_commit(self, workout_id: str) -> None:
+        self.uow.after_commit(lambda: workout_json_cache.invalidate(workout_id))
+
+    def add_set(self, workout_id: str, set_in: schemas.SetBase, exercise: schemas.ExerciseRead):
+        w = self.repo.get(workout_id)
+        if not w:
+            return None
+        updated = self.repo.add_set(
+            w, reps=set_in.reps, weight=set_in.weight, exercise_id=exercise._pk
+        )
+        self._invalidate_after_commit(workout_id)
+        return _to_workout_read(updated, {exercise._pk: exercise})
+
+    def add_sets(
+        self,
+        workout_id: str,
+        sets_in: list[schemas.SetCreate],
+        exercises: dict[str, schemas.ExerciseRead],
+    ):
+        missing = {str(s.exercise_id) for s in sets_in} - exercises.keys()
+        if missing:
+            raise ExerciseNotFoundError(sorted(missing))
+        w = self.repo.get(workout_id)
+        if not w:
+            return None
+        rows = [
+            {"reps": s.reps, "weight": s.weight, "exercise_id": exercises[str(s.exercise_id)]._pk}
+            for s in sets_in
+        ]
+        by_pk = {ex._pk: ex for ex in exercises.values()}
+        updated = self.repo.add_sets(w, rows)
+        self._invalidate_after_commit(workout_id)
+        return _to_workout_read(updated, by_pk)
+
+
+class AnalyticsService:
+    """Reads the weekly rollups only, never the raw sets: cost is O(weeks)"""
+
+    def __init__(self, uow: UnitOfWork):
+        self.exercises = ExerciseService(uow)
+        self.stats = ExerciseStatsRepository(uow.reader)
+
+    def exercise_analytics(self, ex_id: str) -> schemas.ExerciseAnalytics | None:
+        exercise = self.exercises.get_exercise(ex_id)
+        if exercise is None:
+            return None
+        weeks = self.stats.weeks(exercise._pk)
+        result = schemas.ExerciseAnalytics(exercise_id=exercise.id, exercise_name=exercise.name)
+        if not weeks:
+            return result
+        best = max(weeks, key=lambda wk: (wk.best_weight, wk.best_reps))
+        result.set_count = sum(wk.set_count for wk in weeks)
+        result.total_reps = sum(wk.total_reps for wk in weeks)
+        result.total_volume = float(sum(wk.total_volume for wk in weeks))
+        result.best_set = schemas.BestSet(weight=float(best.best_weight), reps=best.best_reps)
+        result.estimated_1rm = float(max(wk.best_e1rm for wk in weeks))
+        result.weekly = [
+            schemas.WeeklyVolume(
+                week_start=wk.week_start,
+                set_count=wk.set_count,
+                total_reps=wk.total_reps,
+                volume=float(wk.total_volume),
+                best_e1rm=float(wk.best_e1rm),
+            )
+            for wk in weeks
+        ]
+        return result
+
+
+class DashboardService:
+    """Cross-user aggregates over the columnar snapshot of all sets"""
+
+    def __init__(self, uow: UnitOfWork):
+        self.uow = uow
+        self.exercises = ExerciseService(uow)
+
+    def _columns(self) -> analytics.SetColumns:
+        return columns_snapshot.get()
+
+    def _catalogue(self) -> dict[int, schemas.ExerciseRead]:
+        return {ex._pk: ex for ex in self.exercises.list_exercises()}
+
+    def exercise_summaries(self) -> list[schemas.ExerciseSummary]:
+        agg = analytics.by_exercise(self._columns())
+        catalogue = self._catalogue()
+        rows = zip(
+            agg.exercise_id.tolist(),
+            agg.set_count.tolist(),
+            agg.total_reps.tolist(),
+            agg.total_volume.tolist(),
+            agg.max_weight.tolist(),
+            agg.weight_percentiles[50].tolist(),
+            agg.weight_percentiles[90].tolist(),
+            agg.best_e1rm.tolist(),
+            strict=True,
+        )
+        return [
+            schemas.ExerciseSummary(
+                exercise_id=catalogue[pk].id,
+                exercise_name=catalogue[pk].name,
+                set_count=count,
+                total_reps=reps,
+                total_volume=volume,
+                max_weight=max_weight,
+                weight_p50=p50,
+                weight_p90=p90,
+                best_e1rm=best,
+            )
+            for pk, count, reps, volume, max_weight, p50, p90, best in rows
+            if pk in catalogue
+        ]
+
+    def weekly_volume(self, ex_id: str | None = None) -> list[schemas.ExerciseWeekVolume] | None:
+        cols = self._columns()
+        if ex_id is not None:
+            exercise = self.exercises.get_exercise(ex_id)
+            if exercise is None:
                 return None
-            updated = repo.add_set(
-                w, reps=set_in.reps, weight=set_in.weight, exercise_name=exercise_name
+            cols = cols.only(exercise._pk)
+        catalogue = self._catalogue()
+        ex_ids, weeks, counts, volumes = analytics.weekly_volume(cols)
+        rows = zip(
+            ex_ids.tolist(),
+            analytics.to_date(weeks),
+            counts.tolist(),
+            volumes.tolist(),
+            strict=True,
+        )
+        return [
+            schemas.ExerciseWeekVolume(
+                exercise_id=catalogue[pk].id, week_start=week, set_count=count, volume=volume
             )
-            sets = [
-                schemas.SetRead(
-                    id=s.id,
-                    reps=s.reps,
-                    weight=float(s.weight),  # Конвертируем Decimal в float
-                    exercise_name=s.exercise_name,
-                )
-                for s in updated.sets
-            ]
-            return schemas.WorkoutRead(
-                id=updated.id,
-                workout_date=updated.workout_date,
-                note=updated.note,
-                sets=sets,
+            for pk, week, count, volume in rows
+            if pk in catalogue
+        ]
+
+    def progression(
+        self, ex_id: str, window_weeks: int = 4
+    ) -> list[schemas.ProgressionPoint] | None:
+        exercise = self.exercises.get_exercise(ex_id)
+        if exercise is None:
+            return None
+        weeks, best, rolling = analytics.progression(
+            self._columns().only(exercise._pk), window_weeks
+        )
+        return [
+            schemas.ProgressionPoint(week_start=week, best_e1rm=b, rolling_best_e1rm=r)
+            for week, b, r in zip(
+                analytics.to_date(weeks), best.tolist(), rolling.tolist(), strict=True
+            )
+        ]
+
+
+class AsyncExerciseService:
+    """Awaitable ExerciseService: runs it in the threadpool or, in async mode, via run_sync"""
+
+    def __init__(self, runner: UnitOfWorkRunner):
+        self.runner = runner
+
+    async def create_exercise(self, data: schemas.ExerciseCreate) -> schemas.ExerciseRead:
+        return await self.runner.run(lambda uow: ExerciseService(uow).create_exercise(data))
+
+    async def list_exercises(self) -> list[schemas.ExerciseRead]:
+        return await self.runner.run(lambda uow: ExerciseService(uow).list_exercises())
+
+    async def get_exercise(self, ex_id: str) -> schemas.ExerciseRead | None:
+        return await self.runner.run(lambda uow: ExerciseService(uow).get_exercise(ex_id))
+
+    async def get_exercises(self, ex_ids: set[str]) -> dict[str, schemas.ExerciseRead]:
+        return await self.runner.run(lambda uow: ExerciseService(uow).get_exercises(ex_ids))
+
+    async def catalogue_version(self) -> int:
+        return await self.runner.run(lambda uow: ExerciseService(uow).catalogue_version())
+
+    async def catalogue(self) -> tuple[int, list[schemas.ExerciseRead]]:
+        return await self.runner.run(lambda uow: ExerciseService(uow).catalogue())
+
+
+class AsyncWorkoutService:
+    """Awaitable WorkoutService, see AsyncExerciseService"""
+
+    def __init__(self, runner: UnitOfWorkRunner):
+        self.runner = runner
+
+    async def create_workout(self, data: schemas.WorkoutCreate) -> schemas.WorkoutRead:
+        return await self.runner.run(lambda uow: WorkoutService(uow).create_workout(data))
+
+    async def list_workouts_json(
+        self,
+        limit: int = DEFAULT_PAGE_SIZE,
+        cursor: str | None = None,
+        fields: frozenset[str] = schemas.WORKOUT_VIEWS["full"],
+    ) -> tuple[int, bytes]:
+        return await self.runner.run(
+            lambda uow: WorkoutService(uow).list_workouts_json(
+                limit=limit, cursor=cursor, fields=fields
             )
-        finally:
-            db.close()
+        )
+
+    async def get_workout(self, workout_id: str) -> schemas.WorkoutRead | None:
+        return await self.runner.run(lambda uow: WorkoutService(uow).get_workout(workout_id))
+
+    @staticmethod
+    def cached_workout_json(workout_id: str) -> tuple[int, bytes] | None:
+        """Cache hit path: no unit of work, no threadpool hop"""
+        return workout_json_cache.get(workout_id)
+
+    async def load_workout_json(self, workout_id: str) -> tuple[int, bytes] | None:
+        return await self.runner.run(lambda uow: WorkoutService(uow).load_workout_json(workout_id))
+
+    async def list_version(self) -> int:
+        return await self.runner.run(lambda uow: WorkoutService(uow).list_version())
+
+    async def workout_version(self, workout_id: str) -> int | None:
+        return await self.runner.run(lambda uow: WorkoutService(uow).workout_version(workout_id))
+
+    async def add_set(
+        self, workout_id: str, set_in: schemas.SetBase, exercise: schemas.ExerciseRead
+    ) -> schemas.WorkoutRead | None:
+        return await self.runner.run(
+            lambda uow: WorkoutService(uow).add_set(workout_id, set_in, exercise)
+        )
+
+    async def add_sets(
+        self,
+        workout_id: str,
+        sets_in: list[schemas.SetCreate],
+        exercises: dict[str, schemas.ExerciseRead],
+    ) -> schemas.WorkoutRead | None:
+        return await self.runner.run(
+            lambda uow: WorkoutService(uow).add_sets(workout_id, sets_in, exercises)
+        )
+
+
+class AsyncAnalyticsService:
+    """Awaitable AnalyticsService, see AsyncExerciseService"""
+
+    def __init__(self, runner: UnitOfWorkRunner):
+        self.runner = runner
+
+    async def exercise_analytics(self, ex_id: str) -> schemas.ExerciseAnalytics | None:
+        return await self.runner.run(lambda uow: AnalyticsService(uow).exercise_analytics(ex_id))
+
+
+class AsyncDashboardService:
+    """Awaitable DashboardService, see AsyncExerciseService"""
+
+    def __init__(self, runner: UnitOfWorkRunner):
+        self.runner = runner
+
+    async def exercise_summaries(self) -> list[schemas.ExerciseSummary]:
+        return await self.runner.run(lambda uow: DashboardService(uow).exercise_summaries())
+
+    async def weekly_volume(
+        self, ex_id: str | None = None
+    ) -> list[schemas.ExerciseWeekVolume] | None:
+        return await self.runner.run(lambda uow: DashboardService(uow).weekly_volume(ex_id))
+
+    async def progression(
+        self, ex_id: str, window_weeks: int = 4
+    ) -> list[schemas.ProgressionPoint] | None:
+        return await self.runner.run(
+            lambda uow: DashboardService(uow).progression(ex_id, window_weeks)
+        )
+
+
+def cache_stats() -> dict[str, dict[str, float]]:
+    return {
+        "workout_json": {**workout_json_cache.stats(), "max_bytes": workout_json_cache.max_bytes},
+        "exercises": exercise_cache.stats(),
+    }
+
+
+def _export_chunk(batch: list[db_models.Workout]) -> bytes:
+    return b"".join(_to_workout_read(w).model_dump_json().encode() + b"\n" for w in batch)
+
+
+def export_workouts(chunk_size: int = EXPORT_CHUNK_SIZE) -> Iterator[bytes]:
+    """
+    NDJSON dump of all workouts; memory is bounded by one chunk, not by the table.
+    Each chunk is read by keyset in its own short session, and the connection goes
+    back to the pool before the chunk is sent: a slow client holds no connection.
+    Workouts written during the export may or may not be in it; none is repeated.
+    """
+    after = None
+    while True:
+        with ReadSessionLocal() as db:
+            batch = WorkoutRepository(db).export_batch(chunk_size, after)
+            chunk = _export_chunk(batch)
+        if not batch:
+            return
+        yield chunk
+        after = (batch[-1].workout_date, batch[-1].id)
+
+
+async def export_workouts_async(chunk_size: int = EXPORT_CHUNK_SIZE) -> AsyncIterator[bytes]:
+    """export_workouts for async mode: the same keyset chunks over the async engine"""
+    after = None
+    while True:
+        async with async_read_session_factory()() as session:
+            stmt = WorkoutRepository.export_batch_statement(chunk_size, after)
+            batch = list(await session.scalars(stmt))
+            chunk = _export_chunk(batch)
+        if not batch:
+            return
+        yield chunk
+        after = (batch[-1].workout_date, batch[-1].id)
@@ -0,0 +1,160 @@
+"""
+Dashboard aggregates: vectorized NumPy (app/analytics.py) vs a pure-Python baseline.
+
+    python bench/bench_analytics.py [--sets 10000000] [--db-sets 300000]
+
+1. Aggregates over --sets synthetic sets already in memory: per-exercise totals,
+   max weight and best e1RM, and weekly volume per exercise. The baseline loops
+   over the same rows as Python values (fed in 1M-row chunks to bound memory).
+2. End to end from SQLite with --db-sets rows: iterating db_models.Set ORM
+   objects vs load_columns() + by_exercise().
+"""
+
+import argparse
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from sqlalchemy import create_engine, insert  # noqa: E402
+from sqlalchemy.orm import Session, joinedload  # noqa: E402
+
+from app import analytics, db_models  # noqa: E402
+from app.db import Base  # noqa: E402
+
+EXERCISES = 200
+DAYS = (19_000, 20_500)  # 2022-01-08 .. 2026-02-15
+CHUNK = 1_000_000
+
+
+def synthetic(n: int, seed: int = 42) -> analytics.SetColumns:
+    rng = np.random.default_rng(seed)
+    return analytics.SetColumns(
+        exercise_id=rng.integers(1, EXERCISES + 1, n).astype(np.int32),
+        day=rng.integers(*DAYS, n).astype(np.int32),
+        reps=rng.integers(1, 13, n).astype(np.int32),
+        weight=rng.integers(0, 500, n) * 0.5,
+    )
+
+
+def python_baseline(cols: analytics.SetColumns) -> tuple[dict, dict]:
+    per_exercise: dict[int, list] = {}
+    weekly: dict[tuple[int, int], list] = defaultdict(lambda: [0, 0.0])
+    for start in range(0, len(cols), CHUNK):
+        rows = zip(
+            cols.exercise_id[start : start + CHUNK].tolist(),
+            cols.day[start : start + CHUNK].tolist(),
+            cols.reps[start : start + CHUNK].tolist(),
+            cols.weight[start : start + CHUNK].tolist(),
+            strict=True,
+        )
+        for ex, day, reps, weight in rows:
+            volume = reps * weight
+            e1rm = weight if reps == 1 else weight * (1 + reps / 30)
+            stats = per_exercise.get(ex)
+            if stats is None:
+                per_exercise[ex] = [1, reps, volume, weight, e1rm]
+            else:
+                stats[0] += 1
+                stats[1] += reps
+                stats[2] += volume
+                stats[3] = max(stats[3], weight)
+                stats[4] = max(stats[4], e1rm)
+            week = weekly[(ex, day - (day + 3) % 7)]
+            week[0] += 1
+            week[1] += volume
+    return per_exercise, weekly
+
+
+def vectorized(cols: analytics.SetColumns):
+    return analytics.by_exercise(cols), analytics.weekly_volume(cols)
+
+
+def timed(fn, *args) -> tuple[float, object]:
+    start = time.perf_counter()
+    result = fn(*args)
+    return time.perf_counter() - start, result
+
+
+def bench_in_memory(n: int) -> None:
+    cols = synthetic(n)
+    t_np, (agg, weekly) = timed(vectorized, cols)
+    t_py, (per_exercise, py_weekly) = timed(python_baseline, cols)
+    assert len(per_exercise) == len(agg.exercise_id)
+    assert len(py_weekly) == len(weekly[0])
+    print(f"in memory, {n:,} sets:")
+    print(f"  pure Python  {t_py:8.2f} s")
+    print(f"  NumPy        {t_np:8.2f} s   x{t_py / t_np:.0f}")
+
+
+def bench_from_db(n: int) -> None:
+    cols = synthetic(n, seed=1)
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = create_engine(f"sqlite:///{tmp}/bench.db")
+        Base.metadata.create_all(engine)
+        days = analytics.to_date(np.arange(*DAYS))
+        with Session(engine) as db:
+            db.execute(
+                insert(db_models.Exercise.__table__),
+                [{"name": f"Exercise {i}"} for i in range(1, EXERCISES + 1)],
+            )
+            db.execute(
+                insert(db_models.Workout.__table__),
+                [{"workout_date": day} for day in days],
+            )
+            db.execute(
+                insert(db_models.Set.__table__),
+                [
+                    {"exercise_id": ex, "workout_id": day - DAYS[0] + 1, "reps": r, "weight": w}
+                    for ex, day, r, w in zip(
+                        cols.exercise_id.tolist(),
+                        cols.day.tolist(),
+                        cols.reps.tolist(),
+                        cols.weight.tolist(),
+                        strict=True,
+                    )
+                ],
+            )
+            db.commit()
+
+        def orm_loop() -> dict:
+            per_exercise: dict[int, list] = {}
+            with Session(engine) as db:
+                sets = db.query(db_models.Set).options(joinedload(db_models.Set.workout))
+                for s in sets.yield_per(10_000):
+                    stats = per_exercise.setdefault(s.exercise_id, [0, 0.0, 0.0])
+                    stats[0] += 1
+                    stats[1] += s.reps * float(s.weight)
+                    stats[2] = max(stats[2], float(s.weight))
+                    s.workout.workout_date  # noqa: B018 - как в построчной аналитике
+            return per_exercise
+
+        def columnar() -> analytics.ExerciseAggregates:
+            with Session(engine) as db:
+                return analytics.by_exercise(analytics.load_columns(db))
+
+        t_orm, _ = timed(orm_loop)
+        t_col, _ = timed(columnar)
+        engine.dispose()
+    print(f"from SQLite, {n:,} sets:")
+    print(f"  ORM objects  {t_orm:8.2f} s")
+    print(f"  columnar     {t_col:8.2f} s   x{t_orm / t_col:.1f}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sets", type=int, default=10_000_000)
+    parser.add_argument("--db-sets", type=int, default=300_000)
+    args = parser.parse_args()
+    bench_in_memory(args.sets)
+    if args.db_sets:
+        bench_from_db(args.db_sets)
+
+
+if __name__ == "__main__":
+    main()
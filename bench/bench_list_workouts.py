@@ -0,0 +1,126 @@
+"""
+GET /workouts/ with a 10k-set page: ORM objects -> validated models -> FastAPI
+response_model (the previous path) vs plain rows -> dicts -> one json.dumps.
+
+    python bench/bench_list_workouts.py [--workouts 200] [--sets-per-workout 50]
+
+The previous path is mounted next to the real route as /bench/workouts-legacy:
+the page was loaded as Workout/Set/Exercise ORM objects, services built
+WorkoutRead/SetRead with validation, then FastAPI validated the returned page
+against response_model again and encoded it with jsonable_encoder + json.dumps.
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+REPEAT = 20
+
+
+def seed(n_workouts: int, sets_per_workout: int) -> None:
+    from sqlalchemy import insert
+
+    from app import db_models
+    from app.db import unit_of_work
+
+    with unit_of_work() as uow:
+        db = uow.session
+        ex = db_models.Exercise.__table__
+        exercise_ids = db.scalars(
+            insert(ex).returning(ex.c.id, sort_by_parameter_order=True),
+            [{"name": f"Exercise {i}"} for i in range(20)],
+        ).all()
+        w = db_models.Workout.__table__
+        workout_ids = db.scalars(
+            insert(w).returning(w.c.id, sort_by_parameter_order=True),
+            [{"workout_date": date(2025, 1, 1) + timedelta(days=i)} for i in range(n_workouts)],
+        ).all()
+        db.execute(
+            insert(db_models.Set.__table__),
+            [
+                {
+                    "workout_id": workout_id,
+                    "exercise_id": exercise_ids[i % len(exercise_ids)],
+                    "reps": 5 + i % 8,
+                    "weight": f"{40 + i % 60}.50",
+                }
+                for workout_id in workout_ids
+                for i in range(sets_per_workout)
+            ],
+        )
+        uow.commit()
+
+
+def mount_legacy_route(app) -> None:
+    from app import db_models, schemas
+    from app.db import ReadSessionLocal
+    from app.repositories import WITH_SETS
+
+    def legacy_read(w) -> schemas.WorkoutRead:
+        sets = [
+            schemas.SetRead(
+                id=str(s.public_id),
+                reps=s.reps,
+                weight=float(s.weight),
+                exercise_id=str(s.exercise.public_id),
+                exercise_name=s.exercise.name,
+            )
+            for s in w.sets
+        ]
+        return schemas.WorkoutRead(
+            id=str(w.public_id), workout_date=w.workout_date, note=w.note, sets=sets
+        )
+
+    @app.get("/bench/workouts-legacy", response_model=schemas.WorkoutPage)
+    def legacy(limit: int = 50):
+        db = ReadSessionLocal()
+        try:
+            w = db_models.Workout
+            q = db.query(w).options(WITH_SETS).order_by(w.workout_date.desc(), w.id.desc())
+            items = q.limit(limit).all()
+            return schemas.WorkoutPage(items=[legacy_read(w) for w in items])
+        finally:
+            db.close()
+
+
+def timed(client, url: str) -> tuple[float, int]:
+    client.get(url)  # прогрев
+    start = time.perf_counter()
+    for _ in range(REPEAT):
+        response = client.get(url)
+    return (time.perf_counter() - start) / REPEAT, len(response.content)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--workouts", type=int, default=200)
+    parser.add_argument("--sets-per-workout", type=int, default=50)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        os.environ["DATABASE_URL"] = f"sqlite:///{tmp}/bench.db"
+        from fastapi.testclient import TestClient
+
+        from app import main as app_main
+
+        seed(args.workouts, args.sets_per_workout)
+        mount_legacy_route(app_main.app)
+
+        limit = args.workouts
+        with TestClient(app_main.app) as client:
+            old, size = timed(client, f"/bench/workouts-legacy?limit={limit}")
+            new, _ = timed(client, f"/workouts/?limit={limit}")
+
+    print(f"GET /workouts/?limit={limit}: {limit * args.sets_per_workout:,} sets, {size:,} bytes")
+    print(f"  response_model path  {old * 1000:8.1f} ms")
+    print(f"  fast path            {new * 1000:8.1f} ms   x{old / new:.1f}")
+
+
+if __name__ == "__main__":
+    main()
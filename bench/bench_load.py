@@ -0,0 +1,445 @@
+"""
+Reproducible load test: seeded synthetic dataset plus scenario-based request mixes.
+
+    python bench/bench_load.py seed [--users 50] [--database sqlite:///./other.db]
+    python bench/bench_load.py run [--scenario browse] [--target asgi|uvicorn|URL]
+                                   [--output result.json] [--baseline baseline.json]
+
+seed: bulk-inserts `--users` users' worth of data into --database. The default
+is bench/results/bench.db, which is git-ignored and recreated on every seed.
+Each user has --workouts-per-user workouts on consecutive days, with sets from their own
+--exercises-per-user exercises. The schema has no user table, so a user is only
+the unit of data volume and of client identity in the load below. Everything,
+public ids included, comes from one random.Random(--seed), so the same arguments
+always produce the same database. Rollups and workout totals are rebuilt at the
+end, as `python -m app.cli rebuild-rollups` does.
+
+run: seeds a fresh temporary database (or uses --database as is). It then sends
+--requests requests from --concurrency virtual users, each following its own
+seeded sequence of operations drawn from the scenario weights.
+
+Targets:
+- asgi: the app in-process through httpx.ASGITransport, which measures the app
+  itself.
+- uvicorn: a local `uvicorn app.main:app` subprocess with --workers.
+- a URL: an already running server; --database must then point at its data.
+
+Every virtual user sends its own X-Forwarded-For. The per-client rate limit
+therefore applies per user, as in production, rather than to the load
+generator as a whole.
+
+Environment variables such as DB_ENGINE_PROFILE and DB_MODE are passed to the
+app unchanged. Write-heavy mixes (`logging`, `add_set`) on a real server need
+DB_ENGINE_PROFILE=production. With the default profile, concurrent writers
+fail with "database is locked", and those failures show up as errors.
+
+The report gives p50/p95/p99 latency per operation and overall, plus requests
+per second. It is written as JSON to --output. With --baseline, the run fails
+(exit code 1) if the overall or any operation's p95 latency got worse than
+--threshold, if the overall throughput fell by more than --threshold, or if
+errors appeared where the baseline had none.
+"""
+
+import argparse
+import asyncio
+import json
+import math
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+from datetime import date, timedelta
+from pathlib import Path
+
+import httpx
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+
+# Git-игнорируемый каталог: seed по умолчанию не трогает рабочую wagonee.db
+RESULTS_DIR = ROOT / "bench" / "results"
+SEED_DATABASE = f"sqlite:///{(RESULTS_DIR / 'bench.db').as_posix()}"
+
+# операция -> вес в смеси
+SCENARIOS = {
+    "browse": {"list": 45, "get": 45, "add_set": 8, "create_exercise": 2},
+    "logging": {"list": 10, "get": 30, "add_set": 55, "create_exercise": 5},
+    "list": {"list": 1},
+    "get": {"get": 1},
+    "add_set": {"add_set": 1},
+    "create_exercise": {"create_exercise": 1},
+}
+EXERCISE_CATALOGUE = 200
+FIRST_DAY = date(2023, 1, 2)
+PERCENTILES = (50, 95, 99)
+
+
+# --- датасет ---
+
+
+def seeded_uuid7(rnd: random.Random, day: date) -> uuid.UUID:
+    """UUIDv7 layout (see app.db_models.uuid7) with the time taken from `day`, bits from `rnd`"""
+    ms = (day - date(1970, 1, 1)).days * 86_400_000 + rnd.getrandbits(26)
+    value = ms << 80 | rnd.getrandbits(80)
+    value = value & ~(0xF << 76) | 0x7 << 76
+    value = value & ~(0x3 << 62) | 0x2 << 62
+    return uuid.UUID(int=value)
+
+
+def seed(
+    users: int,
+    workouts_per_user: int,
+    sets_per_workout: int,
+    exercises_per_user: int,
+    seed_value: int,
+) -> dict:
+    """Fill the database of app.db (DATABASE_URL) with synthetic users' data, one commit per user"""
+    from sqlalchemy import insert
+
+    from app import db_models
+    from app.db import init_db, unit_of_work
+    from app.repositories import ExerciseStatsRepository, WorkoutRepository
+
+    init_db()
+    rnd = random.Random(seed_value)  # noqa: S311 - синтетические данные
+    ex, w, s = db_models.Exercise.__table__, db_models.Workout.__table__, db_models.Set.__table__
+
+    with unit_of_work() as uow:
+        exercise_ids = uow.session.scalars(
+            insert(ex).returning(ex.c.id, sort_by_parameter_order=True),
+            [
+                {"public_id": seeded_uuid7(rnd, FIRST_DAY), "name": f"Exercise {i}"}
+                for i in range(EXERCISE_CATALOGUE)
+            ],
+        ).all()
+
+    for _ in range(users):
+        own = rnd.sample(exercise_ids, min(exercises_per_user, len(exercise_ids)))
+        start = FIRST_DAY + timedelta(days=rnd.randrange(365))
+        days = [start + timedelta(days=d) for d in range(workouts_per_user)]
+        with unit_of_work() as uow:
+            workout_ids = uow.session.scalars(
+                insert(w).returning(w.c.id, sort_by_parameter_order=True),
+                [{"public_id": seeded_uuid7(rnd, day), "workout_date": day} for day in days],
+            ).all()
+            uow.session.execute(
+                insert(s),
+                [
+                    {
+                        "public_id": seeded_uuid7(rnd, day),
+                        "workout_id": workout_id,
+                        "exercise_id": rnd.choice(own),
+                        "reps": rnd.randint(3, 15),
+                        "weight": f"{rnd.randint(20, 180)}.{rnd.choice((0, 25, 50, 75)):02d}",
+                    }
+                    for workout_id, day in zip(workout_ids, days, strict=True)
+                    for _ in range(sets_per_workout)
+                ],
+            )
+
+    with unit_of_work() as uow:
+        ExerciseStatsRepository(uow.session).rebuild()
+        WorkoutRepository(uow.session).rebuild_totals()
+    return {
+        "users": users,
+        "workouts": users * workouts_per_user,
+        "sets": users * workouts_per_user * sets_per_workout,
+        "exercises": EXERCISE_CATALOGUE,
+        "seed": seed_value,
+    }
+
+
+def load_ids(database_url: str, limit: int = 5000) -> tuple[list[str], list[str]]:
+    """Public ids the operations pick from (the newest workouts, like a real client)"""
+    from sqlalchemy import create_engine, text
+
+    engine = create_engine(database_url)
+    try:
+        with engine.connect() as conn:
+            workouts = conn.execute(
+                text("SELECT public_id FROM workouts ORDER BY id DESC LIMIT :n"), {"n": limit}
+            ).scalars()
+            workout_ids = [str(uuid.UUID(bytes=raw)) for raw in workouts]
+            exercises = conn.execute(text("SELECT public_id FROM exercises")).scalars()
+            exercise_ids = [str(uuid.UUID(bytes=raw)) for raw in exercises]
+    finally:
+        engine.dispose()
+    if not workout_ids or not exercise_ids:
+        raise SystemExit(f"{database_url} has no workouts/exercises: run `seed` first")
+    return workout_ids, exercise_ids
+
+
+# --- нагрузка ---
+
+
+def operation(name: str, rnd: random.Random, workout_ids: list[str], exercise_ids: list[str]):
+    """(method, url, json body) of one request"""
+    if name == "list":
+        view = "summary" if rnd.random() < 0.3 else "full"
+        return "GET", f"/workouts/?limit=20&view={view}", None
+    if name == "get":
+        return "GET", f"/workouts/{rnd.choice(workout_ids)}", None
+    if name == "add_set":
+        url = f"/workouts/{rnd.choice(workout_ids)}/sets?exercise_id={rnd.choice(exercise_ids)}"
+        return "POST", url, {"reps": rnd.randint(3, 15), "weight": str(rnd.randint(20, 180))}
+    if name == "create_exercise":
+        return "POST", "/exercises/", {"name": f"Load test {rnd.getrandbits(48):x}"}
+    raise ValueError(f"Unknown operation {name!r}")
+
+
+async def virtual_user(
+    client: httpx.AsyncClient,
+    user: int,
+    args: argparse.Namespace,
+    budget: list[int],
+    ids: tuple[list[str], list[str]],
+    samples: dict[str, list[float]],
+    errors: dict[str, int],
+) -> None:
+    rnd = random.Random(args.seed * 1_000_003 + user)  # noqa: S311 - синтетическая нагрузка
+    weights = SCENARIOS[args.scenario]
+    names, shares = list(weights), list(weights.values())
+    headers = {"X-Forwarded-For": f"10.{user // 65536 % 256}.{user // 256 % 256}.{user % 256}"}
+    while budget[0] > 0:
+        budget[0] -= 1
+        name = rnd.choices(names, shares)[0]
+        method, url, body = operation(name, rnd, *ids)
+        start = time.perf_counter()
+        try:
+            response = await client.request(method, url, json=body, headers=headers)
+            failed = response.status_code >= 400
+        except httpx.TransportError:
+            failed = True  # сервер оборвал соединение (например, после 500)
+        samples[name].append(time.perf_counter() - start)
+        errors[name] += failed
+
+
+def percentile(sorted_values: list[float], p: float) -> float:
+    """Nearest-rank percentile"""
+    rank = max(1, math.ceil(p / 100 * len(sorted_values)))
+    return sorted_values[rank - 1]
+
+
+def summary(latencies: list[float], errors: int, seconds: float) -> dict:
+    values = sorted(latencies)
+    result = {"count": len(values), "errors": errors, "rps": len(values) / seconds}
+    for p in PERCENTILES:
+        result[f"p{p}_ms"] = percentile(values, p) * 1000 if values else 0.0
+    return result
+
+
+async def drive(client: httpx.AsyncClient, args: argparse.Namespace, ids) -> dict:
+    names = SCENARIOS[args.scenario]
+    # Прогрев: соединения, кэши, ленивые импорты не попадают в замер
+    warmup = argparse.Namespace(**{**vars(args), "seed": args.seed + 1})
+    scratch, warmup_budget = {n: [] for n in names}, [args.warmup]
+    await asyncio.gather(
+        *(
+            virtual_user(client, u, warmup, warmup_budget, ids, scratch, dict.fromkeys(names, 0))
+            for u in range(args.concurrency)
+        )
+    )
+
+    samples: dict[str, list[float]] = {n: [] for n in names}
+    errors = dict.fromkeys(names, 0)
+    budget = [args.requests]
+    start = time.perf_counter()
+    await asyncio.gather(
+        *(
+            virtual_user(client, u, args, budget, ids, samples, errors)
+            for u in range(args.concurrency)
+        )
+    )
+    seconds = time.perf_counter() - start
+    all_latencies = [v for values in samples.values() for v in values]
+    return {
+        "overall": summary(all_latencies, sum(errors.values()), seconds),
+        "operations": {n: summary(samples[n], errors[n], seconds) for n in names if samples[n]},
+    }
+
+
+def wait_until_up(base_url: str, timeout: float = 30.0) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            if httpx.get(f"{base_url}/health", timeout=1.0).status_code == 200:
+                return
+        except httpx.TransportError:
+            pass
+        time.sleep(0.2)
+    raise SystemExit(f"server at {base_url} did not come up in {timeout:.0f}s")
+
+
+async def run_against(args: argparse.Namespace, database_url: str, ids) -> dict:
+    limits = httpx.Limits(max_connections=args.concurrency)
+    if args.target == "asgi":
+        from app.main import app
+
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            return await drive(client, args, ids)
+
+    server = None
+    base_url = args.target
+    if args.target == "uvicorn":
+        base_url = f"http://127.0.0.1:{args.port}"
+        env = {**os.environ, "DATABASE_URL": database_url}
+        command = [sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(args.port)]
+        command += ["--workers", str(args.workers), "--log-level", "warning", "--no-access-log"]
+        server = subprocess.Popen(command, cwd=ROOT, env=env)  # noqa: S603 - своя команда
+    try:
+        wait_until_up(base_url)
+        async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=30.0) as client:
+            return await drive(client, args, ids)
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait(timeout=30)
+
+
+def compare(result: dict, baseline: dict, threshold: float) -> list[str]:
+    """Regressions of `result` against `baseline` beyond `threshold` (0.15 = 15%)"""
+    problems = []
+    pairs = [("overall", result["overall"], baseline["overall"])] + [
+        (name, stats, baseline["operations"][name])
+        for name, stats in result["operations"].items()
+        if name in baseline.get("operations", {})
+    ]
+    for name, new, old in pairs:
+        if new["p95_ms"] > old["p95_ms"] * (1 + threshold):
+            problems.append(f"{name}: p95 {old['p95_ms']:.1f} -> {new['p95_ms']:.1f} ms")
+        if new["errors"] and not old["errors"]:
+            problems.append(f"{name}: {new['errors']} errors, baseline had none")
+    old_rps, new_rps = baseline["overall"]["rps"], result["overall"]["rps"]
+    if new_rps < old_rps * (1 - threshold):
+        problems.append(f"overall: {old_rps:.0f} -> {new_rps:.0f} req/s")
+    return problems
+
+
+def print_report(result: dict) -> None:
+    print(
+        f"{result['scenario']} on {result['target']}: {result['overall']['count']} requests, "
+        f"{result['concurrency']} virtual users, {result['dataset'].get('sets', '?')} sets"
+    )
+    print(
+        f"  {'operation':16} {'count':>7} {'errors':>7} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}"
+    )
+    for name, stats in [*result["operations"].items(), ("overall", result["overall"])]:
+        print(
+            f"  {name:16} {stats['count']:7} {stats['errors']:7} {stats['p50_ms']:8.1f} "
+            f"{stats['p95_ms']:8.1f} {stats['p99_ms']:8.1f}"
+        )
+    print(f"  throughput {result['overall']['rps']:.0f} req/s")
+
+
+def add_dataset_arguments(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument("--users", type=int, default=50)
+    parser.add_argument("--workouts-per-user", type=int, default=100)
+    parser.add_argument("--sets-per-workout", type=int, default=12)
+    parser.add_argument("--exercises-per-user", type=int, default=8)
+    parser.add_argument("--seed", type=int, default=42)
+
+
+def seed_command(args: argparse.Namespace) -> int:
+    if args.database == SEED_DATABASE:
+        # Свой файл бенчмарка пересоздается: те же аргументы - та же база
+        RESULTS_DIR.mkdir(parents=True, exist_ok=True)
+        for suffix in ("", "-wal", "-shm"):
+            (RESULTS_DIR / f"bench.db{suffix}").unlink(missing_ok=True)
+    os.environ["DATABASE_URL"] = args.database
+    start = time.perf_counter()
+    dataset = seed(
+        args.users,
+        args.workouts_per_user,
+        args.sets_per_workout,
+        args.exercises_per_user,
+        args.seed,
+    )
+    print(json.dumps({**dataset, "seconds": round(time.perf_counter() - start, 2)}))
+    return 0
+
+
+def run_command(args: argparse.Namespace) -> int:
+    if args.target not in ("asgi", "uvicorn") and args.database is None:
+        raise SystemExit("--target URL needs --database with the data that server uses")
+    with tempfile.TemporaryDirectory() as tmp:
+        database_url = args.database or f"sqlite:///{tmp}/bench.db"
+        os.environ["DATABASE_URL"] = database_url
+        dataset = {"database": args.database}
+        if args.database is None:
+            dataset = seed(
+                args.users,
+                args.workouts_per_user,
+                args.sets_per_workout,
+                args.exercises_per_user,
+                args.seed,
+            )
+        ids = load_ids(database_url)
+        measured = asyncio.run(run_against(args, database_url, ids))
+
+    result = {
+        "scenario": args.scenario,
+        "target": args.target,
+        "requests": args.requests,
+        "concurrency": args.concurrency,
+        "seed": args.seed,
+        "dataset": dataset,
+        "python": platform.python_version(),
+        "cpus": os.cpu_count(),
+        **measured,
+    }
+    print_report(result)
+    if args.output:
+        Path(args.output).parent.mkdir(parents=True, exist_ok=True)
+        Path(args.output).write_text(json.dumps(result, indent=2) + "\n")
+
+    if args.baseline and Path(args.baseline).exists():
+        problems = compare(result, json.loads(Path(args.baseline).read_text()), args.threshold)
+        for problem in problems:
+            print(f"REGRESSION {problem}")
+        if problems:
+            return 1
+        print(f"no regressions against {args.baseline} (threshold {args.threshold:.0%})")
+    elif args.baseline:
+        print(f"baseline {args.baseline} not found, nothing to compare")
+    return 0
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0].strip())
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    seed_parser = commands.add_parser("seed", help="Fill a database with synthetic users' data")
+    add_dataset_arguments(seed_parser)
+    seed_parser.add_argument(
+        "--database", default=SEED_DATABASE, help="default: bench/results/bench.db"
+    )
+    seed_parser.set_defaults(func=seed_command)
+
+    run_parser = commands.add_parser("run", help="Run a load scenario and report latencies")
+    add_dataset_arguments(run_parser)
+    run_parser.add_argument("--database", help="use this seeded database instead of a fresh one")
+    run_parser.add_argument("--scenario", choices=sorted(SCENARIOS), default="browse")
+    run_parser.add_argument("--target", default="asgi", help="asgi | uvicorn | http://host:port")
+    run_parser.add_argument("--requests", type=int, default=2000)
+    run_parser.add_argument("--concurrency", type=int, default=16)
+    run_parser.add_argument("--warmup", type=int, default=100)
+    run_parser.add_argument("--port", type=int, default=8765)
+    run_parser.add_argument("--workers", type=int, default=1)
+    run_parser.add_argument("--output", help="write the result JSON here")
+    run_parser.add_argument(
+        "--baseline", help="compare with this result JSON, exit 1 on regression"
+    )
+    run_parser.add_argument("--threshold", type=float, default=0.15)
+    run_parser.set_defaults(func=run_command)
+
+    args = parser.parse_args()
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,149 @@
+"""
+Log-heavy request path: the previous inline logging (StreamHandler + five masking
+regexes on the calling thread) vs the QueueHandler/QueueListener pipeline.
+
+    python bench/bench_logging.py [--requests 800] [--records 50000]
+
+1. Caller-side cost of one log call (what a request pays), --records calls. For
+   the queue the listener is paused while timing and drained afterwards: with
+   more than one core that work runs in parallel with the requests.
+2. Throughput of POST /exercises/ with an invalid body through TestClient: every
+   422 logs two records, the second with the full validation error text.
+Output goes to a temporary file, flushed per record like stdout.
+"""
+
+import argparse
+import logging
+import os
+import re
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from app import logging_config  # noqa: E402
+
+
+class LegacySensitiveDataFilter(logging.Filter):
+    """SensitiveDataFilter before the change: five passes over every message"""
+
+    PATTERNS = [
+        (re.compile(r'"password"\s*:\s*"[^"]*"'), '"password":"***"'),
+        (re.compile(r'"token"\s*:\s*"[^"]*"'), '"token":"***"'),
+        (re.compile(r'"api_key"\s*:\s*"[^"]*"'), '"api_key":"***"'),
+        (re.compile(r'"secret"\s*:\s*"[^"]*"'), '"secret":"***"'),
+        (re.compile(r"\b[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Z|a-z]{2,}\b"), "***@***.***"),
+    ]
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        message = record.getMessage()
+        for pattern, replacement in self.PATTERNS:
+            message = pattern.sub(replacement, message)
+        record.msg = message
+        record.args = ()
+        return True
+
+
+class LegacyCorrelationIdFilter(logging.Filter):
+    """correlation_id as the legacy handler stamped it: on the calling thread"""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.correlation_id = logging_config.correlation_id_ctx.get() or "N/A"
+        return True
+
+
+def install_legacy(stream) -> None:
+    handler = logging.StreamHandler(stream)
+    handler.setFormatter(logging.Formatter(logging_config.TEXT_FORMAT))
+    handler.addFilter(LegacySensitiveDataFilter())
+    handler.addFilter(LegacyCorrelationIdFilter())
+    logging.getLogger("app").addHandler(handler)
+
+
+def install_queue(stream) -> None:
+    # Тот же setup_logging, но вывод - в файл бенчмарка
+    logging_config.setup_logging()
+    logging_config._listener.handlers = (logging_config.build_output_handler("text", stream),)
+
+
+def reset() -> None:
+    logging_config.shutdown_logging()
+    logging.getLogger("app").handlers.clear()
+
+
+MESSAGE = (
+    "Validation error for user ivan.petrov@example.com: "
+    '[{"type": "missing", "loc": ["body", "name"], "password": "hunter2", "msg": "Field required"}]'
+)
+
+
+def caller_cost(records: int) -> float:
+    logger = logging.getLogger("app.bench")
+    listener = logging_config._listener
+    if listener is not None:
+        listener.stop()
+    start = time.perf_counter()
+    for _ in range(records):
+        logger.warning(MESSAGE)
+    elapsed = time.perf_counter() - start
+    if listener is not None:
+        listener.start()
+    return elapsed / records
+
+
+def request_throughput(requests: int, install) -> float:
+    from fastapi.testclient import TestClient
+
+    sys.modules.pop("app.main", None)  # свежий rate limiter
+    from app import main
+
+    # app.main при импорте сам вызывает setup_logging: ставим нужный вариант заново
+    reset()
+    install()
+    with TestClient(main.app) as client:
+        client.post("/exercises/", json={})
+        start = time.perf_counter()
+        for _ in range(requests):
+            client.post("/exercises/", json={"description": "x" * 500})
+        return requests / (time.perf_counter() - start)
+
+
+def run(mode: str, records: int, requests: int, stream) -> tuple[float, float]:
+    def install() -> None:
+        (install_legacy if mode == "inline" else install_queue)(stream)
+
+    reset()
+    install()
+    cost = caller_cost(records)
+    rps = request_throughput(requests, install)
+    reset()
+    return cost, rps
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=800)
+    parser.add_argument("--records", type=int, default=50_000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        os.environ["DATABASE_URL"] = f"sqlite:///{tmp}/bench.db"
+        os.environ["LOG_QUEUE_SIZE"] = str(args.records + 10 * args.requests)
+        with open(Path(tmp) / "app.log", "w") as stream:
+            results = {
+                mode: run(mode, args.records, args.requests, stream) for mode in ("inline", "queue")
+            }
+
+    (old_cost, old_rps), (new_cost, new_rps) = results["inline"], results["queue"]
+    print(f"log call on the request path, {args.records:,} records:")
+    print(f"  inline StreamHandler  {old_cost * 1e6:7.1f} us")
+    print(f"  QueueHandler          {new_cost * 1e6:7.1f} us   x{old_cost / new_cost:.1f}")
+    print(f"POST /exercises/ -> 422, {args.requests} requests:")
+    print(f"  inline StreamHandler  {old_rps:7.0f} req/s")
+    print(f"  QueueHandler          {new_rps:7.0f} req/s   x{new_rps / old_rps:.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,183 @@
+"""
+Query plans and timings of the hot lookups before and after the schema migrations.
+
+    python bench/bench_query_plans.py
+
+A database with the pre-versioning schema (no secondary indexes) is filled with
+synthetic data, the queries are run, then `migrations.migrate` upgrades it and
+the same lookups are run again: SCAN turns into SEARCH ... USING INDEX.
+Migrations 2-3 replace text keys with integer ones, so the lookups change their
+SQL, and the on-disk size of every table and index is printed as well. The page
+of workouts is the statement WorkoutRepository.page_query builds for the API,
+with the cursor half-way down the list.
+"""
+
+import random
+import sys
+import tempfile
+import time
+import uuid
+from datetime import date
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from app import migrations  # noqa: E402
+from app.repositories import WorkoutRepository  # noqa: E402
+
+WORKOUTS = 20_000
+SETS_PER_WORKOUT = 10
+EXERCISES = [f"Exercise {i}" for i in range(50)]
+REPEAT = 200
+
+
+def legacy_id(kind: str, n: int) -> str:
+    """Deterministic stand-in for the text uuid4 keys of the legacy schema"""
+    return str(uuid.uuid5(uuid.NAMESPACE_OID, f"{kind}-{n}"))
+
+
+PAGE_SIZE = 50
+
+
+def legacy_workouts_page(conn) -> str:
+    """Keyset page over the text keys of the legacy schema, cursor half-way down"""
+    cursor_date, cursor_id = conn.exec_driver_sql(
+        "SELECT workout_date, id FROM workouts ORDER BY workout_date DESC, id DESC "
+        "LIMIT 1 OFFSET ?",
+        (WORKOUTS // 2,),
+    ).one()
+    return (
+        f"SELECT * FROM workouts WHERE (workout_date, id) < ('{cursor_date}', '{cursor_id}') "  # noqa: S608
+        f"ORDER BY workout_date DESC, id DESC LIMIT {PAGE_SIZE}"
+    )
+
+
+def workouts_page(conn):
+    """The API's own page query (WorkoutRepository.page_query), cursor half-way down"""
+    cursor_date, cursor_public_id = conn.exec_driver_sql(
+        "SELECT workout_date, public_id FROM workouts ORDER BY workout_date DESC, id DESC "
+        "LIMIT 1 OFFSET ?",
+        (WORKOUTS // 2,),
+    ).one()
+    after = (date.fromisoformat(cursor_date), uuid.UUID(bytes=cursor_public_id))
+    return WorkoutRepository.page_query(PAGE_SIZE, after=after)
+
+
+# lookup -> (SQL for the legacy schema, SQL for the migrated schema); a callable builds
+# the statement from the seeded data
+QUERIES = {
+    "sets of a workout": (
+        f"SELECT * FROM sets WHERE workout_id = '{legacy_id('w', 123)}'",  # noqa: S608
+        "SELECT * FROM sets WHERE workout_id = 124",
+    ),
+    "sets of an exercise": (
+        "SELECT count(*) FROM sets WHERE exercise_name = 'Exercise 7'",
+        "SELECT count(*) FROM sets WHERE exercise_id = 8",
+    ),
+    "page of workouts": (legacy_workouts_page, workouts_page),
+    "exercise by name": ("SELECT id FROM exercises WHERE name = 'Exercise 7'",) * 2,
+}
+
+LEGACY_SCHEMA = (
+    "CREATE TABLE exercises (id VARCHAR PRIMARY KEY, name VARCHAR(100) NOT NULL, "
+    "description VARCHAR(500))",
+    "CREATE TABLE workouts (id VARCHAR PRIMARY KEY, workout_date DATE NOT NULL, note VARCHAR)",
+    "CREATE TABLE sets (id VARCHAR PRIMARY KEY, reps INTEGER NOT NULL, "
+    "weight NUMERIC(6, 2) NOT NULL, exercise_name VARCHAR NOT NULL, "
+    "workout_id VARCHAR NOT NULL REFERENCES workouts (id))",
+)
+
+
+def seed(conn) -> None:
+    rnd = random.Random(42)  # noqa: S311 - синтетические данные
+    for statement in LEGACY_SCHEMA:
+        conn.exec_driver_sql(statement)
+    conn.exec_driver_sql(
+        "INSERT INTO exercises (id, name) VALUES (?, ?)",
+        [(legacy_id("e", i), name) for i, name in enumerate(EXERCISES)],
+    )
+    conn.exec_driver_sql(
+        "INSERT INTO workouts (id, workout_date) VALUES (?, ?)",
+        [
+            (legacy_id("w", i), f"20{20 + i % 6}-{1 + i % 12:02d}-{1 + i % 28:02d}")
+            for i in range(WORKOUTS)
+        ],
+    )
+    conn.exec_driver_sql(
+        "INSERT INTO sets (id, reps, weight, exercise_name, workout_id) VALUES (?, ?, ?, ?, ?)",
+        [
+            (
+                legacy_id("s", w * SETS_PER_WORKOUT + j),
+                rnd.randint(1, 12),
+                rnd.randint(20, 200),
+                rnd.choice(EXERCISES),
+                legacy_id("w", w),
+            )
+            for w in range(WORKOUTS)
+            for j in range(SETS_PER_WORKOUT)
+        ],
+    )
+
+
+def explain(conn, stmt) -> list[str]:
+    """EXPLAIN QUERY PLAN of SQL text or of a Core statement with its parameters bound"""
+    if isinstance(stmt, str):
+        return [row[-1] for row in conn.exec_driver_sql(f"EXPLAIN QUERY PLAN {stmt}")]
+    compiled = stmt.compile(dialect=conn.dialect)
+    values = compiled.construct_params()
+    params = []
+    for name in compiled.positiontup:
+        process = compiled.binds[name].type.dialect_impl(conn.dialect).bind_processor(conn.dialect)
+        params.append(process(values[name]) if process else values[name])
+    rows = conn.exec_driver_sql(f"EXPLAIN QUERY PLAN {compiled}", tuple(params))
+    return [row[-1] for row in rows]
+
+
+def measure(engine, migrated: bool) -> dict[str, tuple[str, float]]:
+    results = {}
+    with engine.connect() as conn:
+        for label, variants in QUERIES.items():
+            stmt = variants[migrated]
+            if callable(stmt):
+                stmt = stmt(conn)
+            run = conn.exec_driver_sql if isinstance(stmt, str) else conn.execute
+            plan = "; ".join(explain(conn, stmt))
+            start = time.perf_counter()
+            for _ in range(REPEAT):
+                run(stmt).all()
+            results[label] = (plan, (time.perf_counter() - start) / REPEAT * 1e6)
+    return results
+
+
+def sizes(engine) -> dict[str, int]:
+    with engine.connect() as conn:
+        rows = conn.exec_driver_sql(
+            "SELECT name, sum(pgsize) FROM dbstat WHERE name != 'sqlite_schema' GROUP BY name"
+        )
+        return dict(rows.all())
+
+
+def main() -> None:
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = migrations.migration_engine(f"sqlite:///{tmp}/bench.db")
+        with engine.begin() as conn:
+            seed(conn)
+        before = measure(engine, migrated=False)
+        size_before = sizes(engine)
+        migrations.migrate(engine)
+        after = measure(engine, migrated=True)
+        size_after = sizes(engine)
+        engine.dispose()
+
+    for label in QUERIES:
+        print(f"{label}:")
+        print(f"  before {before[label][1]:>10.1f} us  {before[label][0]}")
+        print(f"  after  {after[label][1]:>10.1f} us  {after[label][0]}")
+    print("size, KiB:")
+    for name in sorted(size_before.keys() | size_after.keys()):
+        before_kib, after_kib = size_before.get(name, 0) // 1024, size_after.get(name, 0) // 1024
+        print(f"  {name:<28} {before_kib:>8} {after_kib:>8}")
+
+
+if __name__ == "__main__":
+    main()
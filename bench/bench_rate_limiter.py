@@ -0,0 +1,73 @@
+"""
+Microbenchmark: per-request cost of the rate limiter vs number of distinct clients.
+
+    python bench/bench_rate_limiter.py
+
+The legacy implementation (list of timestamps per IP, rebuilt on every hit)
+is reproduced here as the baseline.
+"""
+
+import sys
+import tempfile
+import threading
+import time
+from collections import defaultdict
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from app.ratelimit import SharedMemoryCounter, SlidingWindowCounter  # noqa: E402
+
+LIMIT = 1000
+HITS = 200_000
+
+
+class LegacyTimestampList:
+    def __init__(self, limit: int):
+        self.limit = limit
+        self.requests = defaultdict(list)
+        self.lock = threading.Lock()
+
+    def hit(self, key: str, now: float) -> bool:
+        with self.lock:
+            self.requests[key] = [t for t in self.requests[key] if now - t < 60]
+            if len(self.requests[key]) >= self.limit:
+                return False
+            self.requests[key].append(now)
+            return True
+
+
+def bench(limiter, clients: int) -> float:
+    keys = [f"10.{i >> 16 & 255}.{i >> 8 & 255}.{i & 255}" for i in range(clients)]
+    now = time.time()
+    start = time.perf_counter()
+    for i in range(HITS):
+        limiter.hit(keys[i % clients], now + i * 1e-6)
+    return (time.perf_counter() - start) / HITS * 1e9
+
+
+def main() -> None:
+    print(
+        f"{'clients':>8} {'legacy ns/hit':>14} {'sliding ns/hit':>15} "
+        f"{'shm ns/hit':>11} {'tracked':>8}"
+    )
+    with tempfile.TemporaryDirectory() as tmp:
+        for clients in (1, 10, 100, 1_000, 10_000):
+            legacy = bench(LegacyTimestampList(LIMIT), clients)
+            sliding_limiter = SlidingWindowCounter(LIMIT, max_clients=100_000)
+            sliding = bench(sliding_limiter, clients)
+            shm_limiter = SharedMemoryCounter(LIMIT, path=f"{tmp}/rl-{clients}")
+            shm = bench(shm_limiter, clients)
+            shm_limiter.close()
+            print(
+                f"{clients:>8} {legacy:>14.0f} {sliding:>15.0f} "
+                f"{shm:>11.0f} {len(sliding_limiter):>8}"
+            )
+
+    capped = SlidingWindowCounter(LIMIT, max_clients=10_000)
+    bench(capped, 200_000)
+    print(f"200k distinct clients with max_clients=10000 -> tracked {len(capped)}")
+
+
+if __name__ == "__main__":
+    main()
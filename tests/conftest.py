@@ -1,7 +1,44 @@
 # tests/conftest.py
+import os
+import shutil
 import sys
+import tempfile
+from importlib import import_module
 from pathlib import Path
 
+import pytest
+from fastapi.testclient import TestClient
+
 ROOT = Path(__file__).resolve().parents[1]  # корень репозитория
 if str(ROOT) not in sys.path:
     sys.path.insert(0, str(ROOT))
+
+# app.db привязывает engine к DATABASE_URL один раз, при первом импорте (в т.ч. при сборе
+# тестов): задаем временную базу до любого импорта app, иначе тесты пишут в ./wagonee.db
+TEST_DB_DIR = tempfile.mkdtemp(prefix="wagonee-tests-")
+os.environ["DATABASE_URL"] = f"sqlite:///{Path(TEST_DB_DIR, 'test_wagonee.db').as_posix()}"
+
+# Без фонового потока снимка аналитики: его запросы к БД попадали бы в подсчеты
+# запросов тестов. Снимок грузится первым запросом дашборда или refresh()
+os.environ.setdefault("ANALYTICS_SNAPSHOT_TTL", "0")
+
+# Маршрут, превысивший QUERY_BUDGETS из app.main, отвечает 500: тест падает на проверке статуса
+os.environ.setdefault("QUERY_BUDGET_MODE", "raise")
+
+
+def pytest_sessionfinish(session, exitstatus):
+    shutil.rmtree(TEST_DB_DIR, ignore_errors=True)
+
+
+@pytest.fixture
+def client():
+    """TestClient over a freshly imported app.main: own rate limiter, env read anew.
+
+    Переменные окружения для app.main задавайте до этой фикстуры (autouse-фикстурой модуля).
+    База одна на сессию тестов (см. DATABASE_URL выше).
+    """
+    sys.modules.pop("app.main", None)
+    app = import_module("app.main").app
+    with TestClient(app) as c:
+        yield c
+    sys.modules.pop("app.main", None)
@@ -0,0 +1,228 @@
+"""
+Weekly per-exercise rollups (math, incremental updates, rebuild) and the columnar
+NumPy aggregates behind the dashboard routes.
+"""
+
+import json
+import logging
+import threading
+from datetime import date
+from decimal import Decimal
+from http import HTTPStatus
+from uuid import uuid4
+
+import numpy as np
+import pytest
+
+from app import rollups
+
+
+def test_week_start_and_epley():
+    assert rollups.week_start(date(2025, 10, 12)) == date(2025, 10, 6)  # воскресенье
+    assert rollups.week_start(date(2025, 10, 13)) == date(2025, 10, 13)
+    assert rollups.epley_e1rm(Decimal("100"), 1) == Decimal("100.00")
+    assert rollups.epley_e1rm(Decimal("100"), 5) == Decimal("116.67")
+
+
+def test_aggregate_keeps_heaviest_set_and_best_e1rm():
+    weeks = rollups.aggregate(
+        [
+            (1, date(2025, 10, 6), 10, Decimal("80")),
+            (1, date(2025, 10, 8), 3, Decimal("100")),
+            (1, date(2025, 10, 9), 5, Decimal("100")),
+            (2, date(2025, 10, 9), 1, Decimal("50")),
+        ]
+    )
+    stats = weeks[(1, date(2025, 10, 6))]
+    assert (stats.set_count, stats.total_reps, stats.total_volume) == (3, 18, Decimal("1600"))
+    assert (stats.best_weight, stats.best_reps) == (Decimal("100"), 5)
+    assert stats.best_e1rm == Decimal("116.67")
+    assert weeks[(2, date(2025, 10, 6))].best_e1rm == Decimal("50.00")
+
+
+def test_exercise_analytics_follow_every_write_path(client, capsys):
+    exercise = client.post("/exercises/", json={"name": "Rollup Bench"}).json()
+    week1 = client.post("/workouts/", json={"workout_date": "2025-09-01"}).json()["id"]
+    week2 = client.post("/workouts/", json={"workout_date": "2025-09-10"}).json()["id"]
+
+    r = client.post(
+        f"/workouts/{week1}/sets?exercise_id={exercise['id']}", json={"reps": 5, "weight": "80"}
+    )
+    assert r.status_code == HTTPStatus.OK
+    r = client.post(
+        f"/workouts/{week2}/sets:batch",
+        json=[
+            {"exercise_id": exercise["id"], "reps": 3, "weight": "90"},
+            {"exercise_id": exercise["id"], "reps": 8, "weight": "70"},
+        ],
+    )
+    assert r.status_code == HTTPStatus.OK
+    line = {
+        "workout_date": "2025-09-11",
+        "sets": [{"exercise_name": "Rollup Bench", "reps": 1, "weight": "100"}],
+    }
+    r = client.post(
+        "/workouts/import",
+        content=json.dumps(line),
+        headers={"Content-Type": "application/x-ndjson"},
+    )
+    assert r.json()["sets_imported"] == 1
+
+    analytics = client.get(f"/analytics/exercises/{exercise['id']}").json()
+
+    assert analytics["set_count"] == 4
+    assert analytics["total_reps"] == 17
+    assert analytics["total_volume"] == pytest.approx(400 + 270 + 560 + 100)
+    assert analytics["best_set"] == {"weight": 100.0, "reps": 1}
+    # По Эпли: 80x5 -> 93.33, 90x3 -> 99.0, 70x8 -> 88.67, 100x1 -> 100
+    assert analytics["estimated_1rm"] == pytest.approx(100.0)
+    assert [w["best_e1rm"] for w in analytics["weekly"]] == pytest.approx([93.33, 100.0])
+    assert [(w["week_start"], w["set_count"]) for w in analytics["weekly"]] == [
+        ("2025-09-01", 1),
+        ("2025-09-08", 3),
+    ]
+
+    # Полный пересчет из сырых подходов дает тот же результат
+    from app import cli
+
+    assert cli.main(["rebuild-rollups"]) == 0
+    capsys.readouterr()
+    assert client.get(f"/analytics/exercises/{exercise['id']}").json() == analytics
+
+
+def test_exercise_analytics_not_found(client):
+    response = client.get(f"/analytics/exercises/{uuid4()}")
+    assert response.status_code == HTTPStatus.NOT_FOUND
+
+
+def test_columnar_aggregates_match_rollups(monkeypatch):
+    from app import analytics
+
+    rng = np.random.default_rng(7)
+    n = 5000
+    cols = analytics.SetColumns(
+        exercise_id=rng.integers(1, 6, n).astype(np.int32),
+        day=rng.integers(19_000, 19_400, n).astype(np.int32),
+        reps=rng.integers(1, 13, n).astype(np.int32),
+        weight=rng.integers(0, 400, n) * 0.5,
+    )
+    expected = rollups.aggregate(
+        (ex, date.fromordinal(date(1970, 1, 1).toordinal() + day), reps, Decimal(str(weight)))
+        for ex, day, reps, weight in zip(
+            cols.exercise_id.tolist(),
+            cols.day.tolist(),
+            cols.reps.tolist(),
+            cols.weight.tolist(),
+            strict=True,
+        )
+    )
+
+    ex_ids, weeks, counts, volumes = analytics.weekly_volume(cols)
+    keys = list(zip(ex_ids.tolist(), analytics.to_date(weeks), strict=True))
+    assert dict(zip(keys, counts.tolist(), strict=True)) == {
+        key: stats.set_count for key, stats in expected.items()
+    }
+    for key, volume in zip(keys, volumes, strict=True):
+        assert volume == pytest.approx(float(expected[key].total_volume))
+
+    # Разреженная таблица (упражнение, неделя) идет через np.unique - тот же результат
+    dense = analytics.weekly_volume(cols)
+    monkeypatch.setattr(analytics, "DENSE_GROUPS_LIMIT", 0)
+    for got, want in zip(analytics.weekly_volume(cols), dense, strict=True):
+        assert got.tolist() == want.tolist()
+    monkeypatch.undo()
+
+    agg = analytics.by_exercise(cols)
+    for i, ex in enumerate(agg.exercise_id.tolist()):
+        weights = cols.weight[cols.exercise_id == ex]
+        assert agg.set_count[i] == len(weights)
+        assert agg.max_weight[i] == weights.max()
+        assert agg.weight_percentiles[90][i] == pytest.approx(np.percentile(weights, 90))
+        best = max(s.best_e1rm for (e, _), s in expected.items() if e == ex)
+        assert agg.best_e1rm[i] == pytest.approx(float(best), abs=0.01)
+
+    weeks, best, rolling = analytics.progression(cols.only(1), window_weeks=3)
+    assert np.all(rolling >= best)
+    for i in range(len(weeks)):
+        in_window = (weeks > weeks[i] - 21) & (weeks <= weeks[i])
+        assert rolling[i] == best[in_window].max()
+
+
+def test_dashboard_routes(client):
+    from app import services
+
+    exercise = client.post("/exercises/", json={"name": "Dashboard Press"}).json()
+    for day, weight in (("2025-03-03", "50"), ("2025-03-05", "60"), ("2025-03-17", "55")):
+        workout_id = client.post("/workouts/", json={"workout_date": day}).json()["id"]
+        client.post(
+            f"/workouts/{workout_id}/sets?exercise_id={exercise['id']}",
+            json={"reps": 1, "weight": weight},
+        )
+    services.columns_snapshot.refresh()
+
+    summaries = client.get("/analytics/exercises").json()
+    summary = next(s for s in summaries if s["exercise_id"] == exercise["id"])
+    assert summary["set_count"] == 3
+    assert summary["total_volume"] == pytest.approx(165.0)
+    assert summary["max_weight"] == 60.0
+    assert summary["weight_p50"] == 55.0
+
+    weekly = client.get("/analytics/weekly", params={"exercise_id": exercise["id"]}).json()
+    assert [(w["week_start"], w["set_count"]) for w in weekly] == [
+        ("2025-03-03", 2),
+        ("2025-03-17", 1),
+    ]
+
+    progression = client.get(
+        f"/analytics/exercises/{exercise['id']}/progression", params={"window_weeks": 2}
+    ).json()
+    assert [(p["best_e1rm"], p["rolling_best_e1rm"]) for p in progression] == [
+        (60.0, 60.0),
+        (55.0, 55.0),  # 03.03 уже вне окна двух недель
+    ]
+
+    missing = client.get(f"/analytics/exercises/{uuid4()}/progression")
+    assert missing.status_code == HTTPStatus.NOT_FOUND
+
+
+def test_columns_snapshot_is_reloaded_by_a_background_thread():
+    from app import analytics
+
+    loads: list[object] = []
+    reloaded = threading.Event()
+
+    def load():
+        loads.append(object())
+        if len(loads) >= 2:
+            reloaded.set()
+        return loads[-1]
+
+    snapshot = analytics.ColumnsSnapshot(load, interval=0.01)
+    snapshot.start()
+    try:
+        assert reloaded.wait(5)
+    finally:
+        snapshot.stop()
+    assert snapshot.get() is loads[-1]
+
+    # interval=0: без потока, снимок грузится один раз первым обращением
+    lazy = analytics.ColumnsSnapshot(load, interval=0)
+    lazy.start()
+    count = len(loads)
+    assert lazy.get() is lazy.get() is loads[-1]
+    assert len(loads) == count + 1
+
+
+def test_load_columns_keeps_the_newest_sets_up_to_the_cap(client, caplog):
+    from app import analytics, db
+
+    exercise_id = client.post("/exercises/", json={"name": "Capped Row"}).json()["id"]
+    workout_id = client.post("/workouts/", json={"workout_date": "2025-04-07"}).json()["id"]
+    client.post(
+        f"/workouts/{workout_id}/sets:batch",
+        json=[{"exercise_id": exercise_id, "reps": reps, "weight": "10"} for reps in (1, 2, 3)],
+    )
+    with db.ReadSessionLocal() as session, caplog.at_level(logging.WARNING):
+        cols = analytics.load_columns(session, max_rows=2)
+    assert cols.reps.tolist() == [3, 2]
+    assert "capped at the newest 2 sets" in caplog.text
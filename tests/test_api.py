@@ -1,25 +1,7 @@
-import os
+import base64
+import json
+import time
 from http import HTTPStatus
-from importlib import import_module
-from pathlib import Path
-
-import pytest
-from fastapi.testclient import TestClient
-
-
-@pytest.fixture
-def client(tmp_path: Path):
-    test_db = tmp_path / "test_wagonee.db"
-    if test_db.exists():
-        try:
-            test_db.unlink()
-        except OSError:
-            pass  # noqa: S110 - Expected in test cleanup
-
-    os.environ["DATABASE_URL"] = f"sqlite:///{test_db.as_posix()}"
-    app = import_module("app.main").app
-    with TestClient(app) as c:
-        yield c
 
 
 def test_read_health(client):
@@ -103,16 +85,220 @@ def test_add_set_to_workout(client):
     assert len(data["sets"]) == 1
     added_set = data["sets"][0]
     assert added_set["exercise_name"] == "Подтягивания"
+    assert added_set["exercise_id"] == exercise_id
     assert added_set["reps"] == 10
     assert added_set["weight"] == 80.0
     assert "id" in added_set
 
 
-def test_rate_limiting(client):
+def test_list_workouts_keyset_pagination(client):
+    created = {
+        client.post("/workouts/", json={"workout_date": f"2025-10-0{d}"}).json()["id"]
+        for d in range(1, 6)
+    }
+
+    seen = []
+    cursor = None
+    while True:
+        params = {"limit": 2}
+        if cursor:
+            params["cursor"] = cursor
+        response = client.get("/workouts/", params=params)
+        assert response.status_code == HTTPStatus.OK
+        page = response.json()
+        assert len(page["items"]) <= 2
+        seen.extend(item["id"] for item in page["items"])
+        cursor = page["next_cursor"]
+        if cursor is None:
+            break
+
+    assert len(seen) == len(set(seen))
+    assert created <= set(seen)
+
+
+def test_list_endpoints_body_and_openapi_match_response_models(client):
+    from app import schemas
+
+    exercise_id = client.post("/exercises/", json={"name": "Schema Dip"}).json()["id"]
+    workout_id = client.post("/workouts/", json={"workout_date": "2025-10-09"}).json()["id"]
+    client.post(
+        f"/workouts/{workout_id}/sets?exercise_id={exercise_id}",
+        json={"reps": 6, "weight": "12.5"},
+    )
+
+    # Тело из быстрого пути проходит строгую валидацию тех же моделей
+    body = client.get("/workouts/").content
+    page = schemas.WorkoutPage.model_validate_json(body)
+    item = next(w for w in page.items if w.id == workout_id)
+    assert [(s.reps, s.weight, s.exercise_id) for s in item.sets] == [(6, 12.5, exercise_id)]
+    # Список строится из строк БД, одна тренировка - из моделей: ответ тот же
+    assert item.model_dump(mode="json") == client.get(f"/workouts/{workout_id}").json()
+    response = client.get("/exercises/")
+    assert response.headers["content-type"] == "application/json"
+    for exercise in response.json():
+        schemas.ExerciseRead.model_validate(exercise)
+
+    paths = client.get("/openapi.json").json()["paths"]
+
+    def ok_schema(path: str) -> dict:
+        return paths[path]["get"]["responses"]["200"]["content"]["application/json"]["schema"]
+
+    assert ok_schema("/workouts/") == {"$ref": "#/components/schemas/WorkoutPage"}
+    assert ok_schema("/exercises/")["items"] == {"$ref": "#/components/schemas/ExerciseRead"}
+
+
+def test_list_workouts_summary_view_and_fields(client):
+    exercise_id = client.post("/exercises/", json={"name": "Calendar Lunge"}).json()["id"]
+    workout_id = client.post(
+        "/workouts/", json={"workout_date": "2031-01-01", "note": "newest"}
+    ).json()["id"]
+    client.post(
+        f"/workouts/{workout_id}/sets?exercise_id={exercise_id}",
+        json={"reps": 10, "weight": "20"},
+    )
+    client.post(
+        f"/workouts/{workout_id}/sets:batch",
+        json=[{"exercise_id": exercise_id, "reps": 5, "weight": "30.5"}] * 2,
+    )
+
+    summary = client.get("/workouts/", params={"view": "summary", "limit": 1}).json()
+    assert summary["items"] == [
+        {"workout_date": "2031-01-01", "id": workout_id, "set_count": 3, "total_volume": 505.0}
+    ]
+    assert summary["next_cursor"] is not None
+
+    full = client.get(f"/workouts/{workout_id}").json()
+    assert (full["set_count"], full["total_volume"]) == (3, 505.0)
+
+    projected = client.get("/workouts/", params={"fields": "note, total_volume", "limit": 1})
+    assert projected.json()["items"] == [
+        {"note": "newest", "id": workout_id, "total_volume": 505.0}
+    ]
+
+    response = client.get("/workouts/", params={"fields": "id,password"})
+    assert response.status_code == HTTPStatus.BAD_REQUEST
+    response = client.get("/workouts/", params={"view": "compact"})
+    assert response.status_code == HTTPStatus.UNPROCESSABLE_ENTITY
+
+
+def test_list_workouts_invalid_cursor(client):
+    response = client.get("/workouts/", params={"cursor": "not-a-cursor"})
+    assert response.status_code == HTTPStatus.BAD_REQUEST
+    assert "correlation_id" in response.json()
+
+    # Подделанные курсоры: не 500 из драйвера БД, а 400
+    for raw in (
+        b'["2025-01-01", 99999999999999999999999]',
+        b'["2025-01-01", 1e400]',
+        b'["2025-01-01", true]',
+        b'["2025-01-01", "not-a-uuid"]',
+        b'{"a": 1, "b": 2}',
+        b"\xff\xfe",
+    ):
+        crafted = base64.urlsafe_b64encode(raw).decode()
+        response = client.get("/workouts/", params={"cursor": crafted})
+        assert response.status_code == HTTPStatus.BAD_REQUEST, raw
+
+
+def test_cursor_carries_public_id_only(client):
+    for day in range(1, 4):
+        client.post("/workouts/", json={"workout_date": f"2025-12-0{day}"})
+    page = client.get("/workouts/", params={"limit": 1}).json()
+    padded = page["next_cursor"] + "=" * (-len(page["next_cursor"]) % 4)
+    day, public_id = json.loads(base64.urlsafe_b64decode(padded))
+    assert public_id == page["items"][0]["id"]
+
+
+def test_export_workouts_ndjson(client):
+    exercise_id = client.post("/exercises/", json={"name": "Жим стоя"}).json()["id"]
+    workout_id = client.post("/workouts/", json={"workout_date": "2025-10-11"}).json()["id"]
+    client.post(
+        f"/workouts/{workout_id}/sets?exercise_id={exercise_id}",
+        json={"reps": 8, "weight": 40.0},
+    )
+
+    response = client.get("/workouts/export")
+    assert response.status_code == HTTPStatus.OK
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+
+    rows = [json.loads(line) for line in response.text.splitlines()]
+    exported = next(r for r in rows if r["id"] == workout_id)
+    assert exported["sets"][0]["exercise_name"] == "Жим стоя"
+    assert exported["sets"][0]["reps"] == 8
+
+
+def test_export_releases_the_connection_between_chunks(client):
+    from app import db, services
+
+    ids = [
+        client.post("/workouts/", json={"workout_date": "2025-10-01"}).json()["id"]
+        for _ in range(5)
+    ]
+    stream = services.export_workouts(chunk_size=2)
+
+    first = next(stream)
+    # Пока клиент читает чанк, соединение чтения уже в пуле
+    assert db.read_engine.pool.checkedout() == 0
+    rows = [json.loads(line) for chunk in (first, *stream) for line in chunk.splitlines()]
+    exported = [r["id"] for r in rows]
+    assert len(exported) == len(set(exported))
+    assert set(ids) <= set(exported)
+    assert len(first.splitlines()) == 2
+
+
+def test_add_sets_batch(client):
+    squat_id = client.post("/exercises/", json={"name": "Присед"}).json()["id"]
+    press_id = client.post("/exercises/", json={"name": "Жим"}).json()["id"]
+    workout_id = client.post("/workouts/", json={"workout_date": "2025-10-12"}).json()["id"]
+
+    response = client.post(
+        f"/workouts/{workout_id}/sets:batch",
+        json=[
+            {"exercise_id": squat_id, "reps": 5, "weight": 100},
+            {"exercise_id": squat_id, "reps": 5, "weight": 105},
+            {"exercise_id": press_id, "reps": 8, "weight": "60.50"},
+        ],
+    )
+    assert response.status_code == HTTPStatus.OK
+    sets = response.json()["sets"]
+    assert len(sets) == 3
+    assert sorted(s["exercise_name"] for s in sets) == ["Жим", "Присед", "Присед"]
+    assert 60.5 in {s["weight"] for s in sets}
+
+
+def test_add_sets_batch_unknown_exercise_inserts_nothing(client):
+    exercise_id = client.post("/exercises/", json={"name": "Тяга"}).json()["id"]
+    workout_id = client.post("/workouts/", json={"workout_date": "2025-10-13"}).json()["id"]
+
+    response = client.post(
+        f"/workouts/{workout_id}/sets:batch",
+        json=[
+            {"exercise_id": exercise_id, "reps": 5, "weight": 100},
+            {"exercise_id": "00000000-0000-0000-0000-000000000000", "reps": 5, "weight": 100},
+        ],
+    )
+    assert response.status_code == HTTPStatus.NOT_FOUND
+    assert client.get(f"/workouts/{workout_id}").json()["sets"] == []
+
+
+def test_add_sets_batch_rejects_empty_list(client):
+    workout_id = client.post("/workouts/", json={"workout_date": "2025-10-14"}).json()["id"]
+    response = client.post(f"/workouts/{workout_id}/sets:batch", json=[])
+    assert response.status_code == HTTPStatus.UNPROCESSABLE_ENTITY
+
+
+def test_rate_limiting(client, monkeypatch):
     # Лимит увеличен до 1000 запросов в минуту для поддержки тестов
     # Проверяем, что limit работает при превышении
+    # Часы стоят в начале минутного окна: на стыке окон скользящая оценка учла бы
+    # только часть запросов из предыдущего окна, и 1005 запросов не хватило бы
+    monkeypatch.setattr(time, "time", lambda: 60.0 * 29_000_000)
     responses = []
     for _ in range(1005):
         response = client.post("/workouts/", json={"workout_date": "2025-09-25"})
         responses.append(response.status_code)
     assert 429 in responses
+
+    from app import metrics
+
+    assert metrics.HTTP_RATE_LIMITED.collect().samples[()] >= responses.count(429)
@@ -0,0 +1,56 @@
+"""
+The same API flows with DB_MODE=async (AsyncEngine + aiosqlite).
+"""
+
+import json
+import sys
+from http import HTTPStatus
+
+import pytest
+
+
+@pytest.fixture(autouse=True)
+def async_mode(monkeypatch):
+    # client из conftest импортирует app.main заново: уже в режиме async
+    monkeypatch.setenv("DB_MODE", "async")
+
+
+def test_async_mode_workout_flow(client):
+    assert sys.modules["app.main"].DB_MODE == "async"
+    exercise_id = client.post("/exercises/", json={"name": "Async Squat"}).json()["id"]
+    workout = client.post("/workouts/", json={"workout_date": "2025-11-01", "note": "async"})
+    assert workout.status_code == HTTPStatus.CREATED
+    workout_id = workout.json()["id"]
+
+    r = client.post(
+        f"/workouts/{workout_id}/sets?exercise_id={exercise_id}",
+        json={"reps": 5, "weight": "100"},
+    )
+    assert r.status_code == HTTPStatus.OK
+    r = client.post(
+        f"/workouts/{workout_id}/sets:batch",
+        json=[{"exercise_id": exercise_id, "reps": 3, "weight": "110"}] * 2,
+    )
+    assert r.status_code == HTTPStatus.OK
+    assert len(r.json()["sets"]) == 3
+
+    fetched = client.get(f"/workouts/{workout_id}").json()
+    assert {s["exercise_name"] for s in fetched["sets"]} == {"Async Squat"}
+
+    page = client.get("/workouts/", params={"limit": 1}).json()
+    assert len(page["items"]) == 1
+
+    exported = [json.loads(line) for line in client.get("/workouts/export").text.splitlines()]
+    assert any(w["id"] == workout_id and len(w["sets"]) == 3 for w in exported)
+
+
+def test_async_mode_errors_roll_back(client):
+    workout_id = client.post("/workouts/", json={"workout_date": "2025-11-02"}).json()["id"]
+    r = client.post(
+        f"/workouts/{workout_id}/sets:batch",
+        json=[{"exercise_id": "00000000-0000-0000-0000-000000000000", "reps": 1, "weight": 1}],
+    )
+    assert r.status_code == HTTPStatus.NOT_FOUND
+    assert "correlation_id" in r.json()
+    assert client.get(f"/workouts/{workout_id}").json()["sets"] == []
+    assert client.get("/workouts/a1b2c3d4-e5f6-7890-1234-567890abcdef").status_code == 404
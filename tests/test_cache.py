@@ -0,0 +1,76 @@
+from app.cache import LRUCache
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def test_lru_evicts_least_recently_used():
+    cache = LRUCache(max_entries=2)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    assert cache.get("a") == 1  # "a" становится самым свежим
+    cache.set("c", 3)
+    assert cache.get("b") is None
+    assert cache.get("a") == 1 and cache.get("c") == 3
+    assert cache.evictions == 1
+
+
+def test_entries_expire_after_ttl():
+    clock = FakeClock()
+    cache = LRUCache(ttl_seconds=10, clock=clock)
+    cache.set("a", 1)
+    clock.now = 9.9
+    assert cache.get("a") == 1
+    clock.now = 10.1
+    assert cache.get("a") is None
+    assert len(cache) == 0
+
+
+def test_zero_ttl_stores_nothing():
+    cache = LRUCache(ttl_seconds=0, clock=FakeClock())
+    cache.set("a", 1)
+    assert cache.get("a") is None
+    assert len(cache) == 0
+
+
+def test_stats_count_hits_and_misses():
+    cache = LRUCache()
+    cache.set("a", 1)
+    cache.get("a")
+    cache.get("a")
+    cache.get("missing")
+    stats = cache.stats()
+    assert stats["hits"] == 2 and stats["misses"] == 1
+    assert round(stats["hit_ratio"], 2) == 0.67
+    cache.invalidate("a")
+    assert cache.get("a") is None
+
+
+def test_byte_budget_evicts_until_it_fits():
+    cache = LRUCache(max_entries=100, max_bytes=10)
+    cache.set("a", b"xxxx")
+    cache.set("b", b"yyyy")
+    cache.set("c", b"zzzz")  # 12 байт > 10: уходит самый старый
+    assert cache.get("a") is None
+    assert cache.size_bytes == 8 and cache.evictions == 1
+    cache.set("b", b"y")
+    assert cache.size_bytes == 5
+    cache.set("huge", b"h" * 11)  # больше всего бюджета - не кэшируется
+    assert cache.get("huge") is None and cache.size_bytes == 5
+    cache.invalidate("c")
+    assert cache.stats()["size_bytes"] == 1
+
+
+def test_set_is_skipped_if_invalidated_while_loading():
+    cache = LRUCache()
+    generation = cache.generation
+    cache.invalidate("w1")  # запись закоммичена, пока читатель ходил в БД
+    cache.set("w1", "stale", generation=generation)
+    assert cache.get("w1") is None
+    cache.set("w1", "fresh", generation=cache.generation)
+    assert cache.get("w1") == "fresh"
@@ -0,0 +1,86 @@
+"""
+Production SQLite engine profile: PRAGMAs on connect and the read/write split.
+"""
+
+import threading
+from datetime import date
+from pathlib import Path
+
+import pytest
+from sqlalchemy import func, select, text
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import sessionmaker
+
+from app import db_models
+from app.db import Base, make_engine, splits_reads
+
+
+@pytest.fixture
+def engines(tmp_path: Path):
+    url = f"sqlite:///{(tmp_path / 'profile.db').as_posix()}"
+    writer = make_engine(url, profile="production")
+    reader = make_engine(url, profile="production", readonly=True)
+    Base.metadata.create_all(writer)
+    yield writer, reader
+    writer.dispose()
+    reader.dispose()
+
+
+def test_split_only_for_file_sqlite_in_production():
+    assert splits_reads("sqlite:///./x.db", "production")
+    assert not splits_reads("sqlite:///./x.db", "default")
+    assert not splits_reads("sqlite:///:memory:", "production")
+    assert not splits_reads("postgresql://u@h/db", "production")
+
+
+def test_pragmas_applied_on_connect(engines):
+    writer, reader = engines
+    with writer.connect() as conn:
+        assert conn.exec_driver_sql("PRAGMA journal_mode").scalar() == "wal"
+        assert conn.exec_driver_sql("PRAGMA synchronous").scalar() == 1  # NORMAL
+        assert conn.exec_driver_sql("PRAGMA busy_timeout").scalar() == 5000
+        assert conn.exec_driver_sql("PRAGMA cache_size").scalar() == -65536
+        assert conn.exec_driver_sql("PRAGMA query_only").scalar() == 0
+    with reader.connect() as conn:
+        assert conn.exec_driver_sql("PRAGMA query_only").scalar() == 1
+
+
+def test_reader_cannot_write(engines):
+    _, reader = engines
+    with reader.connect() as conn, pytest.raises(OperationalError):
+        conn.execute(text("INSERT INTO workouts (id, workout_date) VALUES ('x', '2025-01-01')"))
+
+
+def test_concurrent_writers_do_not_fail_with_database_locked(engines):
+    writer, reader = engines
+    write_session = sessionmaker(bind=writer)
+    read_session = sessionmaker(bind=reader)
+    errors: list[Exception] = []
+
+    def write(n: int) -> None:
+        try:
+            for _ in range(n):
+                with write_session() as s:
+                    s.add(db_models.Workout(workout_date=date(2025, 1, 1)))
+                    s.commit()
+        except Exception as e:  # собираем для assert
+            errors.append(e)
+
+    def read(n: int) -> None:
+        try:
+            for _ in range(n):
+                with read_session() as s:
+                    s.scalar(select(func.count()).select_from(db_models.Workout))
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=write, args=(25,)) for _ in range(8)]
+    threads += [threading.Thread(target=read, args=(50,)) for _ in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert errors == []
+    with read_session() as s:
+        assert s.scalar(select(func.count()).select_from(db_models.Workout)) == 200
@@ -1,26 +1,3 @@
-import os
-from importlib import import_module
-from pathlib import Path
-
-import pytest
-from fastapi.testclient import TestClient
-
-
-@pytest.fixture
-def client(tmp_path: Path):
-    test_db = tmp_path / "test_wagonee.db"
-    if test_db.exists():
-        try:
-            test_db.unlink()
-        except OSError:
-            pass  # noqa: S110 - Expected in test cleanup
-
-    os.environ["DATABASE_URL"] = f"sqlite:///{test_db.as_posix()}"
-    app = import_module("app.main").app
-    with TestClient(app) as c:
-        yield c
-
-
 def test_rfc7807_on_not_found(client):
     r = client.get(
         "/workouts/a1b2c3d4-e5f6-7890-1234-567890abcdef",
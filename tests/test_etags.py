@@ -0,0 +1,78 @@
+"""
+Conditional GET: ETag from version counters, If-None-Match -> 304.
+"""
+
+import json
+from http import HTTPStatus
+from uuid import uuid4
+
+
+def revalidate(client, url: str, tag: str):
+    return client.get(url, headers={"If-None-Match": tag})
+
+
+def test_workout_etag_changes_when_sets_are_added(client):
+    exercise_id = client.post("/exercises/", json={"name": "ETag Row"}).json()["id"]
+    workout_id = client.post("/workouts/", json={"workout_date": "2025-05-05"}).json()["id"]
+    url = f"/workouts/{workout_id}"
+
+    first = client.get(url)
+    tag = first.headers["ETag"]
+    cached = revalidate(client, url, tag)
+    assert cached.status_code == HTTPStatus.NOT_MODIFIED
+    assert cached.headers["ETag"] == tag
+    assert cached.content == b""
+    assert revalidate(client, url, f'W/{tag}, "other"').status_code == HTTPStatus.NOT_MODIFIED
+
+    client.post(f"{url}/sets?exercise_id={exercise_id}", json={"reps": 5, "weight": "60"})
+    changed = revalidate(client, url, tag)
+    assert changed.status_code == HTTPStatus.OK
+    assert len(changed.json()["sets"]) == 1
+    tag2 = changed.headers["ETag"]
+    assert tag2 != tag
+
+    client.post(f"{url}/sets:batch", json=[{"exercise_id": exercise_id, "reps": 3, "weight": "70"}])
+    assert revalidate(client, url, tag2).status_code == HTTPStatus.OK
+
+
+def test_unknown_workout_is_404_even_with_if_none_match(client):
+    response = revalidate(client, f"/workouts/{uuid4()}", "*")
+    assert response.status_code == HTTPStatus.NOT_FOUND
+
+
+def test_workout_list_etag_follows_every_write(client):
+    tag = client.get("/workouts/").headers["ETag"]
+    assert revalidate(client, "/workouts/", tag).status_code == HTTPStatus.NOT_MODIFIED
+
+    workout_id = client.post("/workouts/", json={"workout_date": "2025-05-06"}).json()["id"]
+    response = revalidate(client, "/workouts/", tag)
+    assert response.status_code == HTTPStatus.OK
+    tag = response.headers["ETag"]
+
+    exercise_id = client.post("/exercises/", json={"name": "ETag Curl"}).json()["id"]
+    client.post(
+        f"/workouts/{workout_id}/sets?exercise_id={exercise_id}", json={"reps": 8, "weight": "12"}
+    )
+    response = revalidate(client, "/workouts/", tag)
+    assert response.status_code == HTTPStatus.OK
+    tag = response.headers["ETag"]
+
+    line = {"workout_date": "2025-05-07", "sets": []}
+    client.post(
+        "/workouts/import",
+        content=json.dumps(line),
+        headers={"Content-Type": "application/x-ndjson"},
+    )
+    assert revalidate(client, "/workouts/", tag).status_code == HTTPStatus.OK
+
+
+def test_exercise_catalogue_etag(client):
+    response = client.get("/exercises/")
+    tag = response.headers["ETag"]
+    assert revalidate(client, "/exercises/", tag).status_code == HTTPStatus.NOT_MODIFIED
+
+    created = client.post("/exercises/", json={"name": "ETag Press"}).json()
+    response = revalidate(client, "/exercises/", tag)
+    assert response.status_code == HTTPStatus.OK
+    assert created["id"] in {e["id"] for e in response.json()}
+    assert response.headers["ETag"] != tag
@@ -0,0 +1,110 @@
+"""
+Bulk import: NDJSON/CSV parsing, per-row error reporting and the CLI entry point.
+"""
+
+import json
+from http import HTTPStatus
+from pathlib import Path
+
+
+def _workout(client, workout_id: str) -> dict:
+    response = client.get(f"/workouts/{workout_id}")
+    assert response.status_code == HTTPStatus.OK
+    return response.json()
+
+
+def test_import_ndjson_reports_bad_rows(client):
+    lines = [
+        {
+            "workout_date": "2024-01-02",
+            "note": "imported",
+            "sets": [
+                {"exercise_name": "Import Squat", "reps": 5, "weight": "120.5"},
+                {"exercise_name": "Import Squat", "reps": 5, "weight": "120.5"},
+            ],
+        },
+        {"workout_date": "not-a-date", "sets": []},
+        {"workout_date": "2024-01-03", "sets": [{"exercise_name": "X", "reps": 0, "weight": 1}]},
+        {"workout_date": "2024-01-04"},
+    ]
+    body = "\n".join(json.dumps(line) for line in lines) + "\n{broken json\n"
+
+    response = client.post(
+        "/workouts/import", content=body, headers={"Content-Type": "application/x-ndjson"}
+    )
+    assert response.status_code == HTTPStatus.OK
+    report = response.json()
+    assert report["workouts_imported"] == 2
+    assert report["sets_imported"] == 2
+    assert report["error_count"] == 3
+    assert [e["line"] for e in report["errors"]] == [2, 3, 5]
+
+    exercises = client.get("/exercises/").json()
+    assert sum(ex["name"] == "Import Squat" for ex in exercises) == 1
+
+
+def test_import_csv_groups_rows_into_workouts(client):
+    body = (
+        "workout_key,workout_date,note,exercise_name,reps,weight\n"
+        "a,2024-02-01,legs,CSV Squat,5,100\n"
+        "a,2024-02-01,legs,CSV Squat,5,105\n"
+        "a,2024-02-01,legs,CSV Squat,-1,105\n"
+        "b,2024-02-02,,CSV Bench,8,60\n"
+    )
+    response = client.post("/workouts/import", content=body, headers={"Content-Type": "text/csv"})
+    assert response.status_code == HTTPStatus.OK
+    report = response.json()
+    assert report["workouts_imported"] == 2
+    assert report["sets_imported"] == 3
+    assert report["errors"][0]["line"] == 4
+
+    exported = [json.loads(line) for line in client.get("/workouts/export").text.splitlines()]
+    legs = next(w for w in exported if w["note"] == "legs" and w["workout_date"] == "2024-02-01")
+    assert sorted(s["weight"] for s in _workout(client, legs["id"])["sets"]) == [100.0, 105.0]
+    assert (legs["set_count"], legs["total_volume"]) == (2, 1025.0)
+
+
+def test_import_csv_reports_invalid_utf8_rows(client):
+    body = (
+        b"workout_date,exercise_name,reps,weight\n"
+        b"2024-03-01,Strict Row,5,50\n"
+        b"2024-03-01,Strict \xff Row,5,55\n"
+        b"2024-03-01,Strict Row,5,60\n"
+    )
+    response = client.post("/workouts/import", content=body, headers={"Content-Type": "text/csv"})
+    report = response.json()
+    assert (report["workouts_imported"], report["sets_imported"]) == (1, 2)
+    assert report["errors"] == [{"line": 3, "error": "invalid UTF-8"}]
+    assert not any("\ufffd" in ex["name"] for ex in client.get("/exercises/").json())
+
+    header = b"workout_date,exercise_name,reps,\xffweight\n2024-03-01,Strict Row,5,50\n"
+    response = client.post("/workouts/import", content=header, headers={"Content-Type": "text/csv"})
+    assert response.status_code == HTTPStatus.BAD_REQUEST
+
+
+def test_import_csv_missing_columns(client):
+    response = client.post(
+        "/workouts/import", content="workout_date,reps\n", headers={"Content-Type": "text/csv"}
+    )
+    assert response.status_code == HTTPStatus.BAD_REQUEST
+
+
+def test_import_unsupported_content_type(client):
+    response = client.post(
+        "/workouts/import", content="{}", headers={"Content-Type": "application/xml"}
+    )
+    assert response.status_code == HTTPStatus.UNSUPPORTED_MEDIA_TYPE
+
+
+def test_cli_import_workouts(client, tmp_path: Path, capsys):
+    from app import cli
+
+    path = tmp_path / "history.csv"
+    path.write_text(
+        "workout_date,exercise_name,reps,weight\n2023-05-05,CLI Deadlift,3,180\n",
+        encoding="utf-8",
+    )
+    assert cli.main(["import-workouts", str(path)]) == 0
+    report = json.loads(capsys.readouterr().out)
+    assert report["workouts_imported"] == 1
+    assert report["sets_imported"] == 1
@@ -0,0 +1,81 @@
+"""
+Logging pipeline: single-pass masking, queue handoff, JSON output.
+"""
+
+import io
+import json
+import logging
+import queue
+from logging.handlers import QueueListener
+
+from app.logging_config import (
+    NonBlockingQueueHandler,
+    SensitiveDataFilter,
+    build_output_handler,
+    correlation_id_ctx,
+)
+
+
+def pipeline(fmt: str = "text"):
+    stream = io.StringIO()
+    log_queue: queue.Queue = queue.Queue()
+    listener = QueueListener(log_queue, build_output_handler(fmt, stream))
+    logger = logging.getLogger(f"test_logging.{fmt}")
+    logger.propagate = False
+    logger.setLevel(logging.INFO)
+    handler = NonBlockingQueueHandler(log_queue)
+    logger.addHandler(handler)
+    listener.start()
+    return logger, listener, stream, handler
+
+
+def test_single_pass_masks_every_secret():
+    mask = SensitiveDataFilter().mask
+    message = (
+        '{"password": "hunter2", "token":"abc", "api_key" : "k", "secret":"s", '
+        '"name": "Squat"} from ivan.petrov@example.com'
+    )
+    assert mask(message) == (
+        '{"password":"***", "token":"***", "api_key":"***", "secret":"***", '
+        '"name": "Squat"} from ***@***.***'
+    )
+
+
+def test_records_are_written_by_the_listener_with_caller_correlation_id():
+    logger, listener, stream, _ = pipeline()
+    token = correlation_id_ctx.set("cid-42")
+    try:
+        logger.warning('login {"password": "%s"}', "hunter2")
+    finally:
+        correlation_id_ctx.reset(token)
+    listener.stop()  # дожидается, пока очередь разобрана
+
+    line = stream.getvalue().strip()
+    assert "[cid-42]" in line
+    assert line.endswith('login {"password":"***"}')
+
+
+def test_json_formatter():
+    logger, listener, stream, _ = pipeline("json")
+    try:
+        raise ValueError("boom")
+    except ValueError:
+        logger.exception("failed for a@b.io")
+    listener.stop()
+
+    entry = json.loads(stream.getvalue())
+    assert entry["message"] == "failed for ***@***.***"
+    assert entry["level"] == "ERROR"
+    assert entry["correlation_id"] == "N/A"
+    assert "ValueError: boom" in entry["exc_info"]
+
+
+def test_full_queue_drops_instead_of_blocking():
+    handler = NonBlockingQueueHandler(queue.Queue(maxsize=1))
+    logger = logging.getLogger("test_logging.full")
+    logger.propagate = False
+    logger.addHandler(handler)
+    for i in range(3):
+        logger.warning("burst %d", i)
+    assert handler.queue.qsize() == 1
+    assert handler.dropped == 2
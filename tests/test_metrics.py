@@ -0,0 +1,120 @@
+"""
+In-process metrics registry and the /metrics endpoint.
+"""
+
+import os
+import subprocess
+import sys
+import threading
+import time
+from pathlib import Path
+
+from app import metrics
+
+
+def test_histogram_buckets_are_cumulative_and_upper_bound_inclusive():
+    registry = metrics.MetricsRegistry()
+    latency = registry.histogram("latency_seconds", "Latency", ("route",), buckets=(0.01, 0.1))
+    for value in (0.003, 0.01, 0.05, 20.0):
+        latency.observe(value, ("/a",))
+
+    text = metrics.render(registry.collect())
+    assert 'latency_seconds_bucket{route="/a",le="0.01"} 2' in text
+    assert 'latency_seconds_bucket{route="/a",le="0.1"} 3' in text
+    assert 'latency_seconds_bucket{route="/a",le="+Inf"} 4' in text
+    assert 'latency_seconds_sum{route="/a"} 20.063' in text
+    assert 'latency_seconds_count{route="/a"} 4' in text
+    assert "# TYPE latency_seconds histogram" in text
+
+
+def test_counter_shards_from_all_threads_are_summed():
+    registry = metrics.MetricsRegistry()
+    hits = registry.counter("hits_total", "Hits", ("kind",))
+
+    def work():
+        for _ in range(10_000):
+            hits.inc(("a",))
+
+    threads = [threading.Thread(target=work) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    # Потоки завершились, их шарды остались
+    assert hits.collect().samples == {("a",): 80_000}
+
+
+def test_merge_sums_counters_and_keeps_gauges_of_live_workers_only():
+    registry = metrics.MetricsRegistry()
+    registry.counter("requests_total", "Requests").inc(amount=3)
+    registry.histogram("latency_seconds", "Latency", buckets=(1.0,)).observe(0.5)
+    registry.callback("pool_in_use", "In use", "gauge", (), lambda: {(): 2})
+
+    exited = subprocess.run(  # noqa: S603
+        [sys.executable, "-c", "import os; print(os.getpid())"],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    live = metrics.snapshot(registry)
+    dead = {**metrics.snapshot(registry), "pid": int(exited.stdout)}
+
+    text = metrics.render(metrics.merge([live, dead]))
+    assert "requests_total 6" in text
+    assert 'latency_seconds_bucket{le="1"} 2' in text
+    assert f'pool_in_use{{pid="{os.getpid()}"}} 2' in text
+    assert f'pid="{dead["pid"]}"' not in text
+
+
+def test_snapshot_directory_round_trip(tmp_path: Path):
+    registry = metrics.MetricsRegistry()
+    registry.counter("requests_total", "Requests").inc()
+    metrics.write_snapshot(registry, str(tmp_path))
+    metrics.write_snapshot(registry, str(tmp_path))  # перезапись, а не второй файл
+
+    snapshots = metrics.read_snapshots(str(tmp_path))
+    assert [s["pid"] for s in snapshots] == [os.getpid()]
+    assert "requests_total 1" in metrics.render(metrics.merge(snapshots))
+
+
+def test_snapshots_are_published_by_a_thread_not_by_requests(tmp_path: Path, monkeypatch):
+    monkeypatch.setattr(metrics, "METRICS_DIR", str(tmp_path))
+    metrics.observe_request("GET", "/publish-test", 200, 0.01)
+    assert list(tmp_path.iterdir()) == []
+
+    metrics.start_publisher(str(tmp_path), interval=0.01)
+    try:
+        deadline = time.monotonic() + 5
+        while not list(tmp_path.iterdir()) and time.monotonic() < deadline:
+            time.sleep(0.01)
+    finally:
+        metrics.stop_publisher()
+    text = metrics.render(metrics.merge(metrics.read_snapshots(str(tmp_path))))
+    assert 'route="/publish-test"' in text
+
+
+def test_metrics_endpoint_reports_routes_db_and_caches(client):
+    exercise = client.post("/exercises/", json={"name": "Metrics Squat"}).json()
+    workout = client.post("/workouts/", json={"workout_date": "2025-03-01"}).json()
+    created = client.post(
+        f"/workouts/{workout['id']}/sets",
+        params={"exercise_id": exercise["id"]},
+        json={"reps": 5, "weight": "100"},
+    )
+    assert created.status_code == 200
+    client.get(f"/workouts/{workout['id']}")
+    client.get("/no-such-route")
+
+    response = client.get("/metrics")
+    assert response.status_code == 200
+    assert response.headers["content-type"] == metrics.CONTENT_TYPE
+    text = response.text
+    # Метка - шаблон маршрута, а не путь с конкретным id
+    assert 'route="/workouts/{workout_id}",status="200"' in text
+    assert workout["id"] not in text
+    assert 'http_requests_total{method="GET",route="unmatched",status="404"}' in text
+    assert 'db_query_duration_seconds_count{engine="write"}' in text
+    assert 'db_pool_size{engine="write"}' in text
+    assert 'cache_misses_total{cache="workout_json"}' in text
+    assert "log_records_dropped_total 0" in text
+    assert "/metrics" not in client.get("/openapi.json").json()["paths"]
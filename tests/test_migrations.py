@@ -0,0 +1,170 @@
+"""
+Versioned migrations: fresh databases, pre-versioning databases and concurrent starts.
+"""
+
+import logging
+import threading
+from pathlib import Path
+from uuid import UUID
+
+import pytest
+from sqlalchemy import inspect
+
+from app import db_models, migrations
+from app.repositories import ExerciseStatsRepository
+
+LEGACY_WORKOUT_ID = "3f2b8a6e-1c4d-4e5f-9a7b-0c1d2e3f4a5b"
+
+# Схема wagonee.db до появления миграций (create_all исходных моделей)
+LEGACY_SCHEMA = (
+    "CREATE TABLE exercises (id VARCHAR NOT NULL, name VARCHAR(100) NOT NULL, "
+    "description VARCHAR(500), PRIMARY KEY (id))",
+    "CREATE TABLE workouts (id VARCHAR NOT NULL, workout_date DATE NOT NULL, note VARCHAR, "
+    "PRIMARY KEY (id))",
+    "CREATE TABLE sets (id VARCHAR NOT NULL, reps INTEGER NOT NULL, weight NUMERIC(6, 2) NOT NULL, "
+    "exercise_name VARCHAR NOT NULL, workout_id VARCHAR NOT NULL, PRIMARY KEY (id), "
+    "FOREIGN KEY(workout_id) REFERENCES workouts (id))",
+    "INSERT INTO exercises VALUES ('e1', 'Squat', NULL)",
+    "INSERT INTO workouts VALUES ('3f2b8a6e-1c4d-4e5f-9a7b-0c1d2e3f4a5b', '2025-01-06', 'legs')",
+    "INSERT INTO sets VALUES ('s1', 5, 100, 'Squat', '3f2b8a6e-1c4d-4e5f-9a7b-0c1d2e3f4a5b')",
+    "INSERT INTO sets VALUES ('s2', 8, 40, 'Imported Row', '3f2b8a6e-1c4d-4e5f-9a7b-0c1d2e3f4a5b')",
+)
+
+
+@pytest.fixture
+def engine(tmp_path: Path):
+    eng = migrations.migration_engine(f"sqlite:///{(tmp_path / 'migrate.db').as_posix()}")
+    yield eng
+    eng.dispose()
+
+
+def index_names(eng, table: str) -> set[str]:
+    return {ix["name"] for ix in inspect(eng).get_indexes(table)}
+
+
+def test_fresh_database_is_created_at_latest_version(engine):
+    assert migrations.migrate(engine) == []
+    assert migrations.status(engine) == {
+        "current": migrations.LATEST_VERSION,
+        "latest": migrations.LATEST_VERSION,
+    }
+    assert "ix_sets_workout_id" in index_names(engine, "sets")
+
+
+def test_legacy_database_is_upgraded_in_place(engine):
+    with engine.begin() as conn:
+        for statement in LEGACY_SCHEMA:
+            conn.exec_driver_sql(statement)
+    assert migrations.status(engine)["current"] == 0
+
+    applied = migrations.migrate(engine)
+
+    assert [m.version for m in applied] == [m.version for m in migrations.MIGRATIONS]
+    assert {"ix_sets_workout_id", "ix_sets_exercise_id"} <= index_names(engine, "sets")
+    assert "ix_workouts_date_id" in index_names(engine, "workouts")
+    with engine.connect() as conn:
+        linked = conn.exec_driver_sql(
+            "SELECT s.id, e.name, w.public_id FROM sets s "
+            "JOIN exercises e ON e.id = s.exercise_id JOIN workouts w ON w.id = s.workout_id "
+            "ORDER BY s.id"
+        ).all()
+        plan = conn.exec_driver_sql(
+            "EXPLAIN QUERY PLAN SELECT * FROM sets WHERE workout_id = 1"
+        ).all()
+        totals = conn.exec_driver_sql("SELECT set_count, total_volume FROM workouts").one()
+    # Имя без записи в справочнике превратилось в новое упражнение, UUID остались прежними
+    public_id = UUID(LEGACY_WORKOUT_ID).bytes
+    assert linked == [(1, "Squat", public_id), (2, "Imported Row", public_id)]
+    assert "USING INDEX ix_sets_workout_id" in plan[0][-1]
+    assert tuple(totals) == (2, 5 * 100 + 8 * 40)
+    assert migrations.migrate(engine) == []
+
+
+def test_migrated_schema_matches_models(engine, tmp_path: Path):
+    with engine.begin() as conn:
+        for statement in LEGACY_SCHEMA:
+            conn.exec_driver_sql(statement)
+    migrations.migrate(engine)
+    fresh = migrations.migration_engine(f"sqlite:///{(tmp_path / 'fresh.db').as_posix()}")
+    migrations.migrate(fresh)
+    try:
+        for table in ("exercises", "workouts", "sets", "exercise_week_stats", "resource_versions"):
+            assert [c["name"] for c in inspect(engine).get_columns(table)] == [
+                c["name"] for c in inspect(fresh).get_columns(table)
+            ]
+            assert index_names(engine, table) == index_names(fresh, table)
+    finally:
+        fresh.dispose()
+
+
+def test_orphan_sets_are_counted_in_the_log(engine, caplog):
+    with engine.begin() as conn:
+        for statement in LEGACY_SCHEMA:
+            conn.exec_driver_sql(statement)
+        conn.exec_driver_sql("INSERT INTO sets VALUES ('s9', 1, 1, 'Squat', 'deleted-workout')")
+    with caplog.at_level(logging.WARNING, logger="app.migrations"):
+        migrations.migrate(engine)
+    assert "Migration 3 dropped 1 sets with a missing workout or exercise" in caplog.text
+
+
+def test_unsupported_dialect_is_refused_before_any_step(engine, monkeypatch):
+    with engine.begin() as conn:
+        for statement in LEGACY_SCHEMA:
+            conn.exec_driver_sql(statement)
+    monkeypatch.setattr(migrations, "SUPPORTED_DIALECTS", ("postgresql",))
+    with pytest.raises(RuntimeError, match="implemented for postgresql only, not sqlite"):
+        migrations.migrate(engine)
+    assert migrations.status(engine)["current"] == 0
+
+
+def test_rollup_migration_matches_rebuild(engine):
+    with engine.begin() as conn:
+        for statement in LEGACY_SCHEMA:
+            conn.exec_driver_sql(statement)
+        # Воскресенье той же недели, равный вес с большим числом повторов, одиночный подход
+        conn.exec_driver_sql("INSERT INTO workouts VALUES ('w2', '2025-01-12', NULL)")
+        conn.exec_driver_sql("INSERT INTO workouts VALUES ('w3', '2025-01-13', NULL)")
+        conn.exec_driver_sql("INSERT INTO sets VALUES ('s3', 7, 100, 'Squat', 'w2')")
+        conn.exec_driver_sql("INSERT INTO sets VALUES ('s4', 1, 130.5, 'Squat', 'w3')")
+    migrations.migrate(engine)
+
+    query = "SELECT * FROM exercise_week_stats ORDER BY exercise_id, week_start"
+    with engine.begin() as conn:
+        migrated = conn.exec_driver_sql(query).all()
+        ExerciseStatsRepository(conn).rebuild()
+        rebuilt = conn.exec_driver_sql(query).all()
+
+    assert len(migrated) == 3
+    assert [tuple(row) for row in migrated] == [tuple(row) for row in rebuilt]
+
+
+def test_concurrent_starts_apply_each_step_once(engine):
+    with engine.begin() as conn:
+        for statement in LEGACY_SCHEMA:
+            conn.exec_driver_sql(statement)
+    results: list[list] = []
+    errors: list[Exception] = []
+
+    def run() -> None:
+        try:
+            results.append(migrations.migrate(engine))
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=run) for _ in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert errors == []
+    assert sum(len(r) for r in results) == len(migrations.MIGRATIONS)
+    assert migrations.status(engine)["current"] == migrations.LATEST_VERSION
+
+
+def test_new_public_ids_are_time_ordered_uuid7():
+    ids = [db_models.uuid7() for _ in range(1000)]
+    assert {u.version for u in ids} == {7}
+    assert len(set(ids)) == len(ids)
+    # Старшие 48 бит - миллисекунды: порядок генерации сохраняется с точностью до мс
+    assert [u.int >> 80 for u in ids] == sorted(u.int >> 80 for u in ids)
@@ -0,0 +1,80 @@
+"""
+On-demand request profiling behind the X-Profile secret.
+"""
+
+import os
+import pstats
+from pathlib import Path
+
+import pytest
+
+from app.profiling import Profiler
+
+SECRET = "profiling-secret-for-tests"  # noqa: S105
+
+
+@pytest.fixture(autouse=True)
+def profiling_env(tmp_path: Path, monkeypatch):
+    monkeypatch.setenv("PROFILING_SECRET", SECRET)
+    monkeypatch.setenv("PROFILE_DIR", str(tmp_path / "profiles"))
+
+
+def _workout(client) -> str:
+    return client.post("/workouts/", json={"workout_date": "2025-05-01"}).json()["id"]
+
+
+def test_requests_without_the_secret_are_not_profiled(client, tmp_path: Path):
+    workout_id = _workout(client)
+    plain = client.get(f"/workouts/{workout_id}")
+    wrong = client.get(f"/workouts/{workout_id}", headers={"X-Profile": "guess"})
+    assert "X-Profile-Id" not in plain.headers and "X-Profile-Id" not in wrong.headers
+    assert list((tmp_path / "profiles").iterdir()) == []
+
+
+def test_profiled_request_is_stored_under_its_correlation_id(client, tmp_path: Path):
+    workout_id = _workout(client)
+    r = client.get(
+        f"/workouts/{workout_id}",
+        headers={"X-Profile": SECRET, "X-Profile-Memory": "1", "X-Correlation-ID": "slow-user-42"},
+    )
+    assert r.status_code == 200
+    assert r.headers["X-Profile-Id"] == "slow-user-42"
+
+    cpu = client.get("/debug/profiles/slow-user-42", headers={"X-Profile": SECRET})
+    assert cpu.status_code == 200
+    saved = tmp_path / "downloaded.pstats"
+    saved.write_bytes(cpu.content)
+    files = {Path(filename).name for filename, _, _ in pstats.Stats(str(saved)).stats}
+    # Сервисный код выполнялся в threadpool: его профиль слит с профилем event loop
+    assert "services.py" in files and "middleware.py" in files
+
+    memory = client.get(
+        "/debug/profiles/slow-user-42", params={"kind": "memory"}, headers={"X-Profile": SECRET}
+    )
+    assert memory.status_code == 200 and "size=" in memory.text
+
+
+def test_profile_download_needs_the_secret_and_a_safe_id(client):
+    _workout(client)
+    r = client.get("/health", headers={"X-Profile": SECRET, "X-Correlation-ID": "../../etc/x"})
+    profile_id = r.headers["X-Profile-Id"]
+    assert profile_id != "../../etc/x" and profile_id.isalnum()
+
+    assert client.get(f"/debug/profiles/{profile_id}").status_code == 404
+    assert client.get("/debug/profiles/..%2Fx", headers={"X-Profile": SECRET}).status_code == 404
+    ok = client.get(f"/debug/profiles/{profile_id}", headers={"X-Profile": SECRET})
+    assert ok.status_code == 200
+
+
+def test_old_profiles_are_pruned(tmp_path: Path):
+    profiler = Profiler(SECRET, str(tmp_path), max_files=2)
+    for i in range(4):
+        profile = profiler.start({"X-Profile": SECRET}, f"req-{i}")
+        profiler.finish(profile)
+        os.utime(profiler.path(f"req-{i}"), (i, i))
+    assert sorted(p.name for p in tmp_path.iterdir()) == ["req-2.pstats", "req-3.pstats"]
+
+
+def test_short_secret_is_rejected(tmp_path: Path):
+    with pytest.raises(ValueError, match="PROFILING_SECRET"):
+        Profiler("short", str(tmp_path))
@@ -0,0 +1,341 @@
+"""
+Query-count regression tests: endpoints must not issue one SELECT per workout.
+
+Every test runs with DB_MODE=sync and DB_MODE=async; test_query_counts_hold_under_
+production_profile reruns the module with DB_ENGINE_PROFILE=production (WAL, BEGIN
+IMMEDIATE, separate read pool).
+"""
+
+import os
+import subprocess
+import sys
+from contextlib import contextmanager
+from datetime import date
+from http import HTTPStatus
+from importlib import import_module
+from pathlib import Path
+from uuid import uuid4
+
+import pytest
+from sqlalchemy import event
+
+
+@pytest.fixture(params=["sync", "async"])
+def db_mode(request, monkeypatch):
+    monkeypatch.setenv("DB_MODE", request.param)
+    return request.param
+
+
+@pytest.fixture
+def client(db_mode, client):
+    """The conftest client, once per DB_MODE (db_mode is set before app.main is imported)"""
+    assert sys.modules["app.main"].DB_MODE == db_mode
+    return client
+
+
+def engines():
+    """Every engine the app has instrumented: write, read and the async ones once created"""
+    return list(import_module("app.db")._instrumented.values())
+
+
+@contextmanager
+def count_queries():
+    db = import_module("app.db")
+    statements: list[str] = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        # Как и счетчик запросов приложения: BEGIN / SAVEPOINT - не запросы
+        if not db.is_transaction_control(statement):
+            statements.append(statement)
+
+    hooked = engines()
+    for engine in hooked:
+        event.listen(engine, "before_cursor_execute", before_cursor_execute)
+    try:
+        yield statements
+    finally:
+        for engine in hooked:
+            event.remove(engine, "before_cursor_execute", before_cursor_execute)
+
+
+def _workout_with_sets(client, exercise_id: str, n_sets: int) -> str:
+    workout_id = client.post("/workouts/", json={"workout_date": "2025-10-10"}).json()["id"]
+    for _ in range(n_sets):
+        r = client.post(
+            f"/workouts/{workout_id}/sets?exercise_id={exercise_id}",
+            json={"reps": 5, "weight": "100"},
+        )
+        assert r.status_code == HTTPStatus.OK
+    return workout_id
+
+
+def test_list_workouts_query_count_is_constant(client):
+    exercise_id = client.post("/exercises/", json={"name": "Squat"}).json()["id"]
+    for _ in range(2):
+        _workout_with_sets(client, exercise_id, n_sets=2)
+
+    with count_queries() as small:
+        assert client.get("/workouts/", params={"limit": 2}).status_code == HTTPStatus.OK
+
+    for _ in range(8):
+        _workout_with_sets(client, exercise_id, n_sets=2)
+
+    with count_queries() as large:
+        r = client.get("/workouts/", params={"limit": 10})
+        assert r.status_code == HTTPStatus.OK
+        assert len(r.json()["items"]) == 10
+
+    # версия списка (ETag) + workouts + один IN-запрос на подходы, независимо от размера страницы
+    assert len(large) == len(small) == 3
+
+
+def test_get_workout_query_count(client):
+    exercise_id = client.post("/exercises/", json={"name": "Bench"}).json()["id"]
+    workout_id = _workout_with_sets(client, exercise_id, n_sets=5)
+
+    with count_queries() as statements:
+        r = client.get(f"/workouts/{workout_id}")
+        assert r.status_code == HTTPStatus.OK
+        assert len(r.json()["sets"]) == 5
+
+    assert len(statements) == 2
+
+
+def test_add_set_query_count_does_not_grow(client):
+    exercise_id = client.post("/exercises/", json={"name": "Deadlift"}).json()["id"]
+    workout_id = _workout_with_sets(client, exercise_id, n_sets=1)
+
+    def add_set() -> int:
+        with count_queries() as statements:
+            r = client.post(
+                f"/workouts/{workout_id}/sets?exercise_id={exercise_id}",
+                json={"reps": 3, "weight": "140"},
+            )
+            assert r.status_code == HTTPStatus.OK
+        return len(statements)
+
+    first = add_set()
+    for _ in range(5):
+        add_set()
+    assert add_set() == first
+
+
+def test_add_sets_batch_query_count_is_constant(client):
+    exercise_id = client.post("/exercises/", json={"name": "Row"}).json()["id"]
+
+    def add_batch(n: int) -> int:
+        workout_id = client.post("/workouts/", json={"workout_date": "2025-10-15"}).json()["id"]
+        batch = [{"exercise_id": exercise_id, "reps": 10, "weight": "50"}] * n
+        with count_queries() as statements:
+            r = client.post(f"/workouts/{workout_id}/sets:batch", json=batch)
+            assert r.status_code == HTTPStatus.OK
+            assert len(r.json()["sets"]) == n
+        return len(statements)
+
+    assert add_batch(2) == add_batch(30)
+
+
+def test_add_set_uses_one_session_and_connection(client):
+    exercise_id = client.post("/exercises/", json={"name": "Lunge"}).json()["id"]
+    workout_id = client.post("/workouts/", json={"workout_date": "2025-10-16"}).json()["id"]
+    checkouts = []
+
+    def on_checkout(dbapi_conn, record, proxy):
+        checkouts.append(record)
+
+    hooked = engines()
+    for engine in hooked:
+        event.listen(engine, "checkout", on_checkout)
+    try:
+        r = client.post(
+            f"/workouts/{workout_id}/sets?exercise_id={exercise_id}",
+            json={"reps": 12, "weight": "20"},
+        )
+        assert r.status_code == HTTPStatus.OK
+    finally:
+        for engine in hooked:
+            event.remove(engine, "checkout", on_checkout)
+
+    assert len(checkouts) == 1
+
+
+def test_exercise_lookups_are_served_from_cache(client):
+    exercise = client.post("/exercises/", json={"name": "Cached Curl"}).json()
+    workout_id = client.post("/workouts/", json={"workout_date": "2025-10-17"}).json()["id"]
+
+    with count_queries() as statements:
+        r = client.post(
+            f"/workouts/{workout_id}/sets?exercise_id={exercise['id']}",
+            json={"reps": 10, "weight": "15"},
+        )
+        assert r.status_code == HTTPStatus.OK
+        assert client.get("/exercises/").status_code == HTTPStatus.OK
+        listed = client.get("/exercises/").json()
+
+    # Не больше одного запроса к exercises: холодный снимок списка
+    assert sum("FROM exercises" in s for s in statements) <= 1
+    assert exercise in listed
+
+    # create_exercise сбрасывает снимок списка
+    created = client.post("/exercises/", json={"name": "Fresh Exercise"}).json()
+    assert created in client.get("/exercises/").json()
+
+
+def test_not_modified_workout_is_one_version_lookup(client):
+    exercise_id = client.post("/exercises/", json={"name": "Squat"}).json()["id"]
+    workout_id = _workout_with_sets(client, exercise_id, n_sets=3)
+    tag = client.get(f"/workouts/{workout_id}").headers["ETag"]
+    import_module("app.services").workout_json_cache.clear()
+
+    with count_queries() as statements:
+        response = client.get(f"/workouts/{workout_id}", headers={"If-None-Match": tag})
+
+    assert response.status_code == HTTPStatus.NOT_MODIFIED
+    selects = [s for s in statements if s.lstrip().upper().startswith("SELECT")]
+    assert len(selects) == 1
+    assert "FROM sets" not in selects[0]
+
+
+def test_cached_workout_is_served_without_queries(client, monkeypatch):
+    exercise_id = client.post("/exercises/", json={"name": "Squat"}).json()["id"]
+    workout_id = _workout_with_sets(client, exercise_id, n_sets=3)
+    first = client.get(f"/workouts/{workout_id}")
+
+    def no_session():
+        raise AssertionError("cache hit opened a unit of work")
+
+    # Попадание в кэш не открывает сессию и не ходит в threadpool за unit of work
+    monkeypatch.setattr(import_module("app.main"), "runner_scope", no_session)
+    with count_queries() as statements:
+        again = client.get(f"/workouts/{workout_id}")
+        cached = client.get(
+            f"/workouts/{workout_id}", headers={"If-None-Match": first.headers["ETag"]}
+        )
+
+    assert statements == []
+    assert again.json() == first.json()
+    assert again.headers["ETag"] == first.headers["ETag"]
+    assert cached.status_code == HTTPStatus.NOT_MODIFIED
+
+
+def test_summary_view_does_not_read_sets(client):
+    exercise_id = client.post("/exercises/", json={"name": "Squat"}).json()["id"]
+    _workout_with_sets(client, exercise_id, n_sets=3)
+
+    with count_queries() as statements:
+        r = client.get("/workouts/", params={"view": "summary"})
+        assert r.status_code == HTTPStatus.OK
+
+    # версия списка + одна страница workouts, итоги - из ее же колонок
+    assert len(statements) == 2
+    assert not any("FROM sets" in s for s in statements)
+    assert all("sets" not in item for item in r.json()["items"])
+
+
+def explain(stmt) -> list[str]:
+    """EXPLAIN QUERY PLAN of a Core statement, parameters bound as the app binds them"""
+    with import_module("app.db").engine.connect() as conn:
+        compiled = stmt.compile(dialect=conn.dialect)
+        values = compiled.construct_params()
+        params = []
+        for name in compiled.positiontup:
+            bind_type = compiled.binds[name].type.dialect_impl(conn.dialect)
+            process = bind_type.bind_processor(conn.dialect)
+            params.append(process(values[name]) if process else values[name])
+        rows = conn.exec_driver_sql(f"EXPLAIN QUERY PLAN {compiled}", tuple(params))
+        return [row[-1] for row in rows]
+
+
+def test_next_page_seeks_the_date_index(client):
+    repositories = import_module("app.repositories")
+
+    plan = explain(
+        repositories.WorkoutRepository.page_query(10, after=(date(2025, 10, 10), uuid4()))
+    )
+
+    # Следующая страница - поиск по ix_workouts_date_id от курсора, а не обход индекса сверху
+    assert plan[0].startswith("SEARCH workouts USING INDEX ix_workouts_date_id")
+    assert not any(step.startswith("SCAN") for step in plan)
+
+
+@pytest.mark.skipif(
+    os.getenv("DB_ENGINE_PROFILE") == "production", reason="this run is the production one"
+)
+def test_query_counts_hold_under_production_profile():
+    # DB_ENGINE_PROFILE читается при импорте app.db, поэтому профиль - отдельным процессом
+    # (conftest дает ему свою временную базу)
+    env = {**os.environ, "DB_ENGINE_PROFILE": "production"}
+    tests = Path(__file__).parent
+    result = subprocess.run(  # noqa: S603
+        [
+            sys.executable,
+            "-m",
+            "pytest",
+            "-q",
+            "-p",
+            "no:cacheprovider",
+            __file__,
+            tests / "test_analytics.py",
+        ],
+        env=env,
+        capture_output=True,
+        text=True,
+        timeout=300,
+    )
+    assert result.returncode == 0, result.stdout[-3000:]
+
+
+def test_query_budgets_hold_with_cold_caches(client):
+    main = sys.modules["app.main"]
+    services = import_module("app.services")
+    exercise_id = client.post("/exercises/", json={"name": "Cold Press"}).json()["id"]
+    workout_id = _workout_with_sets(client, exercise_id, n_sets=2)
+    list_tag = client.get("/workouts/").headers["ETag"]
+    catalogue_tag = client.get("/exercises/").headers["ETag"]
+    client.post("/exercises/", json={"name": "Cold Press 2"})  # устаревает ETag справочника
+    client.post("/workouts/", json={"workout_date": "2025-10-11"})  # и списка тренировок
+    workout_tag = client.get(f"/workouts/{workout_id}").headers["ETag"]
+    set_in = {"reps": 5, "weight": "60"}
+    calls = {
+        ("POST", "/workouts/"): lambda: client.post(
+            "/workouts/", json={"workout_date": "2025-10-12"}
+        ),
+        ("GET", "/workouts/"): lambda: client.get(
+            "/workouts/", headers={"If-None-Match": list_tag}
+        ),
+        ("GET", "/workouts/{workout_id}"): lambda: client.get(
+            f"/workouts/{workout_id}", headers={"If-None-Match": workout_tag + "x"}
+        ),
+        ("POST", "/workouts/{workout_id}/sets"): lambda: client.post(
+            f"/workouts/{workout_id}/sets?exercise_id={exercise_id}", json=set_in
+        ),
+        ("POST", "/workouts/{workout_id}/sets:batch"): lambda: client.post(
+            f"/workouts/{workout_id}/sets:batch",
+            json=[{"exercise_id": exercise_id, **set_in}] * 3,
+        ),
+        ("POST", "/exercises/"): lambda: client.post("/exercises/", json={"name": "Cold Row"}),
+        ("GET", "/exercises/"): lambda: client.get(
+            "/exercises/", headers={"If-None-Match": catalogue_tag}
+        ),
+        ("GET", "/analytics/exercises/{exercise_id}"): lambda: client.get(
+            f"/analytics/exercises/{exercise_id}"
+        ),
+        ("GET", "/analytics/exercises"): lambda: client.get("/analytics/exercises"),
+        ("GET", "/analytics/weekly"): lambda: client.get(
+            "/analytics/weekly", params={"exercise_id": exercise_id}
+        ),
+        ("GET", "/analytics/exercises/{exercise_id}/progression"): lambda: client.get(
+            f"/analytics/exercises/{exercise_id}/progression"
+        ),
+    }
+    assert calls.keys() == main.QUERY_BUDGETS.keys()
+
+    for route, call in calls.items():
+        # Первый запрос после рестарта или сброса кэшей - самый дорогой
+        services.exercise_cache.clear()
+        services.workout_json_cache.clear()
+        services.columns_snapshot.clear()
+        with count_queries() as statements:
+            r = call()
+        assert r.status_code < HTTPStatus.BAD_REQUEST, (route, r.text)
+        assert len(statements) <= main.QUERY_BUDGETS[route], (route, statements)
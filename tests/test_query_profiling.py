@@ -0,0 +1,99 @@
+"""
+Per-request SQL profiling: Server-Timing, slow-query log, query budgets.
+"""
+
+import logging
+import re
+from importlib import import_module
+
+import pytest
+from fastapi import FastAPI
+from fastapi.responses import JSONResponse
+from fastapi.testclient import TestClient
+
+from app.middleware import QueryBudgetExceededError, QueryBudgets, RequestMiddleware
+
+
+def budget_app(mode: str) -> FastAPI:
+    """Route that runs two statements against a budget of one"""
+    from app.db import engine
+
+    app = FastAPI()
+    app.middleware("http")(
+        RequestMiddleware(query_budgets=QueryBudgets({("GET", "/two-queries"): 1}, mode))
+    )
+
+    @app.get("/two-queries")
+    def two_queries():
+        with engine.connect() as conn:
+            conn.exec_driver_sql("SELECT 1")
+            conn.exec_driver_sql("SELECT 2")
+        return {}
+
+    return app
+
+
+def test_server_timing_reports_request_queries(client):
+    workout = client.post("/workouts/", json={"workout_date": "2025-04-01"})
+    timing = workout.headers["Server-Timing"]
+    match = re.fullmatch(r'db;dur=[\d.]+;desc="(\d+) queries", total;dur=[\d.]+', timing)
+    assert match and int(match.group(1)) >= 1
+
+    health = client.get("/health")
+    assert health.headers["Server-Timing"].startswith('db;dur=0.00;desc="0 queries"')
+
+
+def test_slow_query_log_has_correlation_id_and_no_parameter_values(client, monkeypatch, caplog):
+    monkeypatch.setattr(import_module("app.db"), "SLOW_QUERY_SECONDS", 0.0)
+    with caplog.at_level(logging.WARNING, logger="app.db"):
+        r = client.post(
+            "/exercises/",
+            json={"name": "Secret Deadlift"},
+            headers={"X-Correlation-ID": "slow-query-test"},
+        )
+
+    slow = [rec for rec in caplog.records if rec.getMessage().startswith("Slow query")]
+    insert = next(rec.getMessage() for rec in slow if "INSERT INTO exercises" in rec.getMessage())
+    assert r.status_code == 201
+    assert "Secret Deadlift" not in insert
+    assert "params=(" in insert and "\n" not in insert
+    assert {rec.correlation_id for rec in slow} == {"slow-query-test"}
+
+
+def test_query_budget_raise_mode_fails_the_request(caplog):
+    with TestClient(budget_app("raise")) as c, caplog.at_level(logging.ERROR):
+        r = c.get("/two-queries", headers={"X-Correlation-ID": "over-budget"})
+
+    # Ответ маршрута заменен на problem+json 500 до отправки, заголовки на месте
+    assert r.status_code == 500
+    assert r.json()["title"] == "Internal Server Error"
+    assert r.json()["correlation_id"] == "over-budget"
+    assert r.headers["X-Correlation-ID"] == "over-budget"
+    assert "Server-Timing" in r.headers
+    assert "GET /two-queries ran 2 SQL queries, budget is 1" in caplog.text
+
+
+def test_query_budget_raise_mode_uses_the_app_error_handler():
+    app = budget_app("raise")
+
+    @app.exception_handler(Exception)
+    async def handler(request, exc: Exception):
+        assert isinstance(exc, QueryBudgetExceededError)
+        return JSONResponse(status_code=500, content={"title": "handled"})
+
+    with TestClient(app) as c:
+        r = c.get("/two-queries")
+
+    assert r.status_code == 500
+    assert r.json() == {"title": "handled"}
+
+
+def test_query_budget_warn_mode_logs(caplog):
+    with TestClient(budget_app("warn")) as c, caplog.at_level(logging.WARNING):
+        assert c.get("/two-queries").status_code == 200
+    assert "GET /two-queries ran 2 SQL queries, budget is 1" in caplog.text
+
+
+def test_unknown_query_budget_mode_is_rejected():
+    with pytest.raises(ValueError, match="query_budget_mode"):
+        QueryBudgets(mode="strict")
@@ -0,0 +1,86 @@
+import multiprocessing as mp
+
+import pytest
+
+from app.ratelimit import SharedMemoryCounter, SlidingWindowCounter, create_backend
+
+
+def test_blocks_after_limit_within_window():
+    limiter = SlidingWindowCounter(limit=3, window_seconds=60)
+    assert [limiter.hit("1.1.1.1", 10.0) for _ in range(4)] == [True, True, True, False]
+    # Другие клиенты считаются отдельно
+    assert limiter.hit("2.2.2.2", 10.0)
+
+
+def test_previous_window_is_weighted_by_overlap():
+    limiter = SlidingWindowCounter(limit=10, window_seconds=60)
+    for _ in range(10):
+        assert limiter.hit("c", 30.0)
+    assert not limiter.hit("c", 59.0)
+
+    # Середина следующего окна: 10 * 0.5 = 5 запросов из предыдущего окна, можно еще 5
+    allowed = sum(limiter.hit("c", 90.0) for _ in range(10))
+    assert allowed == 5
+
+
+def test_counter_resets_after_idle_windows():
+    limiter = SlidingWindowCounter(limit=2, window_seconds=60)
+    assert limiter.hit("c", 0.0) and limiter.hit("c", 1.0)
+    assert not limiter.hit("c", 2.0)
+    assert limiter.hit("c", 600.0)
+
+
+def test_tracked_clients_are_capped_with_lru_eviction():
+    limiter = SlidingWindowCounter(limit=1, window_seconds=60, max_clients=64, shards=4)
+    for i in range(10_000):
+        limiter.hit(f"10.0.{i // 256}.{i % 256}", 1.0)
+    assert len(limiter) <= 64
+
+    # Вытесненный клиент начинает с чистого счетчика
+    assert limiter.hit("10.0.0.0", 2.0)
+
+
+def test_shm_backend_is_shared_between_instances(tmp_path):
+    path = str(tmp_path / "ratelimit")
+    worker_a = SharedMemoryCounter(limit=3, path=path, slots=64)
+    worker_b = SharedMemoryCounter(limit=3, path=path, slots=64)
+    try:
+        assert worker_a.hit("c", 10.0) and worker_b.hit("c", 10.0) and worker_a.hit("c", 10.0)
+        assert not worker_b.hit("c", 11.0)
+        assert worker_b.hit("other", 11.0)
+    finally:
+        worker_a.close()
+        worker_b.close()
+
+
+def test_shm_backend_rejects_mismatched_table_size(tmp_path):
+    path = str(tmp_path / "ratelimit")
+    SharedMemoryCounter(limit=3, path=path, slots=64).close()
+    with pytest.raises(ValueError, match="same slot count"):
+        SharedMemoryCounter(limit=3, path=path, slots=128)
+
+
+def _hammer(path: str, n: int, allowed) -> None:
+    backend = SharedMemoryCounter(limit=250, path=path, slots=64)
+    ok = sum(backend.hit("shared-client", 30.0) for _ in range(n))
+    with allowed.get_lock():
+        allowed.value += ok
+    backend.close()
+
+
+@pytest.mark.skipif("fork" not in mp.get_all_start_methods(), reason="needs fork")
+def test_shm_backend_enforces_one_limit_across_processes(tmp_path):
+    ctx = mp.get_context("fork")
+    path = str(tmp_path / "ratelimit")
+    allowed = ctx.Value("i", 0)
+    workers = [ctx.Process(target=_hammer, args=(path, 200, allowed)) for _ in range(4)]
+    for w in workers:
+        w.start()
+    for w in workers:
+        w.join(timeout=30)
+    assert allowed.value == 250
+
+
+def test_create_backend_rejects_unknown_kind():
+    with pytest.raises(ValueError):
+        create_backend("redis", limit=10)
@@ -3,34 +3,7 @@ Input validation tests and negative scenarios.
 Tests strict field constraints, boundary conditions, and rejection of invalid data.
 """
 
-import os
 from http import HTTPStatus
-from importlib import import_module
-from pathlib import Path
-
-import pytest
-from fastapi.testclient import TestClient
-
-
-@pytest.fixture
-def client(tmp_path: Path):
-    """Creates unique test client with isolated DB for each test"""
-    test_db = tmp_path / f"test_validation_{id(tmp_path)}.db"
-    if test_db.exists():
-        try:
-            test_db.unlink()
-        except OSError:
-            pass  # noqa: S110 - Expected in test cleanup
-
-    os.environ["DATABASE_URL"] = f"sqlite:///{test_db.as_posix()}"
-    app = import_module("app.main").app
-    import sys
-
-    if "app.main" in sys.modules:
-        del sys.modules["app.main"]
-    app = import_module("app.main").app
-    with TestClient(app) as c:
-        yield c
 
 
 def test_negative_reps_rejected(client):